@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import
+
+from django.core.files.base import ContentFile
+from stoba.cloud import S3
+from stoba.testing import S3StandInServer
+import argparse
+import time
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+
+def _items(files, size):
+    for number in range(files):
+        yield 'bulk/%06d.bin' % number, ContentFile(b'x' * size)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Files/sec of sequential saves against save_many().')
+    parser.add_argument('--files', type=int, default=500)
+    parser.add_argument('--size', type=int, default=4096)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16, 32])
+    args = parser.parse_args()
+    
+    with S3StandInServer(latency=args.latency_ms / 1000.0) as server:
+        storage = S3(server.get_storage_options(pool_size=max(args.concurrency)))
+        
+        started = time.time()
+        for name, content in _items(args.files, args.size):
+            storage._save(name, content)
+        print('%-16s %10.1f files/s' % ('sequential', args.files / (time.time() - started)))
+        
+        for concurrency in args.concurrency:
+            started = time.time()
+            result = storage.save_many(_items(args.files, args.size), overwrite=True, concurrency=concurrency)
+            elapsed = time.time() - started
+            print('%-16s %10.1f files/s  %r' % ('save_many x%d' % concurrency, args.files / elapsed, result))
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
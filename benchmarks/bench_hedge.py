@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import, print_function
+
+from django.core.files.base import ContentFile
+from stoba.cloud import S3
+from stoba.testing import S3StandInServer
+import argparse
+import random
+import time
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+
+def _percentile(samples, percent):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * percent / 100.0))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ranged GET latency with and without hedged requests.')
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--latency-ms', type=float, default=10)
+    parser.add_argument('--slow-ms', type=float, default=300)
+    parser.add_argument('--slow-rate', type=float, default=0.02)
+    args = parser.parse_args()
+    
+    def latency(method, path):
+        # Most requests are fast, a few hit a slow server: S3's long tail.
+        if random.random() < args.slow_rate:
+            return args.slow_ms / 1000.0
+        return args.latency_ms / 1000.0
+    
+    with S3StandInServer(latency=latency) as server:
+        for label, hedge in (('plain', False), ('hedged', True)):
+            storage = S3(server.get_storage_options(hedge_requests=hedge, single_flight=False))
+            storage._save('object', ContentFile(b'x' * 4096))
+            
+            samples = []
+            for _ in range(args.requests):
+                started = time.time()
+                storage._get_object_range('object', 0, 1023)
+                samples.append(time.time() - started)
+            
+            print('%-8s p50 %7.1f ms  p95 %7.1f ms  p99 %7.1f ms' % (
+                label, _percentile(samples, 50) * 1000, _percentile(samples, 95) * 1000, _percentile(samples, 99) * 1000
+            ))
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
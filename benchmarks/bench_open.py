@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import, print_function
+
+from django.core.files.base import File
+from stoba.cloud import S3
+from stoba.testing import S3StandInServer, DiskStore
+import argparse
+import requests
+import time
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+
+class _Zeros(object):
+    
+    def __init__(self, size):
+        self.remaining = size
+    
+    def read(self, size=-1):
+        size = self.remaining if size < 0 else min(size, self.remaining)
+        self.remaining -= size
+        return b'\0' * size
+
+
+def _measure(label, open_file, offset, length, runs):
+    started = time.time()
+    for _ in range(runs):
+        f = open_file()
+        if offset:
+            f.seek(offset)
+        f.read(length)
+        f.close()
+    elapsed = (time.time() - started) / runs
+    print('%-15s %9.2f ms/op' % (label, elapsed * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Read the first bytes of a large object through S3._open.')
+    parser.add_argument('--object-size', type=int, default=500 * 1024 * 1024)
+    parser.add_argument('--read-size', type=int, default=64 * 1024)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+    
+    server = S3StandInServer(store=DiskStore()).start()
+    server.store.put('bench', 'large.bin', _Zeros(args.object_size))
+    
+    storage = S3(server.get_storage_options('bench'))
+    url = storage._get_object_url('large.bin')
+    
+    def streaming_open():
+        # The previous implementation of S3._open.
+        response = requests.get(url, auth=storage._authenticate(), stream=True)
+        return File(response.raw, 'large.bin')
+    
+    def ranged_open():
+        return storage._open('large.bin')
+    
+    _measure('streaming', streaming_open, 0, args.read_size, args.runs)
+    _measure('ranged', ranged_open, 0, args.read_size, args.runs)
+    
+    # A seek needs the streaming path to read (and download) everything before
+    # the offset, while the ranged reader just fetches from there.
+    middle = args.object_size // 2
+    _measure('streaming+seek', lambda: _Skipping(streaming_open()), middle, args.read_size, 1)
+    _measure('ranged+seek', ranged_open, middle, args.read_size, args.runs)
+    
+    server.stop()
+
+
+class _Skipping(object):
+    
+    def __init__(self, f):
+        self.f = f
+    
+    def seek(self, offset):
+        while offset > 0:
+            offset -= len(self.f.read(min(offset, 1024 * 1024)))
+    
+    def read(self, size):
+        return self.f.read(size)
+    
+    def close(self):
+        self.f.close()
+
+
+if __name__ == '__main__':
+    main()
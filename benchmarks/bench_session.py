@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import, print_function
+
+from django.core.files.base import ContentFile
+from stoba.cloud import S3
+from stoba.cloud.backend.session import SessionPool
+from stoba.testing import S3StandInServer
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import requests
+import time
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+
+def _run(get, url, total, concurrency):
+    started = time.time()
+    if concurrency == 1:
+        for _ in range(total):
+            get(url)
+    else:
+        with ThreadPoolExecutor(concurrency) as executor:
+            list(executor.map(lambda _: get(url), range(total)))
+    return total / (time.time() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Requests/sec with and without the pooled session layer.')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=1)
+    args = parser.parse_args()
+    
+    # The requests below are sent unsigned, to measure the connection layer only.
+    server = S3StandInServer(credentials=None).start()
+    storage = S3(server.get_storage_options())
+    storage.save('key', ContentFile(b'ok'))
+    url = storage._get_object_url('key')
+    
+    pool = SessionPool(pool_size=max(args.concurrency, 1))
+    
+    def unpooled(url):
+        return requests.get(url).content
+    
+    def pooled(url):
+        return pool.request('GET', url).content
+    
+    for label, get in (('unpooled', unpooled), ('pooled', pooled)):
+        print('%-10s %10.1f req/s' % (label, _run(get, url, args.requests, args.concurrency)))
+    
+    server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import, print_function
+
+from stoba.cloud import S3
+from stoba.cloud.auth.s3_auth import S3Auth, S3AuthV4, AwsChunkedPayload, SigV4Signer
+from stoba.cloud.auth.helper import sha256_hex
+import argparse
+import requests
+import time
+import io
+import os
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+
+OPTIONS = {'access_key_id': 'bench', 'secret_access_key': 'bench', 'bucket_name': 'bench', 'url_cache_size': 0}
+
+
+def _report(label, count, func, unit='ops/s'):
+    started = time.time()
+    func()
+    print('%-24s %12.0f %s' % (label, count / (time.time() - started), unit))
+
+
+def _sign_requests(auth, requests_to_sign):
+    for request in requests_to_sign:
+        auth(request)
+
+
+def _uncached_v4(access_key_id, secret_access_key, region):
+    # SigV4 as it would be without keeping the derived signing key.
+    auth = S3AuthV4(access_key_id, secret_access_key, region)
+    original = auth.signer._get_signing_state
+    
+    def get_signing_state(date_stamp):
+        auth.signer._signing_key = None
+        return original(date_stamp)
+    auth.signer._get_signing_state = get_signing_state
+    return auth
+
+
+def _drain(payload):
+    while payload.read(1024 * 1024):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Request signing throughput of Signature Version 2 and 4.')
+    parser.add_argument('--requests', type=int, default=20000)
+    parser.add_argument('--payload-mb', type=int, default=64)
+    args = parser.parse_args()
+    
+    url = 'https://bench.s3.amazonaws.com/media/uploads/photo.jpg'
+    
+    def prepared():
+        return [
+            requests.Request('GET', url, headers={'Range': 'bytes=0-1023'}).prepare()
+            for _ in range(args.requests)
+        ]
+    
+    v2 = S3Auth('bench', 'bench', 'us-east-1', bucket='bench')
+    v4 = S3AuthV4('bench', 'bench', 'us-east-1')
+    uncached = _uncached_v4('bench', 'bench', 'us-east-1')
+    
+    for label, auth in (('v2 headers', v2), ('v4 headers', v4), ('v4 headers no key cache', uncached)):
+        batch = prepared()
+        _report(label, len(batch), lambda: _sign_requests(auth, batch))
+    
+    names = ['media/uploads/%06d/photo.jpg' % i for i in range(args.requests)]
+    for label, version in (('v2 urls()', 's3'), ('v4 urls()', 's3v4')):
+        storage = S3(dict(OPTIONS, signature_version=version))
+        _report(label, len(names), lambda: storage.urls(names))
+    
+    # Streaming signs 64 KB chunks as they are sent; a signed payload is
+    # hashed in full before the request can start.
+    content = os.urandom(args.payload_mb * 1024 * 1024)
+    signer = SigV4Signer('bench', 'bench', 'us-east-1')
+    amz_date = signer.get_amz_date()
+    _report('v4 payload sha256', args.payload_mb, lambda: sha256_hex(content), 'MB/s')
+    _report('v4 streaming chunks', args.payload_mb,
+            lambda: _drain(AwsChunkedPayload(io.BytesIO(content), len(content), signer, amz_date, '0' * 64)), 'MB/s')
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import, print_function
+
+from django.utils.http import urlencode
+from datetime import datetime, timedelta
+from stoba.cloud import S3
+from stoba.cloud.auth.s3_auth import S3Signature
+from stoba.core.helper import datetime_to_epoch
+import argparse
+import time
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+
+OPTIONS = {'access_key_id': 'bench', 'secret_access_key': 'bench', 'bucket_name': 'bench'}
+
+
+def legacy_url(storage, name):
+    # URL generation as it was done before presigned URLs were cached.
+    expire_time = datetime_to_epoch(datetime.now() + timedelta(seconds=storage._settings['url_expires_in_sec']))
+    signature = S3Signature(
+        url = storage._get_object_url(name),
+        region = storage._settings['region'],
+        http_method = 'GET',
+        http_headers = {'Expires': expire_time},
+        creds = (storage._settings['access_key_id'], storage._settings['secret_access_key']),
+        non_amz_headers_to_sign = ('Content-MD5', 'Content-Type', 'Expires')
+    ).get_signature()
+    return '%s?%s' % (storage._get_object_url(name), urlencode({
+        'AWSAccessKeyId': storage._settings['access_key_id'],
+        'Expires': expire_time,
+        'Signature': signature
+    }))
+
+
+def _report(label, count, func):
+    started = time.time()
+    func()
+    print('%-16s %12.0f urls/s' % (label, count / (time.time() - started)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Presigned URLs generated per second.')
+    parser.add_argument('--names', type=int, default=20000)
+    args = parser.parse_args()
+    
+    names = ['media/uploads/%06d/photo.jpg' % i for i in range(args.names)]
+    uncached = S3(dict(OPTIONS, url_cache_size=0))
+    cached = S3(dict(OPTIONS, url_cache_size=args.names))
+    cached.urls(names)
+    
+    _report('legacy', len(names), lambda: [legacy_url(uncached, name) for name in names])
+    _report('url()', len(names), lambda: [uncached.url(name) for name in names])
+    _report('urls()', len(names), lambda: uncached.urls(names))
+    _report('url() cached', len(names), lambda: [cached.url(name) for name in names])
+    _report('urls() cached', len(names), lambda: cached.urls(names))
+
+
+if __name__ == '__main__':
+    main()
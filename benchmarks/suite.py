@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import, print_function
+
+from django.core.files.base import ContentFile
+from stoba.cloud import S3
+from stoba.testing import S3StandInServer, DiskStore
+import argparse
+import multiprocessing
+import platform
+import json
+import time
+import sys
+import os
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+# Every benchmark runs in a fresh process, and the stand-in server in one of
+# its own, so that the peak RSS a benchmark reports is its own: not the
+# lifetime peak of a process that also held the server's objects and ran
+# every benchmark before it.
+
+
+def get_peak_rss_kb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes everywhere else.
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def measure(name, func, iterations, params=None, bytes_per_op=0):
+    timings = []
+    started = time.time()
+    for i in range(iterations):
+        op_started = time.time()
+        func(i)
+        timings.append(time.time() - op_started)
+    elapsed = time.time() - started
+    
+    return {
+        'benchmark': name,
+        'params': params or {},
+        'iterations': iterations,
+        'ops_per_sec': iterations / elapsed,
+        'p50_ms': percentile(timings, 0.50) * 1000,
+        'p99_ms': percentile(timings, 0.99) * 1000,
+        'bytes_per_sec': bytes_per_op * iterations / elapsed,
+        'peak_rss_kb': get_peak_rss_kb()
+    }
+
+
+def get_object_name(size, i):
+    return 'objects/%d/%d' % (size, i)
+
+
+def bench_save(storage, size, iterations):
+    content = os.urandom(size)
+    return measure('save', lambda i: storage._save(get_object_name(size, i), ContentFile(content)),
+                   iterations, {'object_size': size}, size)
+
+
+def bench_open_read(storage, size, iterations):
+    def open_and_read(i):
+        f = storage._open(get_object_name(size, i))
+        while f.read(1024 * 1024):
+            pass
+        f.close()
+    return measure('open_read', open_and_read, iterations, {'object_size': size}, size)
+
+
+def bench_exists_cold(storage, size, iterations):
+    # The metadata cache of a fresh process is empty.
+    return measure('exists', lambda i: storage.exists(get_object_name(size, i)), iterations,
+                   {'object_size': size, 'cache': 'cold'})
+
+
+def bench_size_warm(storage, size, iterations):
+    for i in range(iterations):
+        storage.exists(get_object_name(size, i))
+    return measure('size', lambda i: storage.size(get_object_name(size, i)), iterations,
+                   {'object_size': size, 'cache': 'warm'})
+
+
+def bench_size_cold(storage, size, iterations):
+    return measure('size', lambda i: storage.size(get_object_name(size, i)), iterations,
+                   {'object_size': size, 'cache': 'cold'})
+
+
+def bench_url_cold(storage, size, iterations):
+    return measure('url', lambda i: storage.url(get_object_name(size, i)), iterations,
+                   {'object_size': size, 'cache': 'cold'})
+
+
+OBJECT_BENCHMARKS = (bench_save, bench_open_read, bench_exists_cold, bench_size_warm, bench_size_cold, bench_url_cold)
+
+
+def seed_listing(storage, prefix_size):
+    items = (('listing/%d/%08d' % (prefix_size, i), ContentFile(b'x')) for i in range(prefix_size))
+    storage.save_many(items, overwrite=True, concurrency=16)
+
+
+def bench_listdir(storage, prefix_size, iterations):
+    prefix = 'listing/%d' % prefix_size
+    return measure('listdir', lambda i: storage.listdir(prefix), iterations, {'prefix_size': prefix_size})
+
+
+def _call(storage_options, func, args):
+    return func(S3(storage_options), *args)
+
+
+def run_isolated(storage_options, func, *args):
+    pool = multiprocessing.Pool(1)
+    try:
+        return pool.apply(_call, (storage_options, func, args))
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def serve(latency, connection):
+    # Objects are kept on disk, so that the largest sizes do not have to fit
+    # in memory either.
+    with S3StandInServer(DiskStore(), latency=latency) as server:
+        connection.send(server.get_storage_options('benchmark'))
+        # Serves until the suite is done.
+        connection.recv()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the hot paths of the S3 storage backend.')
+    parser.add_argument('--latency-ms', type=float, default=0, help='simulated latency of every request')
+    parser.add_argument('--object-sizes', type=int, nargs='+', default=[1024, 1024 * 1024, 16 * 1024 * 1024])
+    parser.add_argument('--prefix-sizes', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--output', help='write the JSON report to this file instead of stdout')
+    args = parser.parse_args()
+    
+    connection, server_connection = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=serve, args=(args.latency_ms / 1000.0, server_connection))
+    server.start()
+    try:
+        storage_options = connection.recv()
+        results = []
+        
+        for size in args.object_sizes:
+            for benchmark in OBJECT_BENCHMARKS:
+                results.append(run_isolated(storage_options, benchmark, size, args.iterations))
+        for prefix_size in args.prefix_sizes:
+            run_isolated(storage_options, seed_listing, prefix_size)
+            results.append(run_isolated(storage_options, bench_listdir, prefix_size, max(args.iterations // 10, 1)))
+    finally:
+        connection.send(None)
+        server.join()
+    
+    report = json.dumps({
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'latency_ms': args.latency_ms,
+        'results': results
+    }, indent=2, sort_keys=True)
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(report)
+    else:
+        print(report)
+
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
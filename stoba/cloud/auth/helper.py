@@ -36,7 +36,7 @@
 from __future__ import unicode_literals, absolute_import
 
 from django.utils.six import PY3
-from hashlib import sha1
+from hashlib import sha1, sha256, md5
 import hmac
 
 if PY3:
@@ -51,5 +51,14 @@ __copyright__ = 'Copyright 2016 Vassim Shahir'
 def hmac_sha1(key, msg):
     return hmac.new(key, msg, digestmod=sha1).digest()
 
+def hmac_sha256(key, msg):
+    return hmac.new(key, msg, digestmod=sha256).digest()
+
+def sha256_hex(content):
+    return sha256(content).hexdigest()
+
 def base_64(content):
-    return base_64_with_newline(content).strip()
\ No newline at end of file
+    return base_64_with_newline(content).strip().decode('ascii')
+
+def content_md5(content):
+    return base_64(md5(content).digest())
\ No newline at end of file
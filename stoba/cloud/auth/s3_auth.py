@@ -34,11 +34,15 @@
 #
 from __future__ import unicode_literals, absolute_import
 
-from django.utils.http import http_date, urlunquote, urlparse
-from django.utils.six import PY3
+from django.utils.http import http_date, urlquote, urlunquote, urlparse
+from django.utils.six import PY3, text_type
+from django.utils.six.moves.urllib.parse import parse_qsl
 from requests.auth import AuthBase
 from collections import OrderedDict
-from .helper import hmac_sha1, base_64
+from hashlib import sha256
+from .helper import hmac_sha1, hmac_sha256, sha256_hex, base_64
+import hmac
+import time
 
 __author__ = 'Vassim Shahir'
 __license__ = 'BSD 3-Clause License'
@@ -48,19 +52,61 @@ AWS_DOMAIN = 'amazonaws.com'
 
 REGION_ENDPOINT_MAP = {
     "us-east-1": "s3",
+    "us-east-2": "s3.us-east-2",
     "us-west-1": "s3-us-west-1",
     "us-west-2": "s3-us-west-2",
+    "ca-central-1": "s3.ca-central-1",
     "eu-west-1": "s3-eu-west-1",
+    "eu-west-2": "s3.eu-west-2",
+    "eu-west-3": "s3.eu-west-3",
     "eu-central-1": "s3.eu-central-1",
+    "eu-north-1": "s3.eu-north-1",
+    "eu-south-1": "s3.eu-south-1",
+    "ap-east-1": "s3.ap-east-1",
+    "ap-south-1": "s3.ap-south-1",
     "ap-northeast-1": "s3-ap-northeast-1",
     "ap-northeast-2": "s3.ap-northeast-2",
+    "ap-northeast-3": "s3.ap-northeast-3",
     "ap-southeast-1": "s3-ap-southeast-1",
     "ap-southeast-2": "s3-ap-southeast-2",
-    "sa-east-1": "s3-sa-east-1"
+    "sa-east-1": "s3-sa-east-1",
+    "me-south-1": "s3.me-south-1",
+    "af-south-1": "s3.af-south-1"
 }
 
+# Regions launched before 2014 still accept Signature Version 2; all others
+# only accept Version 4.
+SIGV2_REGIONS = (
+    'us-east-1', 'us-west-1', 'us-west-2', 'eu-west-1',
+    'ap-northeast-1', 'ap-southeast-1', 'ap-southeast-2', 'sa-east-1'
+)
+
+# Query parameters that identify a sub-resource and therefore take part in the
+# canonicalized resource of a Signature Version 2 request.
+SIGNED_SUB_RESOURCES = (
+    'acl', 'cors', 'delete', 'lifecycle', 'location', 'logging', 'notification',
+    'partNumber', 'policy', 'requestPayment', 'response-cache-control',
+    'response-content-disposition', 'response-content-encoding',
+    'response-content-language', 'response-content-type', 'response-expires',
+    'restore', 'tagging', 'torrent', 'uploadId', 'uploads', 'versionId',
+    'versioning', 'versions', 'website'
+)
+
+SIGV4_ALGORITHM = 'AWS4-HMAC-SHA256'
+SIGV4_SERVICE = 's3'
+EMPTY_PAYLOAD_SHA256 = sha256_hex(b'')
+UNSIGNED_PAYLOAD = 'UNSIGNED-PAYLOAD'
+STREAMING_PAYLOAD = 'STREAMING-AWS4-HMAC-SHA256-PAYLOAD'
+STREAMING_CHUNK_SIZE = 64 * 1024 # 64 KB, S3 requires at least 8 KB
+MAX_PRESIGNED_EXPIRES = 7 * 24 * 60 * 60 # 7 days
+
+# Headers besides host and x-amz-* that are signed when present.
+SIGV4_SIGNED_HEADERS = ('content-encoding', 'content-md5', 'content-type', 'range')
+
 def get_s3_endpoint(region,bucket=None):
-    endpoint = [REGION_ENDPOINT_MAP[region],AWS_DOMAIN]
+    # Regions missing from the map get s3.<region>.amazonaws.com, the form of
+    # endpoint every region launched since 2014 has.
+    endpoint = [REGION_ENDPOINT_MAP.get(region, 's3.%s' % region),AWS_DOMAIN]
     if bucket is not None:
         endpoint.insert(0, bucket)
     return '.'.join(endpoint)
@@ -68,31 +114,38 @@ def get_s3_endpoint(region,bucket=None):
 
 class S3Signature(object):
     
-    def __init__(self, url, region, http_method, http_headers, creds, non_amz_headers_to_sign):
+    def __init__(self, url, region, http_method, http_headers, creds, non_amz_headers_to_sign, bucket=None):
         self.http_method = http_method
         self.access_key_id, self.secret_access_key = creds
         
         parsed_url = urlparse(url)
         self.http_request_uri = parsed_url.path
-        self.bucket = parsed_url.netloc.replace(get_s3_endpoint(region),'')[:-1]
+        self.sub_resources = self._get_sub_resources(parsed_url.query)
+        
+        if bucket is None:
+            bucket = parsed_url.netloc.replace(get_s3_endpoint(region),'')[:-1]
+        self.bucket = bucket
         self.non_amz_headers, self.amz_headers = self._get_headers_for_sign(http_headers, non_amz_headers_to_sign)
         
     def get_signature(self):
         string_to_sign = self._get_string_to_sign()
-        return base_64(hmac_sha1(self.secret_access_key.encode('utf-8'),string_to_sign))
+        return base_64(hmac_sha1(self.secret_access_key.encode('utf-8'),string_to_sign.encode('utf-8')))
     
     def _get_headers_for_sign(self,headers, required_non_amz_headers):
         
         non_amz_headers = OrderedDict([(init_header,'') for init_header in required_non_amz_headers])
         amz_headers = OrderedDict()
+        # Header names are case-insensitive: S3 signs x-amz-meta-* however
+        # it is spelt.
+        required = dict((header.lower(), header) for header in required_non_amz_headers)
         
         for header in headers:
-            if header in required_non_amz_headers:
-                non_amz_headers[header] = headers[header].strip()
-            elif header.startswith('X-Amz-'):
-                amz_headers[header.lower()] = headers[header].strip()
-                
-        print 
+            name = header.lower()
+            if name in required:
+                non_amz_headers[required[name]] = headers[header].strip()
+            elif name.startswith('x-amz-'):
+                amz_headers[name] = headers[header].strip()
+        
         return (non_amz_headers, amz_headers)
         
     
@@ -110,23 +163,31 @@ class S3Signature(object):
         else:
             return ''
     
+    def _get_sub_resources(self, query):
+        params = [(k, v) for k, v in parse_qsl(query, keep_blank_values=True) if k in SIGNED_SUB_RESOURCES]
+        return ['%s=%s' % (k, v) if v else k for k, v in sorted(params)]
+    
     def _get_canonicalized_resource(self):
-        return ''.join(["/", self.bucket, self.http_request_uri])
+        result = ["/", self.bucket, self.http_request_uri] if self.bucket else [self.http_request_uri]
+        if self.sub_resources:
+            result.extend(['?', '&'.join(self.sub_resources)])
+        return ''.join(result)
     
 
 class S3Auth(AuthBase):
     
     NON_AMZ_HEADERS_TO_SIGN = ('Content-MD5', 'Content-Type', 'Date')
     
-    def __init__(self, access_key_id, secret_access_key, region):
+    def __init__(self, access_key_id, secret_access_key, region, bucket=None):
         self.access_key_id = str(access_key_id)
         self.secret_access_key = str(secret_access_key)
         self.region = region
+        self.bucket = bucket
         
     def __call__(self, r):
         # Create date header if it is not created yet.
         if 'Date' not in r.headers and 'X-Amz-Date' not in r.headers:
-            r.headers[b'X-Amz-Date'] = http_date()
+            r.headers[str('X-Amz-Date')] = http_date()
         
         signature = S3Signature(
             url = r.url, 
@@ -134,10 +195,271 @@ class S3Auth(AuthBase):
             http_method = r.method,
             region = self.region,
             creds = (self.access_key_id,self.secret_access_key),
-            non_amz_headers_to_sign = self.NON_AMZ_HEADERS_TO_SIGN
+            non_amz_headers_to_sign = self.NON_AMZ_HEADERS_TO_SIGN,
+            bucket = self.bucket
         )
         
         authorization_string = 'AWS %s:%s' % (self.access_key_id, signature.get_signature())
-        r.headers[b'Authorization'] = authorization_string.encode('utf-8')
+        r.headers[str('Authorization')] = authorization_string.encode('utf-8')
+        
+        return r
+
+
+def get_aws_chunked_length(size, chunk_size=STREAMING_CHUNK_SIZE):
+    # Length of a payload of size bytes once framed as signed chunks:
+    # "<hex size>;chunk-signature=<64 hex>\r\n<data>\r\n", closed by an empty chunk.
+    chunks = [chunk_size] * (size // chunk_size)
+    if size % chunk_size:
+        chunks.append(size % chunk_size)
+    chunks.append(0)
+    return sum(len('%x' % n) + len(';chunk-signature=') + 64 + 4 + n for n in chunks)
+
+
+class SigV4Signer(object):
+    
+    # Signature Version 4. The signing key derived from the secret, the date,
+    # the region and the service is valid for a whole day, so it is kept
+    # until the date changes and a request costs one HMAC over its canonical
+    # request.
+    
+    def __init__(self, access_key_id, secret_access_key, region, service=SIGV4_SERVICE):
+        self.access_key_id = str(access_key_id)
+        self.secret_access_key = str(secret_access_key)
+        self.region = region
+        self.service = service
+        self._signing_key = None
+    
+    def _get_signing_state(self, date_stamp):
+        # Replaced as a whole, so concurrent threads never see a torn entry.
+        cached = self._signing_key
+        if cached is None or cached[0] != date_stamp:
+            key = hmac_sha256(('AWS4%s' % self.secret_access_key).encode('utf-8'), date_stamp.encode('utf-8'))
+            for part in (self.region, self.service, 'aws4_request'):
+                key = hmac_sha256(key, part.encode('utf-8'))
+            # The HMAC key schedule is computed once as well and copied per signature.
+            cached = self._signing_key = (date_stamp, key, hmac.new(key, digestmod=sha256))
+        return cached
+    
+    def get_signing_key(self, date_stamp):
+        return self._get_signing_state(date_stamp)[1]
+    
+    def get_amz_date(self, timestamp=None):
+        return time.strftime('%Y%m%dT%H%M%SZ', time.gmtime(time.time() if timestamp is None else timestamp))
+    
+    def get_scope(self, amz_date):
+        return '%s/%s/%s/aws4_request' % (amz_date[:8], self.region, self.service)
+    
+    def sign(self, amz_date, string_to_sign):
+        signer = self._get_signing_state(amz_date[:8])[2].copy()
+        signer.update(string_to_sign.encode('utf-8'))
+        return signer.hexdigest()
+    
+    def _get_host(self, parsed_url):
+        host = parsed_url.netloc.rsplit('@', 1)[-1]
+        default_port = {'http': ':80', 'https': ':443'}.get(parsed_url.scheme)
+        if default_port and host.endswith(default_port):
+            host = host[:-len(default_port)]
+        return host
+    
+    def get_canonical_uri(self, path):
+        # S3 keys are signed as sent, encoded once and without normalization.
+        return urlquote(urlunquote(path), safe='/~') or '/'
+    
+    def _get_canonical_query(self, params):
+        return '&'.join(sorted(
+            '%s=%s' % (urlquote(key, safe='~'), urlquote(value, safe='~')) for key, value in params
+        ))
+    
+    def _get_canonical_headers(self, headers):
+        canonical = dict(
+            (header.lower(), ' '.join(text_type(value).split()))
+            for header, value in headers.items()
+        )
+        names = sorted(canonical)
+        return ''.join('%s:%s\n' % (name, canonical[name]) for name in names), ';'.join(names)
+    
+    def _get_signature(self, method, parsed_url, query, headers, payload_hash, amz_date):
+        canonical_headers, signed_headers = self._get_canonical_headers(headers)
+        canonical_request = '\n'.join((
+            method,
+            self.get_canonical_uri(parsed_url.path),
+            query,
+            canonical_headers,
+            signed_headers,
+            payload_hash
+        ))
+        string_to_sign = '\n'.join((
+            SIGV4_ALGORITHM, amz_date, self.get_scope(amz_date), sha256_hex(canonical_request.encode('utf-8'))
+        ))
+        return self.sign(amz_date, string_to_sign), signed_headers
+    
+    def sign_headers(self, method, url, headers, payload_hash, timestamp=None):
+        # Returns the headers to add to the request; headers must already hold
+        # everything that is to be signed besides host and the x-amz-date.
+        parsed_url = urlparse(url)
+        amz_date = self.get_amz_date(timestamp)
+        
+        signed = dict(
+            (header.lower(), value) for header, value in headers.items()
+            if header.lower() in SIGV4_SIGNED_HEADERS or header.lower().startswith('x-amz-')
+        )
+        signed.update({
+            'host': self._get_host(parsed_url),
+            'x-amz-date': amz_date,
+            'x-amz-content-sha256': payload_hash
+        })
+        # The framed length of a chunked payload is part of its signature.
+        if payload_hash == STREAMING_PAYLOAD:
+            signed['content-length'] = headers['Content-Length']
+        
+        signature, signed_headers = self._get_signature(
+            method, parsed_url, self._get_canonical_query(parse_qsl(parsed_url.query, keep_blank_values=True)),
+            signed, payload_hash, amz_date
+        )
+        authorization = '%s Credential=%s/%s, SignedHeaders=%s, Signature=%s' % (
+            SIGV4_ALGORITHM, self.access_key_id, self.get_scope(amz_date), signed_headers, signature
+        )
+        return {
+            'X-Amz-Date': amz_date,
+            'X-Amz-Content-Sha256': payload_hash,
+            'Authorization': authorization
+        }
+    
+    def get_presign_query(self, expires_in, timestamp=None, params=()):
+        # The canonical query of a presigned URL; it does not depend on the
+        # object, so a batch of URLs can share it.
+        amz_date = self.get_amz_date(timestamp)
+        params = list(params) + [
+            ('X-Amz-Algorithm', SIGV4_ALGORITHM),
+            ('X-Amz-Credential', '%s/%s' % (self.access_key_id, self.get_scope(amz_date))),
+            ('X-Amz-Date', amz_date),
+            ('X-Amz-Expires', str(min(int(expires_in), MAX_PRESIGNED_EXPIRES))),
+            ('X-Amz-SignedHeaders', 'host')
+        ]
+        return amz_date, self._get_canonical_query(params)
+    
+    def get_presign_signature(self, method, host, path, query, amz_date):
+        canonical_request = '%s\n%s\n%s\nhost:%s\n\nhost\n%s' % (
+            method, self.get_canonical_uri(path), query, host, UNSIGNED_PAYLOAD
+        )
+        string_to_sign = '\n'.join((
+            SIGV4_ALGORITHM, amz_date, self.get_scope(amz_date), sha256_hex(canonical_request.encode('utf-8'))
+        ))
+        return self.sign(amz_date, string_to_sign)
+    
+    def presign_url(self, method, url, expires_in, timestamp=None):
+        parsed_url = urlparse(url)
+        amz_date, query = self.get_presign_query(
+            expires_in, timestamp, parse_qsl(parsed_url.query, keep_blank_values=True)
+        )
+        signature = self.get_presign_signature(method, self._get_host(parsed_url), parsed_url.path, query, amz_date)
+        return '%s://%s%s?%s&X-Amz-Signature=%s' % (parsed_url.scheme, parsed_url.netloc, parsed_url.path, query, signature)
+    
+    def sign_chunk(self, amz_date, previous_signature, data):
+        string_to_sign = '\n'.join((
+            '%s-PAYLOAD' % SIGV4_ALGORITHM, amz_date, self.get_scope(amz_date),
+            previous_signature, EMPTY_PAYLOAD_SHA256, sha256_hex(data)
+        ))
+        return self.sign(amz_date, string_to_sign)
+
+
+class AwsChunkedPayload(object):
+    
+    # A request body sent as STREAMING-AWS4-HMAC-SHA256-PAYLOAD: every chunk
+    # is signed as it is read, chained to the signature of the one before, so
+    # the content never has to be hashed up front.
+    
+    def __init__(self, fileobj, size, signer, amz_date, seed_signature, chunk_size=STREAMING_CHUNK_SIZE):
+        self.fileobj = fileobj
+        self.size = size
+        self.signer = signer
+        self.amz_date = amz_date
+        self.chunk_size = chunk_size
+        self._signature = seed_signature
+        self._buffer = b''
+        self._done = False
+    
+    def __len__(self):
+        return get_aws_chunked_length(self.size, self.chunk_size)
+    
+    def __iter__(self):
+        while True:
+            data = self.read(self.chunk_size)
+            if not data:
+                break
+            yield data
+    
+    def _read_chunk_data(self):
+        # Every chunk but the last must be exactly chunk_size long.
+        parts, remaining = [], self.chunk_size
+        while remaining:
+            data = self.fileobj.read(remaining)
+            if not data:
+                break
+            parts.append(data)
+            remaining -= len(data)
+        return b''.join(parts)
+    
+    def _next_chunk(self):
+        data = self._read_chunk_data()
+        self._signature = self.signer.sign_chunk(self.amz_date, self._signature, data)
+        if not data:
+            self._done = True
+        return b''.join((('%x;chunk-signature=%s\r\n' % (len(data), self._signature)).encode('ascii'), data, b'\r\n'))
+    
+    def read(self, size=-1):
+        parts, length = [self._buffer], len(self._buffer)
+        while not self._done and (size < 0 or length < size):
+            parts.append(self._next_chunk())
+            length += len(parts[-1])
+        
+        data = b''.join(parts)
+        if size < 0:
+            size = length
+        data, self._buffer = data[:size], data[size:]
+        return data
+
+
+class S3AuthV4(AuthBase):
+    
+    # Streaming bodies are sent as signed chunks unless streaming is off, in
+    # which case they go unsigned (fine over HTTPS). In-memory bodies are
+    # hashed as a whole.
+    
+    def __init__(self, access_key_id, secret_access_key, region, streaming=True):
+        self.signer = SigV4Signer(access_key_id, secret_access_key, region)
+        self.streaming = streaming
+    
+    def _get_payload_hash(self, r):
+        if 'X-Amz-Content-Sha256' in r.headers:
+            return r.headers['X-Amz-Content-Sha256']
+        if r.body is None:
+            return EMPTY_PAYLOAD_SHA256
+        if isinstance(r.body, text_type):
+            return sha256_hex(r.body.encode('utf-8'))
+        if isinstance(r.body, bytes):
+            return sha256_hex(r.body)
+        if self.streaming and r.headers.get('Content-Length'):
+            return STREAMING_PAYLOAD
+        return UNSIGNED_PAYLOAD
+    
+    def __call__(self, r):
+        payload_hash = self._get_payload_hash(r)
+        timestamp = time.time()
+        
+        if payload_hash == STREAMING_PAYLOAD:
+            size = int(r.headers['Content-Length'])
+            encoding = r.headers.get('Content-Encoding')
+            r.headers[str('Content-Encoding')] = 'aws-chunked,%s' % encoding if encoding else 'aws-chunked'
+            r.headers[str('X-Amz-Decoded-Content-Length')] = str(size)
+            r.headers[str('Content-Length')] = str(get_aws_chunked_length(size))
+        
+        signed = self.signer.sign_headers(r.method, r.url, r.headers, payload_hash, timestamp)
+        for header, value in signed.items():
+            r.headers[str(header)] = str(value)
+        
+        if payload_hash == STREAMING_PAYLOAD:
+            seed_signature = signed['Authorization'].rsplit('Signature=', 1)[-1]
+            r.body = AwsChunkedPayload(r.body, size, self.signer, signed['X-Amz-Date'], seed_signature)
         
         return r
\ No newline at end of file
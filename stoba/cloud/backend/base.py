@@ -35,8 +35,11 @@
 
 from __future__ import unicode_literals, absolute_import
 
+from django.core.exceptions import SuspiciousFileOperation
+from django.utils.crypto import get_random_string
 from stoba.core.base import BaseStorage
 from os.path import normpath
+import os
 
 class CloudStorage(BaseStorage):
     
@@ -52,4 +55,47 @@ class CloudStorage(BaseStorage):
             else:
                 files.append(path)
                 
-        return (folders, files)
\ No newline at end of file
+        return (folders, files)
+    
+    def _get_taken_names(self, prefix):
+        # Returns every existing name starting with prefix.
+        raise NotImplementedError('subclasses of CloudStorage must provide a _get_taken_names() method')
+    
+    def _iter_candidate_names(self, name, max_length=None):
+        # Yields the names get_available_name may pick, in order, each with
+        # the prefix of the existing names it has to be checked against.
+        # Candidates longer than max_length are skipped.
+        dir_name, file_name = os.path.split(name)
+        file_root, file_ext = os.path.splitext(file_name)
+        
+        while True:
+            if not max_length or len(name) <= max_length:
+                yield os.path.join(dir_name, file_root), name
+            name = os.path.join(dir_name, '%s_%s%s' % (file_root, get_random_string(7), file_ext))
+            if max_length is None:
+                continue
+            truncation = len(name) - max_length
+            if truncation > 0:
+                # A shorter root widens the prefix.
+                file_root = file_root[:-truncation]
+                if not file_root:
+                    raise SuspiciousFileOperation(
+                        'Storage can not find an available filename for "%s". '
+                        'Please make sure that the corresponding file field '
+                        'allows sufficient "max_length".' % name
+                    )
+                name = os.path.join(dir_name, '%s_%s%s' % (file_root, get_random_string(7), file_ext))
+    
+    def get_available_name(self, name, max_length=None):
+        return self._get_available_name(name, max_length, {})
+    
+    def _get_available_name(self, name, max_length, taken):
+        # Storage.get_available_name sends an exists() request per candidate.
+        # All candidates share the file root as prefix, so the names taken are
+        # fetched once and the candidates are checked locally. taken maps the
+        # prefixes fetched so far to their names and may be shared by calls.
+        for prefix, candidate in self._iter_candidate_names(name, max_length):
+            if prefix not in taken:
+                taken[prefix] = self._get_taken_names(prefix)
+            if self._get_path(candidate) not in taken[prefix]:
+                return candidate
\ No newline at end of file
@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import
+
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from .executor import EXECUTOR_ERRORS
+from ...core.instrumentation import bind, current_operation
+import threading
+import time
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+
+class BulkResult(object):
+    
+    def __init__(self):
+        self.succeeded = []
+        self.failed = {}
+        self._lock = threading.Lock()
+    
+    def add_success(self, name):
+        with self._lock:
+            self.succeeded.append(name)
+    
+    def add_failure(self, name, error):
+        with self._lock:
+            self.failed[name] = error
+    
+    def update(self, other):
+        with self._lock:
+            self.succeeded.extend(other.succeeded)
+            self.failed.update(other.failed)
+    
+    @property
+    def ok(self):
+        return not self.failed
+    
+    def __repr__(self):
+        return '<%s: %d succeeded, %d failed>' % (self.__class__.__name__, len(self.succeeded), len(self.failed))
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            break
+        yield batch
+
+
+def call_with_retries(func, retries, backoff=0.1):
+    attempt = 0
+    while True:
+        try:
+            return func()
+        except IOError as e:
+            # Only failures of our own, such as a checksum mismatch, are worth
+            # another attempt: failed requests have been retried already.
+            if isinstance(e, EXECUTOR_ERRORS):
+                raise
+            attempt += 1
+            if attempt > retries:
+                raise
+            if current_operation() is not None:
+                current_operation().record_retry()
+            time.sleep(backoff * (2 ** attempt))
+
+
+def run_concurrently(func, iterable, concurrency):
+    # Items are pulled from the iterable only when a worker is about to become
+    # free, so a slow consumer never makes us buffer a huge (or endless) input.
+    slots = threading.BoundedSemaphore(concurrency * 2)
+    errors = []
+    
+    @bind
+    def call(item):
+        try:
+            func(item)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            slots.release()
+    
+    with ThreadPoolExecutor(concurrency) as executor:
+        for item in iterable:
+            slots.acquire()
+            if errors:
+                slots.release()
+                break
+            executor.submit(call, item)
+    
+    if errors:
+        raise errors[0]
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import
+
+from django.core.files.base import File
+from fnmatch import fnmatch
+import gzip
+import io
+import mimetypes
+import os
+import tempfile
+import zlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+
+COMPRESSION_CHUNK_SIZE = 64 * 1024 # 64 KB
+COMPRESSION_SPOOL_SIZE = 4 * 1024 * 1024 # 4 MB, kept in memory before spilling to disk
+COMPRESSION_MIN_SIZE = 1024 # 1 KB, below this the gzip header outweighs the savings
+COMPRESSION_MAX_RATIO = 0.9
+
+# Content types, as shell patterns, that are worth compressing.
+COMPRESSIBLE_TYPES = (
+    'text/*',
+    'application/javascript',
+    'application/x-javascript',
+    'application/json',
+    'application/*+json',
+    'application/xml',
+    'application/*+xml',
+    'image/svg+xml',
+    'font/ttf',
+    'font/otf'
+)
+
+COMPRESSION_ENCODINGS = ('gzip', 'br')
+
+# Stored with a compressed object, so its original length is known.
+UNCOMPRESSED_SIZE_HEADER = 'x-amz-meta-uncompressed-size'
+
+
+def get_content_type(name, content=None, content_type_as=None):
+    # content_type_as is a content type, a dict of content types by file
+    # extension or a callable taking the name. Otherwise the type an uploaded
+    # file came with is used, or one is guessed from the name.
+    content_type = None
+    if callable(content_type_as):
+        content_type = content_type_as(name)
+    elif isinstance(content_type_as, dict):
+        content_type = content_type_as.get(os.path.splitext(name)[1].lower())
+    elif content_type_as:
+        content_type = content_type_as
+    
+    return content_type or getattr(content, 'content_type', None) or mimetypes.guess_type(name)[0]
+
+
+def is_compressible(content_type, patterns=COMPRESSIBLE_TYPES):
+    if not content_type:
+        return False
+    content_type = content_type.split(';')[0].strip().lower()
+    return any(fnmatch(content_type, pattern) for pattern in patterns)
+
+
+class BrotliWriter(object):
+    
+    def __init__(self, fileobj, quality=None):
+        self.fileobj = fileobj
+        self._compressor = brotli.Compressor(quality=quality) if quality is not None else brotli.Compressor()
+    
+    def write(self, data):
+        self.fileobj.write(self._compressor.process(data))
+    
+    def close(self):
+        self.fileobj.write(self._compressor.finish())
+
+
+class BrotliReader(io.RawIOBase):
+    
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self._decompressor = brotli.Decompressor()
+        self._buffer = b''
+        self._eof = False
+    
+    def readable(self):
+        return True
+    
+    def readinto(self, b):
+        while not self._buffer and not self._eof:
+            data = self.fileobj.read(COMPRESSION_CHUNK_SIZE)
+            if data:
+                self._buffer = self._decompressor.process(data)
+            else:
+                self._eof = True
+        
+        size = min(len(b), len(self._buffer))
+        b[:size] = self._buffer[:size]
+        self._buffer = self._buffer[size:]
+        return size
+    
+    def close(self):
+        self.fileobj.close()
+        super(BrotliReader, self).close()
+
+
+class GzipReader(gzip.GzipFile):
+    
+    # Closes the compressed stream along with itself.
+    
+    def close(self):
+        fileobj = self.fileobj
+        super(GzipReader, self).close()
+        if fileobj is not None:
+            fileobj.close()
+
+
+class DecodingReader(io.RawIOBase):
+    
+    # Reads fileobj decompressed, if get_compression() returns an encoding
+    # along with the original size, or as it is if it returns (None, None).
+    # It is only asked once the content or the size is needed, so opening a
+    # file sends no request.
+    
+    def __init__(self, fileobj, get_compression):
+        self.fileobj = fileobj
+        self.get_compression = get_compression
+        self._reader = None
+        self._size = None
+    
+    def _get_reader(self):
+        if self._reader is None:
+            encoding, self._size = self.get_compression()
+            self._reader = decompress(self.fileobj, encoding) if encoding else self.fileobj
+        return self._reader
+    
+    @property
+    def size(self):
+        reader = self._get_reader()
+        return reader.size if reader is self.fileobj else self._size
+    
+    def readable(self):
+        return True
+    
+    def seekable(self):
+        return True
+    
+    def tell(self):
+        return 0 if self._reader is None else self._reader.tell()
+    
+    def seek(self, offset, whence=os.SEEK_SET):
+        # File.chunks() rewinds before reading.
+        if self._reader is None and offset == 0 and whence in (os.SEEK_SET, os.SEEK_CUR):
+            return 0
+        return self._get_reader().seek(offset, whence)
+    
+    def read(self, size=-1):
+        return self._get_reader().read(-1 if size is None else size)
+    
+    def readall(self):
+        return self.read(-1)
+    
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+    
+    def close(self):
+        # The readers decompress() returns close the compressed stream too.
+        (self.fileobj if self._reader is None else self._reader).close()
+        super(DecodingReader, self).close()
+
+
+def _get_writer(fileobj, encoding, level):
+    if encoding == 'br':
+        return BrotliWriter(fileobj, level)
+    # A fixed mtime keeps the output, and so the ETag, the same for the same
+    # content.
+    return gzip.GzipFile(fileobj=fileobj, mode='wb', compresslevel=level or 6, mtime=0)
+
+
+def compress(content, encoding='gzip', level=None, max_ratio=COMPRESSION_MAX_RATIO):
+    # Compresses a File chunk by chunk into a temporary file, which stays in
+    # memory up to COMPRESSION_SPOOL_SIZE. Returns None, with the content
+    # rewound, when the result would not be at most max_ratio of the size.
+    output = tempfile.SpooledTemporaryFile(COMPRESSION_SPOOL_SIZE)
+    writer = _get_writer(output, encoding, level)
+    
+    content.seek(0)
+    for chunk in content.chunks(COMPRESSION_CHUNK_SIZE):
+        writer.write(chunk)
+    writer.close()
+    content.seek(0)
+    
+    size = output.tell()
+    if size > content.size * max_ratio:
+        output.close()
+        return None
+    
+    output.seek(0)
+    result = File(output, content.name)
+    result.size = size
+    return result
+
+
+def decompress(fileobj, encoding):
+    if encoding == 'br':
+        return io.BufferedReader(BrotliReader(fileobj))
+    return GzipReader(fileobj=fileobj, mode='rb')
+
+
+def get_decompressor(encoding):
+    # Returns a function decompressing a stream chunk by chunk, for readers
+    # that cannot be wrapped by decompress().
+    if encoding == 'br':
+        return brotli.Decompressor().process
+    return zlib.decompressobj(16 + zlib.MAX_WBITS).decompress
\ No newline at end of file
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import
+
+from django.utils import six
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import deque
+from .exceptions import S3ResponseError, DeadlineExceeded
+from ...core.instrumentation import bind, current_operation
+import requests
+import threading
+import random
+import time
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+
+IDEMPOTENT_METHODS = ('GET', 'HEAD')
+RETRYABLE_ERROR_CODES = ('SlowDown', 'RequestTimeout', 'InternalError', 'ServiceUnavailable')
+# Errors of requests sent through the executor, which has retried them as far
+# as it makes sense already; retrying them again only multiplies the attempts.
+EXECUTOR_ERRORS = (S3ResponseError, DeadlineExceeded, requests.RequestException)
+LATENCY_SAMPLES = 200
+MIN_LATENCY_SAMPLES = 20
+
+
+class LatencyTracker(object):
+    
+    def __init__(self, size=LATENCY_SAMPLES):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+    
+    def add(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+    
+    def percentile(self, percent):
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * percent / 100.0))]
+
+
+class RequestExecutor(object):
+    
+    # Sends every request of a storage: per-attempt timeouts bounded by an
+    # overall deadline, retries with jittered exponential backoff on 5xx,
+    # SlowDown and connection errors, and optionally a hedged second request
+    # for GET and HEAD once the first is slower than the observed p95.
+    
+    def __init__(self, session_pool, retries=3, backoff=0.1, max_backoff=5, deadline=None,
+                 hedge=False, hedge_percentile=95, hedge_min_delay=0.05, hedge_concurrency=10):
+        self.session_pool = session_pool
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.deadline = deadline
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_concurrency = hedge_concurrency
+        self._latency = {}
+        self._hedge_executor = None
+        self._hedge_slots = threading.BoundedSemaphore(hedge_concurrency)
+        self._lock = threading.Lock()
+    
+    def _get_latency(self, method):
+        with self._lock:
+            if method not in self._latency:
+                self._latency[method] = LatencyTracker()
+            return self._latency[method]
+    
+    def _get_hedge_executor(self):
+        with self._lock:
+            if self._hedge_executor is None:
+                self._hedge_executor = ThreadPoolExecutor(self.hedge_concurrency)
+            return self._hedge_executor
+    
+    def is_retryable(self, response):
+        if response.status_code >= 500:
+            return True
+        # Throttling and idle timeouts are occasionally reported as 4xx.
+        if response.status_code in (400, 429):
+            return S3ResponseError(response).error_code in RETRYABLE_ERROR_CODES
+        return False
+    
+    def _get_delay(self, attempt):
+        # "Full jitter": spreads the retries of many clients over the window.
+        return random.uniform(0, min(self.max_backoff, self.backoff * (2 ** attempt)))
+    
+    def _get_timeout(self, timeout, deadline):
+        if deadline is None:
+            return timeout
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            raise DeadlineExceeded('Deadline exceeded')
+        connect_timeout, read_timeout = timeout if isinstance(timeout, tuple) else (timeout, timeout)
+        return (
+            remaining if connect_timeout is None else min(connect_timeout, remaining),
+            remaining if read_timeout is None else min(read_timeout, remaining)
+        )
+    
+    def _get_rewind(self, data):
+        # Returns a callable that puts a request body back to where it started,
+        # or None if it cannot be sent twice.
+        if data is None or isinstance(data, (bytes, six.text_type, dict, list, tuple)):
+            return lambda: None
+        if hasattr(data, 'seek') and hasattr(data, 'tell'):
+            try:
+                position = data.tell()
+            except (IOError, OSError):
+                return None
+            return lambda: data.seek(position)
+        return None
+    
+    def _send(self, method, url, kwargs):
+        started = time.time()
+        response = self.session_pool.request(method, url, **kwargs)
+        self._get_latency(method).add(time.time() - started)
+        return response
+    
+    def _submit(self, method, url, kwargs):
+        # Returns None rather than have the request wait for a busy pool.
+        if not self._hedge_slots.acquire(False):
+            return None
+        future = self._get_hedge_executor().submit(bind(self._send), method, url, kwargs)
+        future.add_done_callback(lambda future: self._hedge_slots.release())
+        return future
+    
+    def _send_hedged(self, method, url, kwargs):
+        delay = self._get_latency(method).percentile(self.hedge_percentile)
+        first = None if delay is None else self._submit(method, url, kwargs)
+        if first is None:
+            # Hedging is best effort: a request is never queued behind others
+            # just so that it could be hedged, it is sent right away instead.
+            return self._send(method, url, kwargs)
+        
+        futures = [first]
+        done, _ = wait(futures, max(delay, self.hedge_min_delay))
+        if not done:
+            second = self._submit(method, url, kwargs)
+            if second is not None:
+                futures.append(second)
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+        
+        winner = next(iter(done))
+        for future in futures:
+            if future is not winner:
+                # The slower response is dropped as soon as it arrives.
+                future.add_done_callback(_close_response)
+        return winner.result()
+    
+    def execute(self, method, url, **kwargs):
+        deadline = kwargs.pop('deadline', self.deadline)
+        deadline = None if deadline is None else time.time() + deadline
+        timeout = kwargs.pop('timeout', self.session_pool.timeout)
+        rewind = self._get_rewind(kwargs.get('data'))
+        hedge = self.hedge and method in IDEMPOTENT_METHODS
+        attempt = 0
+        
+        while True:
+            kwargs['timeout'] = self._get_timeout(timeout, deadline)
+            
+            try:
+                if hedge:
+                    response = self._send_hedged(method, url, kwargs)
+                else:
+                    response = self._send(method, url, kwargs)
+                error = None
+            except (requests.ConnectionError, requests.Timeout) as e:
+                response, error = None, e
+            
+            if error is None and not self.is_retryable(response):
+                return response
+            
+            attempt += 1
+            delay = self._get_delay(attempt)
+            if attempt > self.retries or rewind is None or \
+                    (deadline is not None and time.time() + delay >= deadline):
+                if error is not None:
+                    raise error
+                return response
+            
+            if response is not None:
+                response.close()
+            if current_operation() is not None:
+                current_operation().record_retry()
+            
+            time.sleep(delay)
+            rewind()
+
+
+def _close_response(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
\ No newline at end of file
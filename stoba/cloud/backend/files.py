@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import
+
+from django.core.files.base import File
+from concurrent.futures import ThreadPoolExecutor
+from .exceptions import S3ResponseError
+from ...core.instrumentation import bind
+import io
+import os
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+
+HTTP_PARTIAL_CONTENT = 206
+HTTP_RANGE_NOT_SATISFIABLE = 416
+
+
+def _get_size_from_content_range(content_range):
+    # Content-Range: bytes 0-1023/4096 or bytes */4096
+    if content_range and '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        if total.isdigit():
+            return int(total)
+    return None
+
+
+def get_object_range(storage, name, start, end=None):
+    # Returns the requested bytes and, when the response reveals it, the
+    # total size of the object.
+    headers = {'Range': 'bytes=%d-%s' % (start, '' if end is None else end)}
+    response = storage._request('GET', storage._get_object_url(name), headers=headers, stream=True)
+    
+    try:
+        if response.status_code == HTTP_RANGE_NOT_SATISFIABLE:
+            return b'', _get_size_from_content_range(response.headers.get('Content-Range'))
+        if response.status_code == HTTP_PARTIAL_CONTENT:
+            size = _get_size_from_content_range(response.headers.get('Content-Range'))
+            return response.raw.read(decode_content=False), size
+        if response.status_code == 200:
+            # The server ignored the Range header and sent the whole object.
+            data = response.raw.read(decode_content=False)
+            return data[start:None if end is None else end + 1], len(data)
+        raise S3ResponseError(response)
+    finally:
+        response.close()
+
+
+class S3RangeReader(io.RawIOBase):
+    
+    def __init__(self, storage, name, buffer_size, prefetch=False):
+        self.storage = storage
+        self.name = name
+        self.buffer_size = buffer_size
+        self.prefetch = prefetch
+        self._size = None
+        self._position = 0
+        self._buffer = b''
+        self._buffer_start = 0
+        self._prefetched = None
+        self._executor = None
+    
+    def readable(self):
+        return True
+    
+    def seekable(self):
+        return True
+    
+    @property
+    def size(self):
+        if self._size is None:
+            self._size = self.storage.size(self.name)
+        return self._size
+    
+    def tell(self):
+        return self._position
+    
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_SET:
+            position = offset
+        elif whence == os.SEEK_CUR:
+            position = self._position + offset
+        elif whence == os.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError('Invalid whence (%r)' % whence)
+        
+        if position < 0:
+            raise ValueError('Negative seek position %d' % position)
+        
+        self._position = position
+        return position
+    
+    def _get_range(self, start, end=None):
+        with self.storage._operation('read', self.name):
+            data, size = self.storage._get_object_range(self.name, start, end)
+        if size is not None:
+            self._size = size
+        return data
+    
+    def _fill_buffer(self, start, length):
+        prefetched, self._prefetched = self._prefetched, None
+        
+        if prefetched is not None and prefetched[0] == start and 0 <= length <= self.buffer_size:
+            data = prefetched[1].result()
+        elif self._size is not None and start >= self._size:
+            data = b''
+        else:
+            end = None if length < 0 else start + max(length, self.buffer_size) - 1
+            if self._size is not None and end is not None:
+                end = min(end, self._size - 1)
+            data = self._get_range(start, end)
+        
+        self._buffer, self._buffer_start = data, start
+        
+        next_start = start + len(data)
+        if self.prefetch and data and (self._size is None or next_start < self._size):
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(1)
+            self._prefetched = (next_start, self._executor.submit(
+                bind(self._get_range), next_start, next_start + self.buffer_size - 1
+            ))
+    
+    def read(self, size=-1):
+        if size is None:
+            size = -1
+        if size == 0 or (self._size is not None and self._position >= self._size):
+            return b''
+        
+        offset = self._position - self._buffer_start
+        buffer_end = self._buffer_start + len(self._buffer)
+        
+        if 0 <= offset < len(self._buffer) and (size >= 0 and self._position + size <= buffer_end):
+            data = self._buffer[offset:offset + size]
+        else:
+            # Keep whatever part of the request is already buffered and fetch
+            # only the remainder.
+            head = self._buffer[offset:] if 0 <= offset < len(self._buffer) else b''
+            remaining = -1 if size < 0 else size - len(head)
+            self._fill_buffer(self._position + len(head), remaining)
+            data = head + (self._buffer if remaining < 0 else self._buffer[:remaining])
+        
+        self._position += len(data)
+        return data
+    
+    def readall(self):
+        return self.read(-1)
+    
+    def readinto(self, b):
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+    
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._buffer, self._prefetched = b'', None
+        super(S3RangeReader, self).close()
+
+
+class S3File(File):
+    
+    def __init__(self, storage, name, buffer_size, prefetch=False):
+        super(S3File, self).__init__(S3RangeReader(storage, name, buffer_size, prefetch), name)
+        self.mode = 'rb'
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import
+
+from hashlib import md5
+from .exceptions import ChecksumMismatch
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+
+CHUNK_SIZE = 64 * 1024 # 64 KB
+
+
+def multipart_etag(digests):
+    # S3's ETag of a multipart object: the MD5 of the concatenated part MD5s
+    # followed by the number of parts.
+    return '%s-%d' % (md5(b''.join(digests)).hexdigest(), len(digests))
+
+
+def verify_etag(etag, expected, name):
+    # Objects encrypted with SSE-KMS report an ETag that is not their MD5;
+    # such setups turn verification off.
+    if etag and etag.strip('"') != expected:
+        raise ChecksumMismatch('ETag %s of %s does not match the uploaded content (%s)' % (etag, name, expected))
+
+
+class HashingReader(object):
+    
+    # The body of a single PUT: the MD5 is computed while requests reads the
+    # content, so checking it costs no second pass over the data. Rewinding
+    # (for a retry) starts the hash over.
+    
+    def __init__(self, fileobj, size):
+        self.fileobj = fileobj
+        self.size = size
+        self.seek(0)
+    
+    def __len__(self):
+        return self.size
+    
+    def __iter__(self):
+        while True:
+            data = self.read(CHUNK_SIZE)
+            if not data:
+                break
+            yield data
+    
+    def tell(self):
+        return self._position
+    
+    def seek(self, offset, whence=0):
+        if offset != 0 or whence != 0:
+            raise IOError('%s can only be rewound' % self.__class__.__name__)
+        self.fileobj.seek(0)
+        self._md5 = md5()
+        self._position = 0
+    
+    def read(self, size=-1):
+        data = self.fileobj.read(size)
+        self._md5.update(data)
+        self._position += len(data)
+        return data
+    
+    def digest(self):
+        return self._md5.digest()
+    
+    def hexdigest(self):
+        return self._md5.hexdigest()
\ No newline at end of file
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import
+
+from xml.etree.ElementTree import iterparse
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+
+def _local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+
+class ListBucketResultParser(object):
+    
+    # ListObjects responses are parsed element by element and every entry is
+    # dropped as soon as it has been handed out, so a page never has to be
+    # held in memory as a whole.
+    
+    def __init__(self, stream):
+        self.stream = stream
+        self.is_truncated = False
+        self.next_marker = None
+        self.last_key = None
+    
+    def _get_children(self, elem):
+        return dict((_local_name(child.tag), child.text) for child in elem)
+    
+    def __iter__(self):
+        root = None
+        
+        for event, elem in iterparse(self.stream, events=('start', 'end')):
+            if root is None:
+                root = elem
+                continue
+            if event != 'end':
+                continue
+            
+            tag = _local_name(elem.tag)
+            
+            if tag == 'Contents':
+                children = self._get_children(elem)
+                self.last_key = children.get('Key')
+                yield {
+                    'key': self.last_key,
+                    'size': int(children.get('Size') or 0),
+                    'last-modified': children.get('LastModified'),
+                    'etag': children.get('ETag')
+                }
+            elif tag == 'CommonPrefixes':
+                self.last_key = self._get_children(elem).get('Prefix')
+                yield {'key': self.last_key, 'prefix': True}
+            elif tag == 'IsTruncated':
+                self.is_truncated = (elem.text or '').strip().lower() == 'true'
+            elif tag == 'NextMarker':
+                self.next_marker = elem.text
+            else:
+                continue
+            
+            root.clear()
+    
+    @property
+    def marker(self):
+        # NextMarker is only returned when a delimiter is used; otherwise the
+        # last key of the page is the marker for the next one.
+        return self.next_marker or self.last_key
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import
+
+from django.utils.http import urlquote
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import md5
+from binascii import hexlify
+from .exceptions import S3ResponseError
+from .integrity import multipart_etag, verify_etag
+from ..auth.helper import base_64
+from ...core.instrumentation import bind, current_operation
+import threading
+import time
+import xmltodict
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+
+MAX_PARTS = 10000
+
+
+def get_part_size(part_size, total_size):
+    if total_size is None:
+        return part_size
+    # S3 refuses more than 10000 parts, so very large files get larger parts.
+    return max(part_size, -(-total_size // MAX_PARTS))
+
+
+class MultipartUpload(object):
+    
+    def __init__(self, storage, name, part_size, concurrency=4, retries=3, verify=True):
+        self.storage = storage
+        self.name = name
+        self.part_size = part_size
+        self.concurrency = concurrency
+        self.retries = retries
+        self.verify = verify
+        self.url = storage._get_object_url(name)
+        self.upload_id = None
+        self.digests = {}
+    
+    def _get_part_size(self, total_size):
+        return get_part_size(self.part_size, total_size)
+    
+    def _parse(self, response):
+        data = xmltodict.parse(response.content)
+        if 'Error' in data:
+            raise S3ResponseError(response, data['Error'].get('Code'))
+        return data
+    
+    def _get_upload_url(self):
+        return '%s?uploadId=%s' % (self.url, urlquote(self.upload_id, safe=''))
+    
+    def _get_part_url(self, part_number):
+        return '%s?partNumber=%d&uploadId=%s' % (self.url, part_number, urlquote(self.upload_id, safe=''))
+    
+    def _get_part_headers(self, part_number, data):
+        # Parts are in memory anyway, so S3 is asked to check each of them.
+        digest = md5(data).digest()
+        self.digests[part_number] = digest
+        return {'Content-MD5': base_64(digest)}
+    
+    def _verify_part(self, part_number, etag):
+        if self.verify:
+            verify_etag(etag, hexlify(self.digests[part_number]).decode('ascii'), '%s part %d' % (self.name, part_number))
+    
+    def _verify_complete(self, result):
+        if self.verify:
+            verify_etag(result.get('ETag'), multipart_etag([self.digests[number] for number in sorted(self.digests)]), self.name)
+        return result
+    
+    def _get_complete_body(self, etags):
+        parts = [OrderedDict([('PartNumber', number), ('ETag', etag)]) for number, etag in sorted(etags.items())]
+        return xmltodict.unparse({'CompleteMultipartUpload': {'Part': parts}}).encode('utf-8')
+    
+    def initiate(self, headers=None):
+        response = self.storage._request('POST', '%s?uploads' % self.url, headers=headers)
+        if response.status_code != 200:
+            raise S3ResponseError(response)
+        self.upload_id = self._parse(response)['InitiateMultipartUploadResult']['UploadId']
+        return self.upload_id
+    
+    def _send_part(self, part_number, data, headers, get_etag):
+        # get_etag may raise an IOError to have the part sent again. Failed
+        # requests are not: the executor has retried them already.
+        url = self._get_part_url(part_number)
+        attempt = 0
+        
+        while True:
+            response = self.storage._request('PUT', url, data=data, headers=headers)
+            if response.status_code != 200:
+                raise S3ResponseError(response)
+            try:
+                return get_etag(response)
+            except IOError as e:
+                error = e
+            
+            attempt += 1
+            if attempt > self.retries:
+                raise error
+            if current_operation() is not None:
+                current_operation().record_retry()
+            time.sleep(0.1 * (2 ** attempt))
+    
+    def upload_part(self, part_number, data):
+        def get_etag(response):
+            self._verify_part(part_number, response.headers['ETag'])
+            return response.headers['ETag']
+        
+        return self._send_part(part_number, data, self._get_part_headers(part_number, data), get_etag)
+    
+    def complete(self, etags):
+        response = self.storage._request('POST', self._get_upload_url(), data=self._get_complete_body(etags))
+        if response.status_code != 200:
+            raise S3ResponseError(response)
+        # S3 may report a failed completion with a 200 status and an error document.
+        return self._verify_complete(self._parse(response)['CompleteMultipartUploadResult'])
+    
+    def abort(self):
+        self.storage._request('DELETE', self._get_upload_url())
+    
+    def upload(self, fileobj, size=None, headers=None):
+        part_size = self._get_part_size(size)
+        # Only `concurrency` parts may be held in memory at once; the reader
+        # waits for a slot before pulling the next chunk from the file.
+        slots = threading.BoundedSemaphore(self.concurrency)
+        failed = threading.Event()
+        etags, futures = {}, []
+        
+        @bind
+        def send(part_number, data):
+            try:
+                etags[part_number] = self.upload_part(part_number, data)
+            except Exception:
+                failed.set()
+                raise
+            finally:
+                slots.release()
+        
+        # Like a single PUT, the upload sends the whole file, whatever was
+        # read from it before.
+        if hasattr(fileobj, 'seek'):
+            fileobj.seek(0)
+        
+        self.initiate(headers)
+        try:
+            with ThreadPoolExecutor(self.concurrency) as executor:
+                part_number = 1
+                while not failed.is_set():
+                    slots.acquire()
+                    data = fileobj.read(part_size)
+                    if not data:
+                        slots.release()
+                        break
+                    futures.append(executor.submit(send, part_number, data))
+                    part_number += 1
+            
+            for future in futures:
+                future.result()
+            
+            return self.complete(etags)
+        except BaseException:
+            self.abort()
+            raise
+
+
+
+class MultipartCopy(MultipartUpload):
+    
+    # Builds an object from byte ranges of another one with UploadPartCopy,
+    # so the content never leaves S3. Parts are copied concurrently.
+    
+    def __init__(self, storage, name, copy_source, part_size, concurrency=4, retries=3):
+        # The part checksums are only known to S3.
+        super(MultipartCopy, self).__init__(storage, name, part_size, concurrency, retries, verify=False)
+        self.copy_source = copy_source
+    
+    def copy_part(self, part_number, start, end):
+        headers = {
+            'X-Amz-Copy-Source': self.copy_source,
+            'X-Amz-Copy-Source-Range': 'bytes=%d-%d' % (start, end),
+            'Content-Length': '0'
+        }
+        # A copy that fails after it started is reported with a 200 status.
+        get_etag = lambda response: self._parse(response)['CopyPartResult']['ETag']
+        return self._send_part(part_number, None, headers, get_etag)
+    
+    def copy(self, size, headers=None):
+        part_size = self._get_part_size(size)
+        ranges = [
+            (part_number, start, min(start + part_size, size) - 1)
+            for part_number, start in enumerate(range(0, size, part_size), 1)
+        ]
+        
+        self.initiate(headers)
+        try:
+            with ThreadPoolExecutor(self.concurrency) as executor:
+                etags = dict(zip(
+                    [part_number for part_number, _, _ in ranges],
+                    executor.map(bind(lambda part: self.copy_part(*part)), ranges)
+                ))
+            return self.complete(etags)
+        except BaseException:
+            self.abort()
+            raise
\ No newline at end of file
@@ -38,14 +38,45 @@ from __future__ import unicode_literals, absolute_import
 from django.core.files.base import File
 from django.core.exceptions import ImproperlyConfigured
 from django.utils.deconstruct import deconstructible
-from django.utils.http import parse_http_date_safe, urlquote, urlencode
+from django.utils.http import parse_http_date_safe, http_date, urlquote, urlencode, urlparse
 from django.conf import settings
-from datetime import datetime, timedelta
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
 from .base import CloudStorage
-from ..auth.s3_auth import S3Auth, REGION_ENDPOINT_MAP, get_s3_endpoint, S3Signature
-from ...core.helper import tz_aware_datetime, datetime_to_epoch
+from .session import get_session_pool
+from .executor import RequestExecutor
+from .multipart import MultipartUpload, MultipartCopy
+from .files import S3File, get_object_range
+from .listing import ListBucketResultParser
+from .exceptions import S3ResponseError
+from .bulk import BulkResult, batched, run_concurrently, call_with_retries
+from .sync import compute_etag, iter_local_files, Manifest, SyncResult
+from .spool import WriteBehindSpool
+from .integrity import HashingReader, verify_etag
+from .compression import (
+    COMPRESSIBLE_TYPES, COMPRESSION_ENCODINGS, COMPRESSION_MIN_SIZE, COMPRESSION_MAX_RATIO,
+    UNCOMPRESSED_SIZE_HEADER, DecodingReader, brotli, compress, get_content_type, is_compressible
+)
+from ..auth.s3_auth import S3Auth, S3AuthV4, REGION_ENDPOINT_MAP, SIGV2_REGIONS, get_s3_endpoint
+from ..auth.helper import content_md5, base_64
+from ...core.base import MetadataCache, LRUCache
+from ...core.helper import tz_aware_datetime, iso8601_to_epoch
+from ...core.instrumentation import operation, current_operation, bind
+from ...core.singleflight import SingleFlight
+from ...core.diskcache import DiskCache
+from ...core.keyindex import KeyIndex
+from hashlib import sha1
 import requests
 import xmltodict
+import threading
+import logging
+import posixpath
+import itertools
+import errno
+import hmac
+import os
+import time
 
 
 __author__ = 'Vassim Shahir'
@@ -54,22 +85,103 @@ __copyright__ = 'Copyright 2016 Vassim Shahir'
 
 
 URL_EXPIRE_TIME_IN_SEC = 60 * 30 # 30 minutes
+URL_CACHE_WINDOW_IN_SEC = 60 * 5 # 5 minutes
+MULTIPART_THRESHOLD = 64 * 1024 * 1024 # 64 MB
+MULTIPART_CHUNK_SIZE = 8 * 1024 * 1024 # 8 MB
+READ_BUFFER_SIZE = 256 * 1024 # 256 KB
+MAX_COPY_SIZE = 5 * 1024 * 1024 * 1024 # 5 GB, limit of a single PUT-Copy
+MULTIPART_COPY_PART_SIZE = 512 * 1024 * 1024 # 512 MB
+DISK_CACHE_MAX_SIZE = 1024 * 1024 * 1024 # 1 GB
+DISK_CACHE_MAX_OBJECT_SIZE = 64 * 1024 * 1024 # 64 MB
+METADATA_CACHE_TIMEOUT = 60 * 5 # 5 minutes
+METADATA_CACHE_NEGATIVE_TIMEOUT = 30 # 30 seconds
+KEY_INDEX_RECONCILE_INTERVAL = 60 * 60 # 1 hour
+KEY_INDEX_RECONCILE_LEASE = 60 * 10 # 10 minutes
+KEY_INDEX_CLAIM_INTERVAL = 60 # 1 minute
+
+# Response headers of a HEAD request that are kept in the metadata cache.
+METADATA_HEADERS = ('content-length', 'last-modified', 'etag', 'content-type', 'content-encoding', UNCOMPRESSED_SIZE_HEADER)
+
+# Of those, the ones a listing does not report. Statuses built from a listing
+# leave them out, so that a HEAD can still be sent when they are needed.
+HEAD_ONLY_HEADERS = ('content-encoding', UNCOMPRESSED_SIZE_HEADER)
+
+# Object headers a multipart copy has to set on the destination itself,
+# along with the x-amz-meta-* headers.
+COPIED_HEADERS = ('Cache-Control', 'Content-Disposition', 'Content-Encoding', 'Content-Language', 'Content-Type', 'Expires')
+
+MAX_KEYS_PER_DELETE = 1000 # Limit of the Multi-Object Delete API
+
+ADDRESSING_STYLES = ('virtual', 'path')
+
+logger = logging.getLogger(__name__)
+
+SIGNATURE_VERSIONS = ('s3', 's3v4')
+
+SIZE_REPORTS = ('stored', 'original')
 
 @deconstructible
 class S3(CloudStorage):
     
-    NON_AMZ_HEADERS_FOR_URL_GENERATION = ('Content-MD5', 'Content-Type', 'Expires')
-    
     def __init__(self,options=None):
         
         self._settings = {
             'region': 'us-east-1',
+            'signature_version': 's3',
+            'sign_streaming_payloads': True,
             'access_key_id': None,
             'secret_access_key' : None,
             'bucket_name': None,
             'service_url':  None,
+            'addressing_style': 'virtual',
             'url_expires_in_sec': URL_EXPIRE_TIME_IN_SEC,
-            'set_content_type_as': None
+            'url_cache_window': URL_CACHE_WINDOW_IN_SEC,
+            'url_cache_size': 1000,
+            'set_content_type_as': None,
+            'compression': None,
+            'compression_level': None,
+            'compressible_types': COMPRESSIBLE_TYPES,
+            'compression_min_size': COMPRESSION_MIN_SIZE,
+            'compression_max_ratio': COMPRESSION_MAX_RATIO,
+            'report_size_as': 'stored',
+            'pool_size': 10,
+            'keep_alive': True,
+            'connect_timeout': 10,
+            'read_timeout': 60,
+            'multipart_threshold': MULTIPART_THRESHOLD,
+            'multipart_chunk_size': MULTIPART_CHUNK_SIZE,
+            'multipart_concurrency': 4,
+            'multipart_retries': 3,
+            'multipart_copy_threshold': MAX_COPY_SIZE,
+            'multipart_copy_part_size': MULTIPART_COPY_PART_SIZE,
+            'read_buffer_size': READ_BUFFER_SIZE,
+            'read_prefetch': False,
+            'metadata_cache_timeout': METADATA_CACHE_TIMEOUT,
+            'metadata_cache_negative_timeout': METADATA_CACHE_NEGATIVE_TIMEOUT,
+            'cache_alias': 'default',
+            'bulk_concurrency': 4,
+            'bulk_retries': 3,
+            'async_concurrency': 100,
+            'single_flight': True,
+            'single_flight_cross_process': False,
+            'single_flight_lease': 5,
+            'disk_cache_dir': None,
+            'disk_cache_max_size': DISK_CACHE_MAX_SIZE,
+            'disk_cache_max_object_size': DISK_CACHE_MAX_OBJECT_SIZE,
+            'write_behind_dir': None,
+            'write_behind_concurrency': 4,
+            'write_behind_retries': 5,
+            'write_behind_backoff': 0.5,
+            'key_index_path': None,
+            'key_index_reconcile_interval': KEY_INDEX_RECONCILE_INTERVAL,
+            'request_retries': 3,
+            'request_backoff': 0.1,
+            'request_max_backoff': 5,
+            'request_deadline': None,
+            'hedge_requests': False,
+            'hedge_percentile': 95,
+            'hedge_min_delay': 0.05,
+            'verify_checksums': True
         }
         
         if isinstance(settings.STOBA_S3,dict):
@@ -80,12 +192,71 @@ class S3(CloudStorage):
         
         self._validate()
         
-        self.service_url = "https://%s" % get_s3_endpoint(
-            bucket = urlquote(self._settings['bucket_name']), 
-            region = urlquote(self._settings['region'])
+        self.service_url = self._get_service_url()
+        
+        self._session_pool = get_session_pool(
+            pool_size = self._settings['pool_size'],
+            keep_alive = self._settings['keep_alive'],
+            connect_timeout = self._settings['connect_timeout'],
+            read_timeout = self._settings['read_timeout']
+        )
+        
+        self._executor = RequestExecutor(
+            self._session_pool,
+            retries = self._settings['request_retries'],
+            backoff = self._settings['request_backoff'],
+            max_backoff = self._settings['request_max_backoff'],
+            deadline = self._settings['request_deadline'],
+            hedge = self._settings['hedge_requests'],
+            hedge_percentile = self._settings['hedge_percentile'],
+            hedge_min_delay = self._settings['hedge_min_delay'],
+            hedge_concurrency = self._settings['pool_size']
         )
         
-        super(S3, self).__init__()
+        super(S3, self).__init__(cache_alias=self._settings['cache_alias'])
+        
+        self.metadata_cache = MetadataCache(
+            timeout = self._settings['metadata_cache_timeout'],
+            negative_timeout = self._settings['metadata_cache_negative_timeout'],
+            namespace = self._get_cache_namespace(),
+            alias = self.cache_alias
+        )
+        
+        self._url_cache = LRUCache(self._settings['url_cache_size'])
+        self._url_signer = None
+        # Shared by all requests, so SigV4 derives its signing key once a day.
+        self._auth = self._authenticate()
+        
+        self.disk_cache = None
+        if self._settings['disk_cache_dir']:
+            self.disk_cache = DiskCache(
+                self._settings['disk_cache_dir'],
+                max_size = self._settings['disk_cache_max_size'],
+                max_object_size = self._settings['disk_cache_max_object_size']
+            )
+        
+        self._single_flight = None
+        if self._settings['single_flight']:
+            self._single_flight = SingleFlight(
+                cachable = self.cachable if self._settings['single_flight_cross_process'] else None,
+                lease = self._settings['single_flight_lease']
+            )
+        
+        self.key_index = None
+        self._next_reconcile_claim = 0
+        if self._settings['key_index_path']:
+            self.key_index = KeyIndex(self._settings['key_index_path'], self._get_cache_namespace())
+        
+        # Created last: entries left by a previous run start uploading at once.
+        self.spool = None
+        if self._settings['write_behind_dir']:
+            self.spool = WriteBehindSpool(
+                self,
+                os.path.join(self._settings['write_behind_dir'], sha1(self._get_cache_namespace().encode('utf-8')).hexdigest()),
+                concurrency = self._settings['write_behind_concurrency'],
+                retries = self._settings['write_behind_retries'],
+                backoff = self._settings['write_behind_backoff']
+            )
     
     def _validate(self):
         
@@ -94,16 +265,96 @@ class S3(CloudStorage):
                 self._settings['secret_access_key'] is  None:
             raise ImproperlyConfigured('You must properly configure access_key_id, secret_access_key and bucket_name')
         
-        if self._settings['region'] not in REGION_ENDPOINT_MAP.keys():
-            raise ImproperlyConfigured('You must provide a valid region')
+        if self._settings['signature_version'] not in SIGNATURE_VERSIONS:
+            raise ImproperlyConfigured('signature_version must be one of %s' % ', '.join(SIGNATURE_VERSIONS))
+        
+        # Any region is accepted when the endpoint is given explicitly, and
+        # with Signature Version 4, which every region accepts, regions
+        # missing from REGION_ENDPOINT_MAP get their regional endpoint.
+        if self._settings['service_url'] is None:
+            region = self._settings['region']
+            if self._settings['signature_version'] != 's3v4':
+                if region not in REGION_ENDPOINT_MAP:
+                    raise ImproperlyConfigured('You must provide a valid region')
+                if region not in SIGV2_REGIONS:
+                    raise ImproperlyConfigured('Region %s requires signature_version s3v4' % region)
+            elif not region:
+                raise ImproperlyConfigured('You must provide a valid region')
+        
+        if self._settings['addressing_style'] not in ADDRESSING_STYLES:
+            raise ImproperlyConfigured('addressing_style must be one of %s' % ', '.join(ADDRESSING_STYLES))
+        
+        if self._settings['compression'] is not None and self._settings['compression'] not in COMPRESSION_ENCODINGS:
+            raise ImproperlyConfigured('compression must be None or one of %s' % ', '.join(COMPRESSION_ENCODINGS))
+        
+        if self._settings['compression'] == 'br' and brotli is None:
+            raise ImproperlyConfigured('Brotli compression requires the brotli package')
+        
+        if self._settings['report_size_as'] not in SIZE_REPORTS:
+            raise ImproperlyConfigured('report_size_as must be one of %s' % ', '.join(SIZE_REPORTS))
+    
+    def _get_service_url(self):
+        bucket = urlquote(self._settings['bucket_name'])
+        
+        if self._settings['service_url'] is None:
+            endpoint = "https://%s" % get_s3_endpoint(region = urlquote(self._settings['region']))
+        else:
+            endpoint = self._settings['service_url'].rstrip('/')
+        
+        if self._settings['addressing_style'] == 'path':
+            return '%s/%s' % (endpoint, bucket)
+        
+        scheme, host = endpoint.split('://', 1)
+        return '%s://%s.%s' % (scheme, bucket, host)
+    
+    def _get_cache_namespace(self):
+        return 's3:%s' % self.service_url.split('://', 1)[-1]
     
     def _authenticate(self):
+        if self._settings['signature_version'] == 's3v4':
+            return S3AuthV4(
+                self._settings['access_key_id'],
+                self._settings['secret_access_key'],
+                self._settings['region'],
+                streaming = self._settings['sign_streaming_payloads']
+            )
         return S3Auth(
             self._settings['access_key_id'], 
             self._settings['secret_access_key'],
-            self._settings['region']
+            self._settings['region'],
+            bucket = self._get_virtual_host_bucket()
         )
+    
+    def _get_virtual_host_bucket(self):
+        # With path-style addressing the bucket is already part of every
+        # request path, so it must not be added to the signed resource again.
+        if self._settings['addressing_style'] == 'path':
+            return ''
+        return urlquote(self._settings['bucket_name'])
+        
+    def _operation(self, name, key=None):
+        return operation(self, name, key)
+    
+    def _request(self, method, url, **kwargs):
+        kwargs.setdefault('auth', self._auth)
+        response = self._executor.execute(method, url, **kwargs)
+        
+        current = current_operation()
+        if current is not None:
+            current.record_request(
+                response.status_code,
+                bytes_sent = int(response.request.headers.get('Content-Length') or 0),
+                bytes_received = 0 if method == 'HEAD' else int(response.headers.get('Content-Length') or 0)
+            )
         
+        return response
+    
+    def _coalesce(self, key, func, poll=None):
+        # Identical requests in flight at the same time are sent only once.
+        if self._single_flight is None:
+            return func()
+        return self._single_flight.do(key, func, poll)
+    
     def _get_object_url(self, name):
         return "/".join((self.service_url, urlquote(self._get_path(name))))
     
@@ -115,106 +366,929 @@ class S3(CloudStorage):
             return tz_aware_datetime(datetime.now())
          
     def _open(self, name, mode='rb'):
-        response = requests.get(self._get_object_url(name),auth=self._authenticate(), stream=True)
-        return File(response.raw, name)
+        with self._operation('open', name) as op:
+            if self.spool is not None:
+                spooled_file = self.spool.open(name)
+                if spooled_file is not None:
+                    return spooled_file
+            
+            if self.disk_cache is not None:
+                cached_file = self._open_cached(name, op)
+                if cached_file is not None:
+                    return self._decompress(name, cached_file)
+            
+            return self._decompress(name, S3File(
+                self, name,
+                buffer_size = self._settings['read_buffer_size'],
+                prefetch = self._settings['read_prefetch']
+            ))
+    
+    def _decompress(self, name, f):
+        # While compression is on, files it compressed read back as they were
+        # saved. Whether a file was compressed is looked up on the first read.
+        if not self._settings['compression']:
+            return f
+        return File(DecodingReader(f, lambda: self._get_compression(self._get_full_object_status(name))), name)
+    
+    def _get_compression(self, status):
+        # The encoding and original size of an object compression compressed.
+        # Other objects with a Content-Encoding are left alone.
+        encoding = status.get('content-encoding')
+        if not status.get(UNCOMPRESSED_SIZE_HEADER) or encoding not in COMPRESSION_ENCODINGS:
+            return None, None
+        if encoding == 'br' and brotli is None:
+            return None, None
+        return encoding, int(status[UNCOMPRESSED_SIZE_HEADER])
+    
+    def _get_disk_cache_key(self, name):
+        # Several storages may share one cache directory.
+        return '%s:%s' % (self._get_cache_namespace(), self._get_path(name))
+    
+    def _open_cached(self, name, op):
+        key = self._get_disk_cache_key(name)
+        cached = self.disk_cache.get(key)
+        headers = {}
+        
+        if cached is not None:
+            etag, path = cached
+            # While the metadata cache vouches for the cached version there is
+            # no need to ask S3; otherwise a conditional GET revalidates it.
+            status = self.metadata_cache.get(name)
+            if status is not None and status.get('etag') == etag:
+                op.record_cache(hits=1)
+                return self._open_cached_file(path, name)
+            headers['If-None-Match'] = etag
+        
+        response = self._request('GET', self._get_object_url(name), headers=headers, stream=True)
+        try:
+            if response.status_code == requests.codes.not_modified and cached is not None:
+                op.record_cache(hits=1)
+                path = cached[1]
+            elif response.status_code == requests.codes.ok:
+                if int(response.headers.get('Content-Length') or 0) > self.disk_cache.max_object_size:
+                    return None
+                op.record_cache(misses=1)
+                self._cache_object_status({name: self._get_object_status_from_response(response)})
+                path = self.disk_cache.put(key, response.headers['ETag'], response.raw)
+            else:
+                raise S3ResponseError(response)
+        finally:
+            response.close()
+        
+        return self._open_cached_file(path, name)
+    
+    def _open_cached_file(self, path, name):
+        try:
+            return File(self.disk_cache.open(path), name)
+        except (IOError, OSError):
+            # Evicted by another process in the meantime.
+            return None
     
-    def _save(self, name, content):  
-        file_content = File(content)
+    def _get_multipart_upload(self, name):
+        return MultipartUpload(
+            self, name,
+            part_size = self._settings['multipart_chunk_size'],
+            concurrency = self._settings['multipart_concurrency'],
+            retries = self._settings['multipart_retries'],
+            verify = self._settings['verify_checksums']
+        )
+    
+    def _save(self, name, content):
+        if self.spool is not None:
+            # Write-behind: the upload happens in the background.
+            with self._operation('save', name):
+                self.spool.put(name, content)
+                self.metadata_cache.delete(name)
+            return name
+        
+        return self._upload(name, content)
+    
+    def _upload(self, name, content):  
+        # A File without a name is falsy and requests would send it as an
+        # empty body.
+        file_content = File(content, name)
+        headers = self._get_upload_headers(name, content)
         
-        requests.put(self._get_object_url(name),auth=self._authenticate(), data=file_content)
-        self.cachable['{}_size'.format(name)] = file_content.size
+        with self._operation('save', name):
+            upload_content = self._compress(file_content, headers)
+            try:
+                if upload_content.size > self._settings['multipart_threshold']:
+                    etag = self._get_multipart_upload(name).upload(upload_content, size=upload_content.size, headers=headers)['ETag']
+                else:
+                    body = HashingReader(upload_content, upload_content.size)
+                    # requests sends an empty stream with chunked transfer
+                    # encoding, which S3 does not accept.
+                    response = self._request(
+                        'PUT', self._get_object_url(name),
+                        headers = headers,
+                        data = body if upload_content.size else b''
+                    )
+                    if response.status_code != requests.codes.ok:
+                        raise S3ResponseError(response)
+                    if self._settings['verify_checksums']:
+                        verify_etag(response.headers.get('ETag'), body.hexdigest(), name)
+                    etag = '"%s"' % body.hexdigest()
+            finally:
+                if upload_content is not file_content:
+                    upload_content.close()
+            self._cache_uploaded_status(name, upload_content.size, etag, headers)
         
         return name
     
-    def _get_object_status(self,name):
-        response = requests.head(self._get_object_url(name),auth=self._authenticate())
+    def _get_upload_headers(self, name, content):
+        headers = {}
+        content_type = get_content_type(name, content, self._settings['set_content_type_as'])
+        if content_type:
+            headers['Content-Type'] = content_type
+        return headers
+    
+    def _compress(self, content, headers):
+        # Returns the content to upload: compressed when compression is on, the
+        # content type is listed in compressible_types and the result is at
+        # most compression_max_ratio of the size. The headers are completed
+        # to match.
+        encoding = self._settings['compression']
+        if not encoding or content.size < self._settings['compression_min_size'] or \
+                not is_compressible(headers.get('Content-Type'), self._settings['compressible_types']):
+            return content
+        
+        compressed = compress(
+            content, encoding,
+            level = self._settings['compression_level'],
+            max_ratio = self._settings['compression_max_ratio']
+        )
+        if compressed is None:
+            return content
+        
+        headers['Content-Encoding'] = encoding
+        headers[UNCOMPRESSED_SIZE_HEADER] = str(content.size)
+        return compressed
+    
+    def _cache_uploaded_status(self, name, size, etag, headers=None):
+        # What a HEAD right after the upload would report, without sending it.
+        headers = headers or {}
+        self.metadata_cache.set(name, {
+            'status': requests.codes.ok,
+            'content-length': str(size),
+            'last-modified': http_date(),
+            'etag': etag,
+            'content-type': headers.get('Content-Type'),
+            'content-encoding': headers.get('Content-Encoding'),
+            UNCOMPRESSED_SIZE_HEADER: headers.get(UNCOMPRESSED_SIZE_HEADER)
+        })
+        self._index_put(name, size, etag)
+    
+    def _index_put(self, name, size, etag):
+        if self.key_index is not None:
+            self.key_index.put(self._get_path(name), size, time.time(), etag)
+    
+    def _index_delete(self, names):
+        if self.key_index is not None:
+            self.key_index.delete_many([self._get_path(name) for name in names])
+    
+    def _get_key_index(self):
+        # The index only answers once it has been built from a full listing,
+        # and is rebuilt in the background when it is older than the
+        # reconcile interval, to catch changes made by other clients.
+        if self.key_index is None:
+            return None
+        
+        reconciled = self.key_index.get_reconciled_time()
+        interval = self._settings['key_index_reconcile_interval']
+        if reconciled is None or (interval is not None and time.time() - reconciled > interval):
+            self._start_reconciliation()
+        
+        return self.key_index if reconciled is not None else None
+    
+    def _start_reconciliation(self):
+        # Claims are rate-limited: while another process holds one, asking
+        # again on every lookup would only contend for the database.
+        now = time.time()
+        if now < self._next_reconcile_claim:
+            return
+        self._next_reconcile_claim = now + KEY_INDEX_CLAIM_INTERVAL
+        
+        if self.key_index.claim_reconciliation(KEY_INDEX_RECONCILE_LEASE):
+            thread = threading.Thread(target=self._run_reconciliation)
+            thread.daemon = True
+            thread.start()
+    
+    def _run_reconciliation(self):
+        try:
+            self._reconcile_index()
+        except Exception as e:
+            self.key_index.release_reconciliation()
+            logger.warning('Reconciliation of the key index failed: %s', e)
+    
+    def _iter_index_entries(self, entries):
+        for entry in entries:
+            if not entry.get('prefix'):
+                yield entry['key'], entry['size'], iso8601_to_epoch(entry['last-modified']), entry['etag']
+    
+    def _reconcile_index(self):
+        started = time.time()
+        self.key_index.reconcile(self._iter_index_entries(self._iter_list_objects('', delimiter=None)), started)
+    
+    def reconcile_index(self):
+        # Builds the key index from a full listing of the bucket right away.
+        with self._operation('reconcile_index'):
+            self._reconcile_index()
+    
+    def _get_indexed_status(self, name):
+        key_index = self._get_key_index()
+        if key_index is None:
+            return None
+        
+        result = dict((header, None) for header in METADATA_HEADERS if header not in HEAD_ONLY_HEADERS)
+        entry = key_index.get(self._get_path(name))
+        if entry is None:
+            result['status'] = requests.codes.not_found
+            return result
         
-        result = { header.lower():response.headers[header] for header in response.headers}
+        size, mtime, etag = entry
+        result.update({
+            'status': requests.codes.ok,
+            'content-length': str(size),
+            'last-modified': http_date(mtime) if mtime is not None else None,
+            'etag': etag
+        })
+        return result
+    
+    def _get_object_status_from_response(self, response):
+        result = { header:response.headers.get(header) for header in METADATA_HEADERS }
         result['status'] = response.status_code
         
         return result
     
+    def _head_object(self, name):
+        response = self._request('HEAD', self._get_object_url(name))
+        # Anything but a definite answer must not be taken for "exists".
+        if response.status_code not in (requests.codes.ok, requests.codes.not_found):
+            raise S3ResponseError(response)
+        return self._get_object_status_from_response(response)
+    
+    def _cache_object_status(self, statuses):
+        # Only definite answers are cached; errors such as 403 or 503 are retried.
+        found = dict((name, status) for name, status in statuses.items() if status['status'] == requests.codes.ok)
+        missing = dict((name, status) for name, status in statuses.items() if status['status'] == requests.codes.not_found)
+        
+        self.metadata_cache.set_many(found)
+        self.metadata_cache.set_many(missing, negative=True)
+    
+    def _load_object_status(self, name):
+        def fetch():
+            result = self._head_object(name)
+            self._cache_object_status({name: result})
+            return result
+        
+        # Other processes only have to wait for the status to show up in the
+        # metadata cache.
+        return self._coalesce(('HEAD', name), fetch, poll=lambda: self.metadata_cache.get(name))
+    
+    def _get_spooled_status(self, name):
+        entry = self.spool.get(name) if self.spool is not None else None
+        if entry is None:
+            return None
+        
+        try:
+            size = self.spool.size(entry)
+        except OSError:
+            return None
+        return {
+            'status': requests.codes.ok,
+            'content-length': str(size),
+            'last-modified': http_date(entry.created),
+            'etag': None,
+            'content-type': None,
+            'content-encoding': None,
+            UNCOMPRESSED_SIZE_HEADER: None
+        }
+    
+    def _get_object_status(self,name):
+        # Files waiting in the write-behind spool exist even though S3 does
+        # not know them yet.
+        result = self._get_spooled_status(name)
+        if result is not None:
+            return result
+        
+        result = self._get_indexed_status(name)
+        if result is not None:
+            return result
+        
+        result = self.metadata_cache.get(name)
+        if result is None:
+            result = self._load_object_status(name)
+        return result
+    
+    def _get_full_object_status(self, name):
+        result = self._get_object_status(name)
+        if result['status'] == requests.codes.ok and any(header not in result for header in HEAD_ONLY_HEADERS):
+            result = self._load_object_status(name)
+        return result
+    
+    def _get_object_status_many(self, names):
+        result = self.metadata_cache.get_many(names)
+        for name in names:
+            status = self._get_spooled_status(name) or self._get_indexed_status(name)
+            if status is not None:
+                result[name] = status
+        missing = [name for name in set(names) if name not in result]
+        
+        if missing:
+            with ThreadPoolExecutor(min(len(missing), self._settings['pool_size'])) as executor:
+                fetched = dict(zip(missing, executor.map(bind(self._load_object_status), missing)))
+            result.update(fetched)
+        
+        return result
+    
+    def _get_object_range(self, name, start, end=None):
+        return self._coalesce(('GET', name, start, end), lambda: get_object_range(self, name, start, end))
+    
+    def _get_listed_status(self, entry):
+        # The metadata a HEAD would report, from an entry of a listing.
+        epoch = iso8601_to_epoch(entry['last-modified'])
+        return {
+            'status': requests.codes.ok,
+            'content-length': str(entry['size']),
+            'last-modified': http_date(epoch) if epoch is not None else None,
+            'etag': entry['etag'],
+            'content-type': None
+        }
+    
+    def _stat_by_listing(self, keys, max_pages):
+        # Lists the narrowest prefix the keys share. Returns the statuses that
+        # the listing settled: found, or missing because the listing went past
+        # them. Keys beyond max_pages are left for HEAD requests.
+        wanted = set(keys)
+        params = {'prefix': posixpath.commonprefix(keys), 'delimiter': '/'}
+        listed_up_to, result = None, {}
+        
+        for _ in range(max_pages):
+            entries, marker = self._list_objects_page(params)
+            for entry in entries:
+                if entry['key'] in wanted and not entry.get('prefix'):
+                    result[entry['key']] = self._get_listed_status(entry)
+            
+            listed_up_to = marker
+            if not marker:
+                break
+            params['marker'] = marker
+        
+        missing = dict((header, None) for header in METADATA_HEADERS)
+        missing['status'] = requests.codes.not_found
+        for key in wanted.difference(result):
+            if listed_up_to is None or key <= listed_up_to:
+                result[key] = dict(missing)
+        return result
+    
+    def stat_many(self, names):
+        # Fetches the metadata of many files at once and returns it by name.
+        # Names in the same folder are resolved with a listing of the prefix
+        # they share; one that is alone in its folder, or that the listing did
+        # not reach, is looked up with a HEAD request, concurrently.
+        names = list(names)
+        
+        with self._operation('stat_many'):
+            result = self.metadata_cache.get_many(names)
+            for name in names:
+                status = self._get_spooled_status(name) or self._get_indexed_status(name)
+                if status is not None:
+                    result[name] = status
+            
+            groups = {}
+            for name in set(names).difference(result):
+                key = self._get_path(name)
+                groups.setdefault(posixpath.dirname(key), {})[key] = name
+            
+            listed = {}
+            for keys in groups.values():
+                if len(keys) < 2:
+                    continue
+                # Pages are fetched one after the other while HEAD requests run
+                # pool_size at a time; beyond this many pages HEADs are faster.
+                max_pages = -(-len(keys) // self._settings['pool_size'])
+                for key, status in self._stat_by_listing(sorted(keys), max_pages).items():
+                    listed[keys[key]] = status
+            
+            self._cache_object_status(listed)
+            result.update(listed)
+            result.update(self._get_object_status_many([name for name in set(names) if name not in result]))
+        
+        return result
+    
     def _get_file_size(self,name):
-        if self.cachable['{}_size'.format(name)] is None:
-            self.cachable['{}_size'.format(name)] = int(self._get_object_status(name)['content-length'])
-        return self.cachable['{}_size'.format(name)]
+        # Compressed files are stored shorter than they were saved; which of
+        # the two lengths is reported depends on report_size_as.
+        original = self._settings['report_size_as'] == 'original'
+        status = self._get_full_object_status(name) if original else self._get_object_status(name)
+        if status['status'] == requests.codes.not_found:
+            raise IOError(errno.ENOENT, 'No such file', name)
+        if original:
+            return int(status.get(UNCOMPRESSED_SIZE_HEADER) or status['content-length'])
+        return int(status['content-length'])
     
     def _get_expire_timestamp(self):
-        expires_on = datetime.now() + timedelta(seconds=self._settings['url_expires_in_sec'])
-        return datetime_to_epoch(expires_on)
+        expires_on = int(time.time()) + self._settings['url_expires_in_sec']
+        window = self._settings['url_cache_window']
+        # Rounding the expiry up to the window makes every URL for an object
+        # identical within that window, so it can be reused here and cached
+        # by browsers and CDNs.
+        if window:
+            expires_on = -(-expires_on // window) * window
+        return expires_on
     
-    def _get_presigned_url(self, name):
-        expire_time = self._get_expire_timestamp()
-        url_params = {
-              'AWSAccessKeyId': self._settings['access_key_id'],
-              'Expires':expire_time,
-              'Signature':self._get_url_signature(name, expire_time)
-        }
-        url_data = urlencode(url_params)
-        return ''.join((self._get_object_url(name),'?',url_data))
-    
-    def _get_url_signature(self, name, expire_time_epoch):
-        s3_sig = S3Signature(
-             url = self._get_object_url(name),
-             region = self._settings['region'],
-             http_method = 'GET',
-             http_headers = {'Expires':expire_time_epoch},
-             creds = (self._settings['access_key_id'],self._settings['secret_access_key']),
-             non_amz_headers_to_sign = self.NON_AMZ_HEADERS_FOR_URL_GENERATION
-        )
-        return s3_sig.get_signature()
+    def _get_url_signer(self):
+        # The HMAC key schedule only depends on the secret, so it is computed
+        # once and copied for every URL.
+        if self._url_signer is None:
+            self._url_signer = hmac.new(self._settings['secret_access_key'].encode('utf-8'), digestmod=sha1)
+        return self._url_signer
     
-    def _unserialize_s3_response(self,data):
-        return xmltodict.parse(data)
+    def _get_canonical_prefix(self):
+        # Both addressing styles sign /bucket/key for an object.
+        return '/%s' % urlquote(self._settings['bucket_name'])
     
-    def _get_dir_list(self,dir_name):
+    def _get_url_signing_state(self, expire_time):
+        # Everything but the object path is shared by a whole batch of URLs.
+        if self._settings['signature_version'] == 's3v4':
+            return self._get_sigv4_url_signing_state(expire_time)
         
-        #IMPROVE THE CODE HERE
+        string_to_sign_prefix = ('GET\n\n\n%d\n%s/' % (expire_time, self._get_canonical_prefix())).encode('utf-8')
+        query_prefix = '?%s&Signature=' % urlencode((
+            ('AWSAccessKeyId', self._settings['access_key_id']),
+            ('Expires', expire_time)
+        ))
+        return self._get_url_signer(), string_to_sign_prefix, query_prefix
+    
+    def _get_sigv4_url_signing_state(self, expire_time):
+        # SigV4 URLs carry their signing time and a relative expiry. Signing at
+        # the start of the cache window keeps them identical within the window
+        # without dating them in the future.
+        expires_in = self._settings['url_expires_in_sec'] + self._settings['url_cache_window']
+        amz_date, query = self._auth.signer.get_presign_query(expires_in, expire_time - expires_in)
+        service_url = urlparse(self.service_url)
+        return amz_date, query, service_url.netloc, service_url.path
+    
+    def _sign_url(self, name, signing_state):
+        object_path = urlquote(self._get_path(name))
         
+        if self._settings['signature_version'] == 's3v4':
+            amz_date, query, host, base_path = signing_state
+            signature = self._auth.signer.get_presign_signature('GET', host, '%s/%s' % (base_path, object_path), query, amz_date)
+            return ''.join((self.service_url, '/', object_path, '?', query, '&X-Amz-Signature=', signature))
+        
+        signer, string_to_sign_prefix, query_prefix = signing_state
+        url_signer = signer.copy()
+        url_signer.update(string_to_sign_prefix + object_path.encode('utf-8'))
+        signature = urlquote(base_64(url_signer.digest()), safe='')
+        
+        return ''.join((self.service_url, '/', object_path, query_prefix, signature))
+    
+    def urls(self, names):
+        with self._operation('urls') as op:
+            return self._get_urls(names, op)
+    
+    def _get_urls(self, names, op):
+        expire_time = self._get_expire_timestamp()
+        signing_state = None
         result = []
-        dir_path = '%s/' % self._get_path(dir_name)
-        response = requests.get(self.service_url, auth=self._authenticate(), params={'delimiter':'/','prefix':dir_path}, stream=True)
-        data = self._unserialize_s3_response(response.raw)
         
-        for s3_tag in ('Contents','Key'),('CommonPrefixes','Prefix'):
-            try:
-                contents = data['ListBucketResult'][s3_tag[0]]
-                if isinstance(contents,list):
-                    for content in contents:
-                        result.append(content[s3_tag[1]])
-                else:
-                    result.append(contents[s3_tag[1]])
-            except:
-                pass
-        try:
-            result.remove(dir_path)
-        except:
-            pass
-                
+        for name in names:
+            url = self._url_cache.get((name, expire_time))
+            op.record_cache(hits=int(url is not None), misses=int(url is None))
+            if url is None:
+                if signing_state is None:
+                    signing_state = self._get_url_signing_state(expire_time)
+                url = self._sign_url(name, signing_state)
+                self._url_cache.set((name, expire_time), url)
+            result.append(url)
+        
         return result
     
+    def _iter_list_objects(self, prefix, delimiter='/'):
+        params = {'prefix': prefix}
+        if delimiter:
+            params['delimiter'] = delimiter
+        
+        while True:
+            entries, marker = self._list_objects_page(params)
+            for entry in entries:
+                yield entry
+            
+            if not marker:
+                break
+            params['marker'] = marker
+    
+    def _harvest_listing(self, entries, listed):
+        # What the listing tells about each key saves a HEAD request later.
+        self.metadata_cache.set_many(dict(
+            (entry['key'], self._get_listed_status(entry)) for entry in entries if not entry.get('prefix')
+        ))
+        if self.key_index is not None:
+            self.key_index.put_listed(self._iter_index_entries(entries), listed)
+    
+    def _list_objects_page(self, params):
+        def fetch():
+            listed = time.time()
+            with self._operation('list', params['prefix']):
+                response = self._request('GET', '%s/' % self.service_url, params=params, stream=True)
+                if response.status_code != requests.codes.ok:
+                    raise S3ResponseError(response)
+            
+            response.raw.decode_content = True
+            result = ListBucketResultParser(response.raw)
+            try:
+                entries = list(result)
+            finally:
+                response.close()
+            
+            self._harvest_listing(entries, listed)
+            return entries, result.marker if result.is_truncated else None
+        
+        # A page is materialized (at most 1000 entries) so that concurrent
+        # listings of the same page can share it.
+        return self._coalesce(('LIST',) + tuple(sorted(params.items())), fetch)
+    
+    def _get_dir_path(self, dir_name):
+        dir_path = self._get_path(dir_name)
+        return '' if dir_path in ('.', '/') else '%s/' % dir_path
+    
+    def _get_taken_names(self, prefix):
+        prefix = self._get_path(prefix)
+        if prefix == '.':
+            prefix = ''
+        
+        key_index = self._get_key_index()
+        if key_index is not None:
+            taken = set(key_index.iter_keys(prefix))
+        else:
+            # Keys below the prefix are rolled up into common prefixes by the
+            # delimiter, so the listing stays small.
+            taken = set(entry['key'] for entry in self._iter_list_objects(prefix) if not entry.get('prefix'))
+        if self.spool is not None:
+            taken.update(self.spool.names(prefix))
+        return taken
+    
+    def iter_listdir(self, dir_name):
+        dir_path = self._get_dir_path(dir_name)
+        
+        key_index = self._get_key_index()
+        if key_index is not None:
+            for key in key_index.iter_dir(dir_path):
+                if key != dir_path:
+                    yield key
+            return
+        
+        for entry in self._iter_list_objects(dir_path):
+            if entry['key'] != dir_path:
+                yield entry['key']
     
     def url(self, name):
-        return self._get_presigned_url(name)
+        with self._operation('url', name):
+            return self.urls([name])[0]
+    
+    def flush(self, timeout=None):
+        # Waits until the write-behind spool is uploaded.
+        if self.spool is None:
+            return BulkResult()
+        return self.spool.flush(timeout)
     
     def delete(self, name):
-        requests.delete(self._get_object_url(name),auth=self._authenticate(), headers={'Content-Length':0})
-        del self.cachable['{}_size'.format(name)]
+        with self._operation('delete', name):
+            if self.spool is not None:
+                self.spool.discard(name)
+            response = self._request('DELETE', self._get_object_url(name), headers={'Content-Length':'0'})
+            if response.status_code >= 300 and response.status_code != requests.codes.not_found:
+                raise S3ResponseError(response)
+            self.metadata_cache.delete(name)
+            self._index_delete([name])
+            if self.disk_cache is not None:
+                self.disk_cache.delete(self._get_disk_cache_key(name))
+    
+    def _delete_batch(self, names, listed=False):
+        result = BulkResult()
+        # Listed keys are sent as they are; normalising them would turn a
+        # folder marker such as "d/" into "d".
+        keys = OrderedDict(((name if listed else self._get_path(name)), name) for name in names)
+        # As in delete(), a spooled version must not be uploaded afterwards.
+        if self.spool is not None:
+            for name in names:
+                self.spool.discard(name)
+        
+        body = xmltodict.unparse({'Delete': OrderedDict([
+            ('Quiet', 'true'),
+            ('Object', [{'Key': key} for key in keys])
+        ])}).encode('utf-8')
+        headers = {'Content-MD5': content_md5(body), 'Content-Type': 'application/xml'}
+        
+        try:
+            response = self._request('POST', '%s/?delete' % self.service_url, data=body, headers=headers)
+            if response.status_code != requests.codes.ok:
+                raise S3ResponseError(response)
+            data = xmltodict.parse(response.content, force_list=('Error',))
+        except IOError as e:
+            for name in names:
+                result.add_failure(name, e)
+            return result
+        
+        # In quiet mode only the keys that could not be deleted are reported.
+        for error in (data.get('DeleteResult') or {}).get('Error', []):
+            name = keys.pop(error.get('Key'), error.get('Key'))
+            result.add_failure(name, '%s: %s' % (error.get('Code'), error.get('Message')))
+        for name in keys.values():
+            result.add_success(name)
+        
+        self.metadata_cache.delete_many(list(keys.values()))
+        self._index_delete(keys.values())
+        if self.disk_cache is not None:
+            for name in keys.values():
+                self.disk_cache.delete(self._get_disk_cache_key(name))
+        return result
+    
+    def _delete_many(self, names, listed=False):
+        result = BulkResult()
+        run_concurrently(
+            lambda batch: result.update(self._delete_batch(batch, listed)),
+            batched(names, MAX_KEYS_PER_DELETE),
+            self._settings['bulk_concurrency']
+        )
+        return result
+    
+    def delete_many(self, names):
+        with self._operation('delete_many'):
+            return self._delete_many(names)
+    
+    def _save_one(self, name, content):
+        def attempt():
+            # A failed attempt may have consumed part of the content.
+            if hasattr(content, 'seek'):
+                content.seek(0)
+            return self._save(name, content)
+        
+        return call_with_retries(attempt, self._settings['bulk_retries'])
+    
+    def _save_many(self, items, overwrite, concurrency, close):
+        result = BulkResult()
+        
+        def get_targets():
+            # Names are picked one at a time as the items are pulled, and a
+            # name handed out counts as taken: two files of the batch with the
+            # same name would otherwise both get it and overwrite each other.
+            taken = {}
+            for name, content in items:
+                if overwrite:
+                    yield name, name, content
+                    continue
+                try:
+                    target = self._get_available_name(name, None, taken)
+                except Exception as e:
+                    result.add_failure(name, e)
+                    if close:
+                        content.close()
+                    continue
+                for names in taken.values():
+                    names.add(self._get_path(target))
+                yield name, target, content
+        
+        def upload(item):
+            name, target, content = item
+            try:
+                result.add_success(self._save_one(target, content))
+            except Exception as e:
+                result.add_failure(name, e)
+            finally:
+                if close:
+                    content.close()
+        
+        with self._operation('save_many'):
+            run_concurrently(upload, get_targets(), concurrency or self._settings['bulk_concurrency'])
+        return result
+    
+    def save_many(self, items, overwrite=False, concurrency=None):
+        # Without overwrite every file gets an available name like save() does,
+        # which costs a listing request per file root.
+        return self._save_many(items, overwrite, concurrency, close=False)
+    
+    def _get_remote_etags(self, prefix):
+        # One recursive listing instead of a HEAD request per file.
+        return dict(
+            (entry['key'], (entry['etag'] or '').strip('"'))
+            for entry in self._iter_list_objects(self._get_dir_path(prefix), delimiter=None)
+            if not entry['key'].endswith('/')
+        )
+    
+    def sync_directory(self, local_path, prefix='', concurrency=None, incremental=False,
+                       manifest_path=None, delete_orphans=False):
+        result = SyncResult()
+        manifest = Manifest(manifest_path) if incremental else None
+        local_keys = set()
+        
+        with self._operation('sync_directory', prefix):
+            remote = self._get_remote_etags(prefix) if incremental or delete_orphans else {}
+            
+            def changed_files():
+                for name, path in iter_local_files(local_path, prefix):
+                    if manifest_path and os.path.abspath(path) == os.path.abspath(manifest_path):
+                        continue
+                    
+                    key = self._get_path(name)
+                    local_keys.add(key)
+                    
+                    if manifest is not None:
+                        etag = manifest.get_etag(
+                            key, path, self._get_upload_options(), lambda path: self._get_upload_etag(name, path)
+                        )
+                        if remote.get(key) == etag:
+                            result.skipped.append(name)
+                            continue
+                    
+                    # Files are opened only as workers become free, so the number
+                    # of open handles is bounded by the pool, not by the tree.
+                    yield name, File(open(path, 'rb'), name)
+            
+            result.update(self._save_many(changed_files(), True, concurrency, close=True))
+            
+            if manifest is not None:
+                manifest.prune(local_keys)
+                manifest.save()
+            
+            if delete_orphans:
+                result.deleted = self.delete_many(key for key in remote if key not in local_keys)
+        
+        return result
+    
+    def _get_upload_options(self):
+        # The settings the ETag of an uploaded file depends on.
+        return [
+            self._settings['multipart_threshold'],
+            self._settings['multipart_chunk_size'],
+            self._settings['compression'],
+            self._settings['compression_level'],
+            self._settings['compression_min_size'],
+            self._settings['compression_max_ratio'],
+            list(self._settings['compressible_types'])
+        ]
+    
+    def _get_upload_etag(self, name, path):
+        # The ETag of the object _upload would make of the file. Compression
+        # is deterministic, so a compressed file is compressed again to tell.
+        with open(path, 'rb') as f:
+            content = File(f, name)
+            upload_content = self._compress(content, self._get_upload_headers(name, content))
+            try:
+                return compute_etag(
+                    upload_content, upload_content.size,
+                    self._settings['multipart_threshold'], self._settings['multipart_chunk_size']
+                )
+            finally:
+                if upload_content is not content:
+                    upload_content.close()
+    
+    def _get_copy_source(self, name):
+        return '/%s/%s' % (urlquote(self._settings['bucket_name']), urlquote(self._get_path(name)))
+    
+    def _get_copied_headers(self, name):
+        response = self._request('HEAD', self._get_object_url(name))
+        if response.status_code != requests.codes.ok:
+            raise S3ResponseError(response)
+        return dict(
+            (header, value) for header, value in response.headers.items()
+            if header.title() in COPIED_HEADERS or header.lower().startswith('x-amz-meta-')
+        )
+    
+    def _copy(self, src, dst, status):
+        size = int(status['content-length'])
+        # A spooled version of dst would overwrite the copy once uploaded.
+        if self.spool is not None:
+            self.spool.discard(dst)
+        
+        if size > self._settings['multipart_copy_threshold']:
+            # UploadPartCopy leaves the object headers behind.
+            etag = MultipartCopy(
+                self, dst, self._get_copy_source(src),
+                part_size = self._settings['multipart_copy_part_size'],
+                concurrency = self._settings['multipart_concurrency'],
+                retries = self._settings['multipart_retries']
+            ).copy(size, self._get_copied_headers(src))['ETag']
+        else:
+            headers = {'X-Amz-Copy-Source': self._get_copy_source(src), 'Content-Length': '0'}
+            response = self._request('PUT', self._get_object_url(dst), headers=headers)
+            if response.status_code != requests.codes.ok:
+                raise S3ResponseError(response)
+            # A copy that fails after it started is reported with a 200 status.
+            data = xmltodict.parse(response.content)
+            if 'Error' in data:
+                raise S3ResponseError(response, data['Error'].get('Code'))
+            etag = data['CopyObjectResult']['ETag']
+        
+        self.metadata_cache.set(dst, dict(status, etag=etag, **{'last-modified': http_date()}))
+        self._index_put(dst, size, etag)
+        return dst
+    
+    def _copy_or_save(self, src, dst, status=None):
+        spooled_file = self.spool.open(src) if self.spool is not None else None
+        if spooled_file is not None:
+            # Not in S3 yet.
+            with spooled_file:
+                return self._save(dst, spooled_file)
+        
+        if status is None:
+            status = self._get_object_status(src)
+            if status['status'] == requests.codes.not_found:
+                raise IOError(errno.ENOENT, 'No such file', src)
+        return self._copy(src, dst, status)
+    
+    def copy(self, src, dst):
+        # Server-side copy; the content is not downloaded.
+        with self._operation('copy', src):
+            return self._copy_or_save(src, dst)
+    
+    def move(self, src, dst):
+        with self._operation('move', src):
+            self.copy(src, dst)
+            self.delete(src)
+        return dst
+    
+    def _get_prefix_copies(self, src_prefix, dst_prefix):
+        src_path, dst_path = self._get_dir_path(src_prefix), self._get_dir_path(dst_prefix)
+        # Files still in the write-behind spool are not listed yet.
+        spooled = set(self.spool.names(src_path)) if self.spool is not None else set()
+        for entry in self._iter_list_objects(src_path, delimiter=None):
+            if entry['key'].endswith('/'):
+                continue
+            spooled.discard(entry['key'])
+            # The listing has all a copy needs; a HEAD per key is not necessary.
+            status = self.metadata_cache.get(entry['key']) or {
+                'status': requests.codes.ok,
+                'content-length': str(entry['size']),
+                'last-modified': None,
+                'etag': entry['etag'],
+                'content-type': None
+            }
+            yield entry['key'], dst_path + entry['key'][len(src_path):], status
+        for name in sorted(spooled):
+            yield name, dst_path + name[len(src_path):], None
+    
+    def _copy_prefix(self, src_prefix, dst_prefix, concurrency):
+        result, copied = BulkResult(), {}
+        
+        def copy(item):
+            src, dst, status = item
+            try:
+                # A spooled version of src is newer than the listed one.
+                call_with_retries(lambda: self._copy_or_save(src, dst, status), self._settings['bulk_retries'])
+            except Exception as e:
+                result.add_failure(src, e)
+            else:
+                result.add_success(dst)
+                copied[src] = dst
+        
+        run_concurrently(copy, self._get_prefix_copies(src_prefix, dst_prefix), concurrency or self._settings['bulk_concurrency'])
+        return result, copied
+    
+    def copy_prefix(self, src_prefix, dst_prefix, concurrency=None):
+        with self._operation('copy_prefix', src_prefix):
+            return self._copy_prefix(src_prefix, dst_prefix, concurrency)[0]
+    
+    def move_prefix(self, src_prefix, dst_prefix, concurrency=None):
+        # Only keys that were copied are deleted. A source that could not be
+        # deleted is reported as failed, although its copy exists.
+        with self._operation('move_prefix', src_prefix):
+            result, copied = self._copy_prefix(src_prefix, dst_prefix, concurrency)
+            deleted = self.delete_many(list(copied))
+        
+        for src, error in deleted.failed.items():
+            result.succeeded.remove(copied[src])
+            result.add_failure(src, error)
+        return result
+    
+    def delete_prefix(self, dir_name):
+        with self._operation('delete_prefix', dir_name):
+            dir_path = self._get_dir_path(dir_name)
+            # Files still in the write-behind spool are not listed yet.
+            spooled = set(self.spool.names(dir_path)) if self.spool is not None else set()
+            keys = (entry['key'] for entry in self._iter_list_objects(dir_path, delimiter=None) if entry['key'] not in spooled)
+            return self._delete_many(itertools.chain(keys, spooled), listed=True)
         
     def size(self, name):
-        return self._get_file_size(name)
+        with self._operation('size', name):
+            return self._get_file_size(name)
     
     def exists(self, name):
-        if self._get_object_status(name)['status'] == requests.codes.not_found:
-            return False
-        else:
-            return True
+        with self._operation('exists', name):
+            if self._get_object_status(name)['status'] == requests.codes.not_found:
+                return False
+            else:
+                return True
         
     def modified_time(self, name):
-        return self._get_modified_date(name)
+        with self._operation('modified_time', name):
+            return self._get_modified_date(name)
         
     def created_time(self, name):
-        return self._get_modified_date(name)
+        with self._operation('created_time', name):
+            return self._get_modified_date(name)
         
     def listdir(self, dir_name):
-        return self._traverse_folder(self._get_dir_list(dir_name))
\ No newline at end of file
+        with self._operation('listdir', dir_name):
+            return self._traverse_folder(self.iter_listdir(dir_name))
\ No newline at end of file
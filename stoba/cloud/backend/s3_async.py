@@ -0,0 +1,731 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import
+
+# Python 3 only: this module relies on async/await and is never imported by
+# the synchronous backend.
+
+from django.core.files.base import File
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.deconstruct import deconstructible
+from django.utils.encoding import force_text
+from .s3 import S3, METADATA_HEADERS, HEAD_ONLY_HEADERS
+from .compression import UNCOMPRESSED_SIZE_HEADER, get_decompressor
+from .multipart import MultipartUpload
+from .listing import ListBucketResultParser
+from .exceptions import S3ResponseError
+from .integrity import verify_etag
+from .files import HTTP_PARTIAL_CONTENT, HTTP_RANGE_NOT_SATISFIABLE
+from ..auth.s3_auth import UNSIGNED_PAYLOAD
+from ...core.instrumentation import current_operation
+from hashlib import md5
+import asyncio
+import errno
+import io
+import os
+import requests
+import time
+import weakref
+
+try:
+    import aiohttp
+    from yarl import URL
+except ImportError:
+    aiohttp = None
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+
+class AsyncResponse(object):
+    
+    # The parts of requests.Response the shared code (S3ResponseError,
+    # MultipartUpload._parse) relies on, with the body already read.
+    
+    def __init__(self, response, content):
+        self.status_code = response.status
+        self.reason = response.reason
+        self.url = str(response.url)
+        self.headers = response.headers
+        self.content = content
+
+
+class AsyncMultipartUpload(MultipartUpload):
+    
+    async def initiate(self, headers=None):
+        response = await self.storage._arequest('POST', '%s?uploads' % self.url, headers=headers)
+        if response.status_code != 200:
+            raise S3ResponseError(response)
+        self.upload_id = self._parse(response)['InitiateMultipartUploadResult']['UploadId']
+        return self.upload_id
+    
+    async def upload_part(self, part_number, data):
+        # As in the threaded upload, only a checksum mismatch has the part sent
+        # again: failed requests have been retried by _arequest already.
+        url = self._get_part_url(part_number)
+        headers = self._get_part_headers(part_number, data)
+        attempt = 0
+        
+        while True:
+            response = await self.storage._arequest('PUT', url, data=data, headers=headers)
+            if response.status_code != 200:
+                raise S3ResponseError(response)
+            try:
+                self._verify_part(part_number, response.headers['ETag'])
+                return response.headers['ETag']
+            except IOError as e:
+                error = e
+            
+            attempt += 1
+            if attempt > self.retries:
+                raise error
+            if current_operation() is not None:
+                current_operation().record_retry()
+            await asyncio.sleep(0.1 * (2 ** attempt))
+    
+    async def complete(self, etags):
+        response = await self.storage._arequest('POST', self._get_upload_url(), data=self._get_complete_body(etags))
+        if response.status_code != 200:
+            raise S3ResponseError(response)
+        return self._verify_complete(self._parse(response)['CompleteMultipartUploadResult'])
+    
+    async def abort(self):
+        await self.storage._arequest('DELETE', self._get_upload_url())
+    
+    async def upload(self, fileobj, size=None, headers=None):
+        part_size = self._get_part_size(size)
+        # As in the threaded upload, at most `concurrency` parts are in memory.
+        slots = asyncio.Semaphore(self.concurrency)
+        etags, tasks, failed = {}, [], []
+        
+        async def send(part_number, data):
+            try:
+                etags[part_number] = await self.upload_part(part_number, data)
+            except Exception as e:
+                failed.append(e)
+                raise
+            finally:
+                slots.release()
+        
+        # As in the threaded upload, the whole file is sent.
+        if hasattr(fileobj, 'seek'):
+            fileobj.seek(0)
+        
+        await self.initiate(headers)
+        try:
+            part_number = 1
+            while not failed:
+                await slots.acquire()
+                data = await asyncio.get_running_loop().run_in_executor(None, fileobj.read, part_size)
+                if not data:
+                    slots.release()
+                    break
+                tasks.append(asyncio.ensure_future(send(part_number, data)))
+                part_number += 1
+            
+            await asyncio.gather(*tasks)
+            return await self.complete(etags)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await self.abort()
+            raise
+
+
+class _AsyncFile(object):
+    
+    async def chunks(self, chunk_size=None):
+        self.seek(0)
+        while True:
+            data = await self.read(chunk_size or self.buffer_size)
+            if not data:
+                break
+            yield data
+    
+    def __aiter__(self):
+        return self.chunks()
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *args):
+        await self.close()
+
+
+class AsyncS3File(_AsyncFile):
+    
+    def __init__(self, storage, name, size, buffer_size):
+        self.storage = storage
+        self.name = name
+        self.size = size
+        self.buffer_size = buffer_size
+        self.mode = 'rb'
+        self.closed = False
+        self._position = 0
+        self._buffer = b''
+        self._buffer_start = 0
+    
+    def tell(self):
+        return self._position
+    
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_SET:
+            position = offset
+        elif whence == os.SEEK_CUR:
+            position = self._position + offset
+        elif whence == os.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError('Invalid whence (%r)' % whence)
+        
+        if position < 0:
+            raise ValueError('Negative seek position %d' % position)
+        
+        self._position = position
+        return position
+    
+    async def read(self, size=-1):
+        if size == 0 or self._position >= self.size:
+            return b''
+        
+        if size is None or size < 0:
+            end = self.size - 1
+        else:
+            end = min(self._position + size, self.size) - 1
+        
+        buffer_end = self._buffer_start + len(self._buffer) - 1
+        if not self._buffer_start <= self._position <= end <= buffer_end:
+            fetch_end = end if size is None or size < 0 else min(max(end, self._position + self.buffer_size - 1), self.size - 1)
+            self._buffer = await self.storage._aget_range(self.name, self._position, fetch_end)
+            self._buffer_start = self._position
+        
+        offset = self._position - self._buffer_start
+        data = self._buffer[offset:offset + end - self._position + 1]
+        self._position += len(data)
+        return data
+    
+    async def close(self):
+        self._buffer = b''
+        self.closed = True
+
+
+class AsyncDecodingFile(_AsyncFile):
+    
+    # An AsyncS3File of an object compression compressed, read back as it was
+    # saved. Seeking back starts decompressing from the beginning again.
+    
+    def __init__(self, raw, encoding, size):
+        self.raw = raw
+        self.name = raw.name
+        self.encoding = encoding
+        self.size = size
+        self.buffer_size = raw.buffer_size
+        self.mode = 'rb'
+        self._target = 0
+        self._rewind()
+    
+    @property
+    def closed(self):
+        return self.raw.closed
+    
+    def _rewind(self):
+        self.raw.seek(0)
+        self._decompress = get_decompressor(self.encoding)
+        self._position = 0
+        self._buffer = b''
+        self._eof = False
+    
+    def tell(self):
+        return self._target
+    
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_SET:
+            position = offset
+        elif whence == os.SEEK_CUR:
+            position = self._target + offset
+        elif whence == os.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError('Invalid whence (%r)' % whence)
+        
+        if position < 0:
+            raise ValueError('Negative seek position %d' % position)
+        
+        if position < self._position:
+            self._rewind()
+        self._target = position
+        return position
+    
+    async def read(self, size=-1):
+        if size is None:
+            size = -1
+        
+        while True:
+            # What lies before the position seek() asked for is dropped.
+            skip = min(self._target - self._position, len(self._buffer))
+            self._buffer = self._buffer[skip:]
+            self._position += skip
+            if self._eof or (self._position == self._target and 0 <= size <= len(self._buffer)):
+                break
+            
+            data = await self.raw.read(self.buffer_size)
+            if data:
+                self._buffer += self._decompress(data)
+            else:
+                self._eof = True
+        
+        if size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        self._position += len(data)
+        self._target = self._position
+        return data
+    
+    async def close(self):
+        self._buffer = b''
+        await self.raw.close()
+
+
+class AsyncLocalFile(_AsyncFile):
+    
+    # A local file, such as a spooled one, read in the default executor so
+    # that the disk does not stall the event loop.
+    
+    def __init__(self, file, buffer_size):
+        self.file = file
+        self.name = file.name
+        self.size = file.size
+        self.buffer_size = buffer_size
+        self.mode = 'rb'
+    
+    @property
+    def closed(self):
+        return self.file.closed
+    
+    def tell(self):
+        return self.file.tell()
+    
+    def seek(self, offset, whence=os.SEEK_SET):
+        return self.file.seek(offset, whence)
+    
+    async def read(self, size=-1):
+        if size is None:
+            size = -1
+        return await asyncio.get_running_loop().run_in_executor(None, self.file.read, size)
+    
+    async def close(self):
+        self.file.close()
+
+
+class _LoopState(object):
+    
+    def __init__(self, session, semaphore):
+        self.session = session
+        self.semaphore = semaphore
+
+
+@deconstructible
+class AsyncS3(S3):
+    
+    # Blocking work is kept off the event loop: file reads, the write-behind
+    # spool, the key index and the disk cache run in the default executor.
+    # The metadata cache is called inline, as it is meant to be an in-process
+    # cache such as locmem; a cache backend on the network blocks the loop
+    # for its round trips.
+    
+    def __init__(self, options=None):
+        if aiohttp is None:
+            raise ImproperlyConfigured('AsyncS3 requires the aiohttp package')
+        
+        super(AsyncS3, self).__init__(options)
+        
+        # aiohttp sessions and asyncio primitives belong to one event loop.
+        self._loop_states = weakref.WeakKeyDictionary()
+    
+    def _get_loop_state(self):
+        loop = asyncio.get_running_loop()
+        state = self._loop_states.get(loop)
+        
+        if state is None or state.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit = self._settings['async_concurrency'],
+                force_close = not self._settings['keep_alive']
+            )
+            session = aiohttp.ClientSession(
+                connector = connector,
+                timeout = aiohttp.ClientTimeout(
+                    sock_connect = self._settings['connect_timeout'],
+                    sock_read = self._settings['read_timeout']
+                ),
+                # Object bodies are returned as stored, like the sync reader.
+                auto_decompress = False,
+                headers = {'Accept-Encoding': 'identity'}
+            )
+            state = _LoopState(session, asyncio.Semaphore(self._settings['async_concurrency']))
+            self._loop_states[loop] = state
+        
+        return state
+    
+    async def aclose(self):
+        state = self._loop_states.pop(asyncio.get_running_loop(), None)
+        if state is not None:
+            await state.session.close()
+    
+    def _sign(self, method, url, params=None, headers=None, data=None):
+        # The request is signed by the same auth as the sync backend. Streamed
+        # bodies cannot be hashed before they are sent and go unsigned.
+        headers = dict(headers or {})
+        if data is not None and not isinstance(data, bytes) and self._settings['signature_version'] == 's3v4':
+            headers['X-Amz-Content-Sha256'] = UNSIGNED_PAYLOAD
+        body = data if isinstance(data, bytes) else None
+        
+        prepared = requests.Request(method, url, params=params, headers=headers, data=body).prepare()
+        prepared = self._auth(prepared)
+        
+        if 'Content-Length' not in headers:
+            prepared.headers.pop('Content-Length', None)
+        
+        # requests accepts byte header values, aiohttp only text.
+        signed_headers = dict(
+            (header, value.decode('latin-1') if isinstance(value, bytes) else value)
+            for header, value in prepared.headers.items()
+        )
+        return prepared.url, signed_headers
+    
+    async def _asend(self, method, url, params, headers, data, timeout):
+        signed_url, signed_headers = self._sign(method, url, params, headers, data)
+        state = self._get_loop_state()
+        connect_timeout, read_timeout = timeout
+        
+        async with state.semaphore:
+            # aiohttp would add a Content-Type after the request was signed,
+            # which breaks Signature Version 2.
+            async with state.session.request(
+                    method, URL(signed_url, encoded=True), headers=signed_headers, data=data,
+                    skip_auto_headers=('Content-Type',),
+                    timeout=aiohttp.ClientTimeout(sock_connect=connect_timeout, sock_read=read_timeout)) as response:
+                content = b'' if method == 'HEAD' else await response.read()
+                return AsyncResponse(response, content)
+    
+    async def _arequest(self, method, url, params=None, headers=None, data=None):
+        # The retries, backoff and deadline of RequestExecutor.execute. A body
+        # given as a function is built anew for every attempt; other streamed
+        # bodies can only be sent once.
+        executor = self._executor
+        deadline = None if executor.deadline is None else time.time() + executor.deadline
+        timeout = (self._settings['connect_timeout'], self._settings['read_timeout'])
+        resend = data is None or isinstance(data, bytes) or callable(data)
+        attempt = 0
+        
+        while True:
+            body = data() if callable(data) else data
+            try:
+                response = await self._asend(method, url, params, headers, body, executor._get_timeout(timeout, deadline))
+                error = None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                response, error = None, e
+            
+            if error is None and not executor.is_retryable(response):
+                break
+            
+            attempt += 1
+            delay = executor._get_delay(attempt)
+            if attempt > executor.retries or not resend or \
+                    (deadline is not None and time.time() + delay >= deadline):
+                if error is not None:
+                    raise error
+                break
+            
+            if current_operation() is not None:
+                current_operation().record_retry()
+            await asyncio.sleep(delay)
+        
+        current = current_operation()
+        if current is not None:
+            current.record_request(
+                response.status_code,
+                bytes_sent = len(body) if isinstance(body, bytes) else int((headers or {}).get('Content-Length') or 0),
+                bytes_received = len(response.content)
+            )
+        
+        return response
+    
+    async def _ahead_object(self, name):
+        response = await self._arequest('HEAD', self._get_object_url(name))
+        # As in _head_object, only a definite answer is a status.
+        if response.status_code not in (requests.codes.ok, requests.codes.not_found):
+            raise S3ResponseError(response)
+        
+        result = { header:response.headers.get(header) for header in METADATA_HEADERS }
+        result['status'] = response.status_code
+        
+        return result
+    
+    def _run_in_executor(self, func, *args):
+        return asyncio.get_running_loop().run_in_executor(None, func, *args)
+    
+    async def _aget_object_status(self, name):
+        # As in _get_object_status, files waiting in the write-behind spool
+        # exist even though S3 does not know them yet.
+        if self.spool is not None:
+            result = await self._run_in_executor(self._get_spooled_status, name)
+            if result is not None:
+                return result
+        
+        if self.key_index is not None:
+            result = await self._run_in_executor(self._get_indexed_status, name)
+            if result is not None:
+                return result
+        
+        result = self.metadata_cache.get(name)
+        if result is None:
+            result = await self._ahead_object(name)
+            self._cache_object_status({name: result})
+        return result
+    
+    async def _aget_full_object_status(self, name):
+        result = await self._aget_object_status(name)
+        if result['status'] == requests.codes.ok and any(header not in result for header in HEAD_ONLY_HEADERS):
+            result = await self._ahead_object(name)
+            self._cache_object_status({name: result})
+        return result
+    
+    async def _aget_range(self, name, start, end):
+        with self._operation('read', name):
+            headers = {'Range': 'bytes=%d-%d' % (start, end)}
+            response = await self._arequest('GET', self._get_object_url(name), headers=headers)
+        
+        if response.status_code == HTTP_PARTIAL_CONTENT:
+            return response.content
+        if response.status_code == HTTP_RANGE_NOT_SATISFIABLE:
+            return b''
+        if response.status_code == requests.codes.ok:
+            return response.content[start:end + 1]
+        raise S3ResponseError(response)
+    
+    async def _aiter_list_objects(self, prefix, delimiter='/'):
+        params = {'prefix': prefix}
+        if delimiter:
+            params['delimiter'] = delimiter
+        
+        while True:
+            listed = time.time()
+            with self._operation('list', prefix):
+                response = await self._arequest('GET', '%s/' % self.service_url, params=dict(params))
+                if response.status_code != requests.codes.ok:
+                    raise S3ResponseError(response)
+            
+            # A page holds at most 1000 keys, so it is parsed from memory.
+            result = ListBucketResultParser(io.BytesIO(response.content))
+            entries = list(result)
+            await self._run_in_executor(self._harvest_listing, entries, listed)
+            for entry in entries:
+                yield entry
+            
+            if not result.is_truncated or not result.marker:
+                break
+            params['marker'] = result.marker
+    
+    async def aiter_listdir(self, dir_name):
+        dir_path = self._get_dir_path(dir_name)
+        
+        key_index = await self._run_in_executor(self._get_key_index) if self.key_index is not None else None
+        if key_index is not None:
+            for key in await self._run_in_executor(lambda: list(key_index.iter_dir(dir_path))):
+                if key != dir_path:
+                    yield key
+            return
+        
+        async for entry in self._aiter_list_objects(dir_path):
+            if entry['key'] != dir_path:
+                yield entry['key']
+    
+    async def alistdir(self, dir_name):
+        with self._operation('listdir', dir_name):
+            return self._traverse_folder([key async for key in self.aiter_listdir(dir_name)])
+    
+    async def aexists(self, name):
+        with self._operation('exists', name):
+            status = await self._aget_object_status(name)
+            return status['status'] != requests.codes.not_found
+    
+    async def asize(self, name):
+        with self._operation('size', name):
+            original = self._settings['report_size_as'] == 'original'
+            if original:
+                status = await self._aget_full_object_status(name)
+            else:
+                status = await self._aget_object_status(name)
+        
+        if status['status'] == requests.codes.not_found:
+            raise IOError(errno.ENOENT, 'No such file', name)
+        if original:
+            return int(status.get(UNCOMPRESSED_SIZE_HEADER) or status['content-length'])
+        return int(status['content-length'])
+    
+    async def aopen(self, name, mode='rb'):
+        with self._operation('open', name):
+            if self.spool is not None:
+                spooled_file = await self._run_in_executor(self.spool.open, name)
+                if spooled_file is not None:
+                    return AsyncLocalFile(spooled_file, self._settings['read_buffer_size'])
+            
+            if self._settings['compression']:
+                status = await self._aget_full_object_status(name)
+            else:
+                status = await self._aget_object_status(name)
+        
+        if status['status'] == requests.codes.not_found:
+            raise IOError(errno.ENOENT, 'No such file', name)
+        if status['status'] != requests.codes.ok:
+            raise IOError('%s status while opening %s' % (status['status'], name))
+        
+        result = AsyncS3File(self, name, int(status['content-length']), self._settings['read_buffer_size'])
+        
+        # As in open(), files compression compressed read back as they were saved.
+        encoding, size = self._get_compression(status) if self._settings['compression'] else (None, None)
+        if encoding is not None:
+            return AsyncDecodingFile(result, encoding, size)
+        return result
+    
+    async def _aget_taken_names(self, prefix):
+        prefix = self._get_path(prefix)
+        if prefix == '.':
+            prefix = ''
+        
+        taken = set()
+        async for entry in self._aiter_list_objects(prefix):
+            if not entry.get('prefix'):
+                taken.add(entry['key'])
+        if self.spool is not None:
+            taken.update(await self._run_in_executor(self.spool.names, prefix))
+        return taken
+    
+    async def aget_available_name(self, name, max_length=None):
+        # CloudStorage.get_available_name with an awaited listing.
+        taken = {}
+        for prefix, candidate in self._iter_candidate_names(name, max_length):
+            if prefix not in taken:
+                taken[prefix] = await self._aget_taken_names(prefix)
+            if self._get_path(candidate) not in taken[prefix]:
+                return candidate
+    
+    async def asave(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        
+        if not hasattr(content, 'chunks'):
+            content = File(content)
+        
+        name = await self.aget_available_name(name, max_length=max_length)
+        name = await self._asave(name, content)
+        
+        return force_text(name.replace('\\', '/'))
+    
+    async def _asave(self, name, content):
+        if self.spool is not None:
+            # Write-behind, as in _save; spooling writes to disk.
+            return await self._run_in_executor(self._save, name, content)
+        
+        file_content = File(content)
+        headers = self._get_upload_headers(name, content)
+        
+        with self._operation('save', name):
+            # Compressing is CPU bound and would stall the event loop.
+            upload_content = await self._run_in_executor(self._compress, file_content, headers)
+            try:
+                if upload_content.size > self._settings['multipart_threshold']:
+                    result = await AsyncMultipartUpload(
+                        self, name,
+                        part_size = self._settings['multipart_chunk_size'],
+                        concurrency = self._settings['multipart_concurrency'],
+                        retries = self._settings['multipart_retries'],
+                        verify = self._settings['verify_checksums']
+                    ).upload(upload_content, size=upload_content.size, headers=headers)
+                    etag = result['ETag']
+                else:
+                    digests = []
+                    
+                    def body():
+                        # A retried PUT hashes the content again from the start.
+                        digests.append(md5())
+                        return self._iter_chunks(upload_content, digests[-1])
+                    
+                    response = await self._arequest(
+                        'PUT', self._get_object_url(name),
+                        headers = dict(headers, **{'Content-Length': str(upload_content.size)}),
+                        data = body
+                    )
+                    digest = digests[-1]
+                    if response.status_code != requests.codes.ok:
+                        raise S3ResponseError(response)
+                    if self._settings['verify_checksums']:
+                        verify_etag(response.headers.get('ETag'), digest.hexdigest(), name)
+                    etag = '"%s"' % digest.hexdigest()
+            finally:
+                if upload_content is not file_content:
+                    upload_content.close()
+            # Writes to the key index.
+            await self._run_in_executor(self._cache_uploaded_status, name, upload_content.size, etag, headers)
+        
+        return name
+    
+    async def _iter_chunks(self, file_content, digest):
+        # The checksum is computed as the body is sent; the chunks are read
+        # from disk in the default executor.
+        chunks = file_content.chunks()
+        while True:
+            chunk = await self._run_in_executor(next, chunks, None)
+            if chunk is None:
+                break
+            digest.update(chunk)
+            yield chunk
+    
+    async def adelete(self, name):
+        with self._operation('delete', name):
+            # As in delete(), a spooled version must not be uploaded afterwards.
+            # Discarding waits for an upload of the name that already started.
+            if self.spool is not None:
+                await self._run_in_executor(self.spool.discard, name)
+            response = await self._arequest('DELETE', self._get_object_url(name), headers={'Content-Length':'0'})
+            if response.status_code >= 300 and response.status_code != requests.codes.not_found:
+                raise S3ResponseError(response)
+            self.metadata_cache.delete(name)
+            if self.key_index is not None:
+                await self._run_in_executor(self._index_delete, [name])
+            if self.disk_cache is not None:
+                await self._run_in_executor(self.disk_cache.delete, self._get_disk_cache_key(name))
\ No newline at end of file
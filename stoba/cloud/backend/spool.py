@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import
+
+from django.core.files.base import File
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait
+from hashlib import sha256
+from .bulk import BulkResult
+import logging
+import errno
+import json
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+
+logger = logging.getLogger(__name__)
+
+COPY_BUFFER_SIZE = 1024 * 1024 # 1 MB
+
+
+class SpoolEntry(object):
+    
+    def __init__(self, name, token, created):
+        self.name = name
+        self.token = token
+        self.created = created
+
+
+class WriteBehindSpool(object):
+    
+    # Saved files are written (and fsynced) to a local directory and uploaded
+    # by a background pool. Every save of a name gets a new token, and the
+    # meta file of a name, which tells the token of the version to upload,
+    # only goes away once that version is in S3.
+    #
+    # The directory may be shared by the processes of a host. The meta files
+    # are the state they share: lookups read them, so a file spooled by one
+    # process exists for all of them. A name is claimed with a lock file
+    # (flock) while its version is uploaded, replaced or discarded, so every
+    # version is uploaded once, an older version never overwrites a newer
+    # one, and a delete waits for an upload that already started. Entries
+    # left behind by a process that is gone are picked up on start. Without
+    # fcntl (Windows) the directory must not be shared.
+    #
+    # The requests of an upload are retried by the request executor. An upload
+    # that fails all the same is tried again later, with exponential backoff,
+    # from a timer, so that no worker waits out an outage; once the retries
+    # are used up it waits for the next flush().
+    
+    def __init__(self, storage, directory, concurrency=4, retries=5, backoff=0.5):
+        self.storage = storage
+        self.directory = directory
+        self.retries = retries
+        self.backoff = backoff
+        # The entries this process spooled or recovered and still has to upload.
+        self._entries = {}
+        self._futures = set()
+        # Timers of the uploads to try again, by name.
+        self._scheduled = {}
+        self._failed = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(concurrency)
+        
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+        
+        self._recover()
+    
+    def _get_id(self, name):
+        return sha256(name.encode('utf-8')).hexdigest()
+    
+    def _get_meta_path(self, name):
+        return os.path.join(self.directory, '%s.json' % self._get_id(name))
+    
+    def _get_data_path(self, name, token):
+        return os.path.join(self.directory, '%s.%s.data' % (self._get_id(name), token))
+    
+    def _get_lock_path(self, name):
+        return os.path.join(self.directory, '%s.lock' % self._get_id(name))
+    
+    @contextmanager
+    def _claim(self, name, blocking=True):
+        # Yields whether the name was claimed; only fails when not blocking
+        # and another thread or process holds it.
+        if fcntl is None:
+            yield True
+            return
+        
+        path = self._get_lock_path(name)
+        while True:
+            lock_file = open(path, 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except (IOError, OSError) as e:
+                lock_file.close()
+                if e.errno in (errno.EAGAIN, errno.EACCES):
+                    yield False
+                    return
+                raise
+            # The lock file is removed by the last holder when the name is
+            # no longer spooled; a lock taken on a removed file is no lock.
+            try:
+                if os.fstat(lock_file.fileno()).st_ino == os.stat(path).st_ino:
+                    break
+            except OSError:
+                pass
+            lock_file.close()
+        
+        try:
+            yield True
+        finally:
+            if not os.path.exists(self._get_meta_path(name)):
+                self._remove(path)
+            lock_file.close()
+    
+    def _write_durably(self, path, write):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.rename(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+    
+    def _read_meta(self, path):
+        try:
+            with io.open(path, encoding='utf-8') as f:
+                meta = json.load(f)
+            return SpoolEntry(meta['name'], meta['token'], meta['created'])
+        except (IOError, OSError, ValueError, KeyError):
+            return None
+    
+    def _iter_meta(self):
+        for file_name in sorted(os.listdir(self.directory)):
+            if file_name.endswith('.json'):
+                entry = self._read_meta(os.path.join(self.directory, file_name))
+                if entry is not None:
+                    yield entry
+    
+    def _recover(self):
+        # Entries of live processes are claimed by them while they upload;
+        # the others are picked up here. Whoever claims an entry first
+        # uploads it, and the others find it gone.
+        for entry in self._iter_meta():
+            with self._lock:
+                self._entries[entry.name] = entry
+            self._submit(entry, recovered=True)
+    
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+    
+    def put(self, name, content):
+        entry = SpoolEntry(name, uuid.uuid4().hex, time.time())
+        
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        self._write_durably(self._get_data_path(name, entry.token), lambda f: shutil.copyfileobj(content, f, COPY_BUFFER_SIZE))
+        
+        meta = json.dumps({'name': name, 'token': entry.token, 'created': entry.created})
+        # Waits for an upload of the previous version that already started.
+        with self._claim(name):
+            previous = self.get(name)
+            self._write_durably(self._get_meta_path(name), lambda f: f.write(meta.encode('utf-8')))
+            with self._lock:
+                self._entries[name] = entry
+                self._failed.pop(name, None)
+                self._unschedule(name)
+            if previous is not None:
+                self._remove(self._get_data_path(name, previous.token))
+        
+        self._submit(entry)
+        return name
+    
+    def get(self, name):
+        entry = self._read_meta(self._get_meta_path(name))
+        return entry if entry is not None and entry.name == name else None
+    
+    def names(self, prefix=''):
+        return [entry.name for entry in self._iter_meta() if entry.name.startswith(prefix)]
+    
+    def open(self, name):
+        # Returns the spooled content of a name that is not uploaded yet.
+        entry = self.get(name)
+        if entry is None:
+            return None
+        try:
+            return File(open(self._get_data_path(name, entry.token), 'rb'), name)
+        except (IOError, OSError):
+            # Uploaded and removed in the meantime.
+            return None
+    
+    def size(self, entry):
+        return os.path.getsize(self._get_data_path(entry.name, entry.token))
+    
+    def discard(self, name):
+        # Returns once an upload of the name that already started is over, so
+        # that a delete or copy that follows happens after it.
+        with self._claim(name):
+            entry = self.get(name)
+            with self._lock:
+                self._entries.pop(name, None)
+                self._failed.pop(name, None)
+                self._unschedule(name)
+            if entry is not None:
+                self._remove(self._get_meta_path(name))
+                self._remove(self._get_data_path(name, entry.token))
+    
+    def _submit(self, entry, recovered=False, attempt=0):
+        future = self._executor.submit(self._upload, entry, recovered, attempt)
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._forget)
+    
+    def _forget(self, future):
+        with self._lock:
+            self._futures.discard(future)
+    
+    def _forget_entry(self, entry):
+        with self._lock:
+            current = self._entries.get(entry.name)
+            if current is not None and current.token == entry.token:
+                del self._entries[entry.name]
+    
+    def _unschedule(self, name):
+        # Called with the lock held.
+        scheduled = self._scheduled.pop(name, None)
+        if scheduled is not None:
+            scheduled[0].cancel()
+        return scheduled
+    
+    def _schedule(self, entry, recovered, attempt, error):
+        with self._lock:
+            current = self._entries.get(entry.name)
+            if current is None or current.token != entry.token:
+                # Replaced or discarded in the meantime.
+                return
+            if attempt >= self.retries:
+                self._failed[entry.name] = error
+                return
+            timer = threading.Timer(self.backoff * (2 ** attempt), self._resubmit, (entry,))
+            timer.daemon = True
+            self._scheduled[entry.name] = (timer, entry, recovered, attempt + 1)
+            timer.start()
+    
+    def _resubmit(self, entry):
+        with self._lock:
+            scheduled = self._scheduled.get(entry.name)
+            if scheduled is None or scheduled[1] is not entry:
+                # Replaced, discarded or already resubmitted by flush().
+                return
+            del self._scheduled[entry.name]
+        self._submit(*scheduled[1:])
+    
+    def _upload(self, entry, recovered=False, attempt=0):
+        # A recovered entry that another process holds is that process's to
+        # upload.
+        with self._claim(entry.name, blocking=not recovered) as claimed:
+            current = self.get(entry.name) if claimed else None
+            if current is None or current.token != entry.token:
+                # Uploaded, superseded or discarded, possibly by another process.
+                self._forget_entry(entry)
+                return entry.name, None
+            
+            try:
+                with open(self._get_data_path(entry.name, entry.token), 'rb') as f:
+                    self.storage._upload(entry.name, File(f, entry.name))
+            except (IOError, OSError) as e:
+                logger.warning('Upload of spooled file %s failed: %s', entry.name, e)
+                self._schedule(entry, recovered, attempt, e)
+                return entry.name, e
+            
+            self._forget_entry(entry)
+            self._remove(self._get_meta_path(entry.name))
+            self._remove(self._get_data_path(entry.name, entry.token))
+        
+        return entry.name, None
+    
+    def flush(self, timeout=None):
+        # Waits for the spool to drain; uploads that failed before are tried
+        # once more, those waiting for their backoff right away. Failures stay
+        # spooled and are reported in the result.
+        with self._lock:
+            retry = [(self._entries[name], False, self.retries) for name in self._failed if name in self._entries]
+            self._failed.clear()
+            for name in list(self._scheduled):
+                retry.append(self._unschedule(name)[1:])
+        for args in retry:
+            self._submit(*args)
+        
+        result = BulkResult()
+        deadline = None if timeout is None else time.time() + timeout
+        
+        while True:
+            with self._lock:
+                futures = set(self._futures)
+            if not futures:
+                break
+            done, pending = wait(futures, None if deadline is None else max(deadline - time.time(), 0))
+            for future in done:
+                name, error = future.result()
+                if error is None:
+                    result.add_success(name)
+                else:
+                    result.add_failure(name, error)
+            if pending:
+                # Out of time; whatever is still running stays spooled.
+                break
+        
+        return result
+    
+    def close(self):
+        self.flush()
+        with self._lock:
+            for name in list(self._scheduled):
+                self._unschedule(name)
+        self._executor.shutdown()
\ No newline at end of file
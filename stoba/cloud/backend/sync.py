@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import
+
+from hashlib import md5
+from .bulk import BulkResult
+from .multipart import get_part_size
+from .integrity import multipart_etag
+import json
+import os
+import posixpath
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+
+MANIFEST_VERSION = 2
+HASH_BLOCK_SIZE = 1024 * 1024 # 1 MB
+
+
+class SyncResult(BulkResult):
+    
+    def __init__(self):
+        super(SyncResult, self).__init__()
+        self.skipped = []
+        self.deleted = BulkResult()
+    
+    def __repr__(self):
+        return '<%s: %d uploaded, %d skipped, %d deleted, %d failed>' % (
+            self.__class__.__name__, len(self.succeeded), len(self.skipped),
+            len(self.deleted.succeeded), len(self.failed) + len(self.deleted.failed)
+        )
+
+
+def _md5(fileobj, length=None):
+    digest = md5()
+    remaining = length
+    
+    while remaining is None or remaining > 0:
+        block = fileobj.read(HASH_BLOCK_SIZE if remaining is None else min(HASH_BLOCK_SIZE, remaining))
+        if not block:
+            break
+        digest.update(block)
+        if remaining is not None:
+            remaining -= len(block)
+    
+    return digest
+
+
+def compute_etag(fileobj, size, multipart_threshold, part_size):
+    # The ETag S3 reports for an object uploaded by S3._save: the MD5 of the
+    # content for a single PUT and, for a multipart upload, the MD5 of the
+    # concatenated part digests followed by the number of parts.
+    if size <= multipart_threshold:
+        return _md5(fileobj).hexdigest()
+    
+    part_size = get_part_size(part_size, size)
+    digests = []
+    for _ in range(-(-size // part_size)):
+        digests.append(_md5(fileobj, part_size).digest())
+    
+    return multipart_etag(digests)
+
+
+class Manifest(object):
+    
+    # Remembers the ETag of every local file along with the size, mtime and
+    # upload options it was computed for, so unchanged files are never read
+    # again.
+    
+    def __init__(self, path=None):
+        self.path = path
+        self.entries = {}
+        
+        if path and os.path.exists(path):
+            with open(path) as manifest_file:
+                data = json.load(manifest_file)
+            if data.get('version') == MANIFEST_VERSION:
+                self.entries = data.get('files', {})
+    
+    def get_etag(self, name, path, options, compute):
+        # compute(path) returns the ETag of the file as uploaded with options,
+        # a list of whatever settings the ETag depends on.
+        stat = os.stat(path)
+        entry = self.entries.get(name)
+        
+        if entry is not None and entry['size'] == stat.st_size and \
+                entry['mtime'] == stat.st_mtime and entry['options'] == options:
+            return entry['etag']
+        
+        etag = compute(path)
+        self.entries[name] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'options': options, 'etag': etag}
+        return etag
+    
+    def prune(self, names):
+        names = set(names)
+        self.entries = dict((name, entry) for name, entry in self.entries.items() if name in names)
+    
+    def save(self):
+        if not self.path:
+            return
+        
+        # Written aside and renamed, so an interrupted run never leaves a
+        # truncated manifest behind.
+        temp_path = '%s.tmp' % self.path
+        with open(temp_path, 'w') as manifest_file:
+            json.dump({'version': MANIFEST_VERSION, 'files': self.entries}, manifest_file, sort_keys=True)
+        os.rename(temp_path, self.path)
+
+
+def get_remote_name(prefix, relative_path):
+    name = '/'.join(relative_path.split(os.sep))
+    return posixpath.join(prefix, name) if prefix else name
+
+
+def iter_local_files(local_path, prefix=''):
+    # Yields (storage name, local path) for every file below local_path.
+    for root, dirs, files in os.walk(local_path):
+        dirs.sort()
+        for file_name in sorted(files):
+            path = os.path.join(root, file_name)
+            yield get_remote_name(prefix, os.path.relpath(path, local_path)), path
\ No newline at end of file
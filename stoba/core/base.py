@@ -35,27 +35,60 @@
 
 from __future__ import unicode_literals, absolute_import
 
-from django.core.cache import cache
+from django.core.cache import caches, DEFAULT_CACHE_ALIAS
 from django.core.files.storage import Storage
-from binascii import crc32
+from collections import OrderedDict
+from hashlib import sha256
+from .instrumentation import current_operation
+import threading
 
 class Cachable(object):
     
     def _generate_cachable_key(self,key):
-        return 'STOBA_{:x}'.format(crc32(key) & 0xffffffff)
+        digest = sha256(key.encode('utf-8')).hexdigest()
+        return 'STOBA:{}:{}'.format(self.namespace, digest)
     
-    def add_content(self, key, value):
-        cache.add(self._generate_cachable_key(key),value,None)
+    @property
+    def cache(self):
+        return caches[self.alias]
+    
+    def add_content(self, key, value, timeout=None):
+        return self.cache.add(self._generate_cachable_key(key),value,timeout)
+    
+    def set_content(self, key, value, timeout=None):
+        self.cache.set(self._generate_cachable_key(key),value,timeout)
     
     def get_content(self,key):
-        return cache.get(self._generate_cachable_key(key))
+        return self.cache.get(self._generate_cachable_key(key))
         
     def del_content(self,key):
-        cache.delete(self._generate_cachable_key(key))
+        self.cache.delete(self._generate_cachable_key(key))
+    
+    def get_many(self, keys):
+        cachable_keys = dict((self._generate_cachable_key(key), key) for key in keys)
+        found = self.cache.get_many(list(cachable_keys))
+        return dict((cachable_keys[cachable_key], value) for cachable_key, value in found.items())
+    
+    def set_many(self, content, timeout=None):
+        if content:
+            self.cache.set_many(
+                dict((self._generate_cachable_key(key), value) for key, value in content.items()),
+                timeout
+            )
+    
+    def delete_many(self, keys):
+        cachable_keys = [self._generate_cachable_key(key) for key in keys]
+        if cachable_keys:
+            self.cache.delete_many(cachable_keys)
+        
+    def __init__(self,content=None, namespace='default', alias=DEFAULT_CACHE_ALIAS):
+        # Attributes are routed to the cache unless they already exist on the
+        # instance, so the configuration ones are put in place directly.
+        vars(self).update({'namespace': namespace, 'alias': alias})
         
-    def __init__(self,content=None):
         if isinstance(content, dict):
-            map(lambda x: self.add_content(*x), content.items())
+            for key, value in content.items():
+                self.add_content(key, value)
     
     def __setitem__(self, key, value):
         self.add_content(key, value)
@@ -80,8 +113,110 @@ class Cachable(object):
             self.add_content(key, value)
         else:
             return super(Cachable,self).__setattr__(key, value)
+
+
+class MetadataCache(Cachable):
+    
+    def __init__(self, timeout=None, negative_timeout=None, namespace='default', alias=DEFAULT_CACHE_ALIAS):
+        vars(self).update({
+            'timeout': timeout,
+            'negative_timeout': negative_timeout,
+            'hits': 0,
+            'misses': 0,
+            '_lock': threading.Lock()
+        })
+        super(MetadataCache, self).__init__(namespace=namespace, alias=alias)
+    
+    def _get_key(self, name):
+        return '{}_metadata'.format(name)
+    
+    def _count(self, hits=0, misses=0):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+        
+        operation = current_operation()
+        if operation is not None:
+            operation.record_cache(hits, misses)
+    
+    def get(self, name):
+        metadata = self.get_content(self._get_key(name))
+        self._count(hits=int(metadata is not None), misses=int(metadata is None))
+        return metadata
+    
+    def set(self, name, metadata, negative=False):
+        timeout = self.negative_timeout if negative else self.timeout
+        self.set_content(self._get_key(name), metadata, timeout)
+    
+    def delete(self, name):
+        self.del_content(self._get_key(name))
+    
+    def get_many(self, names):
+        found = super(MetadataCache, self).get_many([self._get_key(name) for name in names])
+        result = dict((name, found[self._get_key(name)]) for name in names if self._get_key(name) in found)
+        
+        self._count(hits=len(result), misses=len(set(names)) - len(result))
+        return result
+    
+    def set_many(self, metadata, negative=False):
+        timeout = self.negative_timeout if negative else self.timeout
+        super(MetadataCache, self).set_many(
+            dict((self._get_key(name), value) for name, value in metadata.items()),
+            timeout
+        )
+    
+    def delete_many(self, names):
+        super(MetadataCache, self).delete_many([self._get_key(name) for name in names])
+    
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+    
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+
+
+class LRUCache(object):
+    
+    # A small in-process cache for values that are cheaper to recompute than
+    # to fetch from a shared cache backend.
+    
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                return default
+            self._data[key] = value
+            return value
+    
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def __len__(self):
+        return len(self._data)
         
 
 class BaseStorage(Storage):
     
-    cachable = Cachable()
\ No newline at end of file
+    def __init__(self, cache_alias=DEFAULT_CACHE_ALIAS):
+        self.cache_alias = cache_alias
+        self.cachable = Cachable(namespace=self._get_cache_namespace(), alias=cache_alias)
+    
+    def _get_cache_namespace(self):
+        return self.__class__.__name__.lower()
\ No newline at end of file
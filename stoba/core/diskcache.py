@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import
+
+from contextlib import contextmanager
+from hashlib import sha256
+import io
+import mmap
+import os
+import shutil
+import tempfile
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+
+COPY_BUFFER_SIZE = 1024 * 1024 # 1 MB
+
+
+class MappedFile(io.RawIOBase):
+    
+    # A read-only view of a cached object. Reads are served from a memory map,
+    # so the data comes straight from the page cache, and getbuffer() hands
+    # out the mapping itself for consumers that can work without a copy.
+    
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.size = os.fstat(f.fileno()).st_size
+            # Empty files cannot be mapped.
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self._position = 0
+    
+    def readable(self):
+        return True
+    
+    def seekable(self):
+        return True
+    
+    def tell(self):
+        return self._position
+    
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_SET:
+            position = offset
+        elif whence == os.SEEK_CUR:
+            position = self._position + offset
+        elif whence == os.SEEK_END:
+            position = self.size + offset
+        else:
+            raise ValueError('Invalid whence (%r)' % whence)
+        
+        if position < 0:
+            raise ValueError('Negative seek position %d' % position)
+        
+        self._position = position
+        return position
+    
+    def readinto(self, b):
+        length = min(len(b), self.size - self._position)
+        if length <= 0:
+            return 0
+        
+        source = memoryview(self._map)
+        try:
+            memoryview(b)[:length] = source[self._position:self._position + length]
+        finally:
+            source.release()
+        
+        self._position += length
+        return length
+    
+    def readall(self):
+        if self._position >= self.size:
+            return b''
+        data = self._map[self._position:]
+        self._position = self.size
+        return data
+    
+    def getbuffer(self):
+        return memoryview(self._map if self._map is not None else b'')
+    
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        super(MappedFile, self).close()
+
+
+class DiskCache(object):
+    
+    # Objects are stored under a digest of their key and ETag, so a new version
+    # never overwrites a file somebody still has open, and a small file per key
+    # remembers the ETag of the cached version for conditional requests. All
+    # files are written aside and renamed into place, which keeps the cache
+    # consistent for several processes; eviction runs under a file lock.
+    # A running total of the object sizes, updated under the same lock, spares
+    # every put a scan of the objects; only when it exceeds max_size does
+    # eviction list them, which also corrects any drift of the total.
+    
+    def __init__(self, directory, max_size, max_object_size=None):
+        self.directory = directory
+        self.max_size = max_size
+        self.max_object_size = max_object_size or max_size
+        
+        for sub_directory in ('objects', 'keys', 'tmp'):
+            path = os.path.join(directory, sub_directory)
+            if not os.path.isdir(path):
+                try:
+                    os.makedirs(path)
+                except OSError:
+                    if not os.path.isdir(path):
+                        raise
+    
+    def _digest(self, *parts):
+        return sha256('\0'.join(parts).encode('utf-8')).hexdigest()
+    
+    def _get_object_path(self, key, etag):
+        return os.path.join(self.directory, 'objects', self._digest(key, etag))
+    
+    def _get_key_path(self, key):
+        return os.path.join(self.directory, 'keys', self._digest(key))
+    
+    def _read_etag(self, key):
+        try:
+            with io.open(self._get_key_path(key), encoding='utf-8') as f:
+                return f.read()
+        except (IOError, OSError):
+            return None
+    
+    def _write_atomic(self, path, write):
+        # Returns the size of the file written.
+        fd, temp_path = tempfile.mkstemp(dir=os.path.join(self.directory, 'tmp'))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+                size = f.tell()
+            os.rename(temp_path, path)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return size
+    
+    def _get_size_path(self):
+        return os.path.join(self.directory, 'size')
+    
+    def _read_size(self):
+        try:
+            with open(self._get_size_path(), 'rb') as f:
+                return int(f.read())
+        except (IOError, OSError, ValueError):
+            return None
+    
+    def _write_size(self, total):
+        self._write_atomic(self._get_size_path(), lambda f: f.write(str(total).encode('ascii')))
+    
+    def _add_size(self, delta):
+        # Returns the new total, or None while there is none to add to.
+        with self._lock():
+            total = self._read_size()
+            if total is not None:
+                total = max(total + delta, 0)
+                self._write_size(total)
+            return total
+    
+    def get(self, key):
+        etag = self._read_etag(key)
+        if etag is None:
+            return None
+        
+        path = self._get_object_path(key, etag)
+        try:
+            # The modification time doubles as the last access time for LRU.
+            os.utime(path, None)
+        except OSError:
+            return None
+        return etag, path
+    
+    def open(self, path):
+        return MappedFile(path)
+    
+    def put(self, key, etag, stream):
+        path = self._get_object_path(key, etag)
+        previous_etag = self._read_etag(key)
+        # The same key and ETag always hold the same content.
+        replaced = os.path.exists(path)
+        
+        size = self._write_atomic(path, lambda f: shutil.copyfileobj(stream, f, COPY_BUFFER_SIZE))
+        self._write_atomic(self._get_key_path(key), lambda f: f.write(etag.encode('utf-8')))
+        
+        delta = 0 if replaced else size
+        if previous_etag is not None and previous_etag != etag:
+            delta -= self._remove(self._get_object_path(key, previous_etag))
+        
+        total = self._add_size(delta)
+        if total is None or total > self.max_size:
+            self.evict()
+        return path
+    
+    def delete(self, key):
+        etag = self._read_etag(key)
+        if etag is not None:
+            self._remove(self._get_key_path(key))
+            size = self._remove(self._get_object_path(key, etag))
+            if size:
+                self._add_size(-size)
+    
+    def _remove(self, path):
+        # Returns the size of the removed file, 0 if there was none.
+        try:
+            size = os.stat(path).st_size
+            os.remove(path)
+        except OSError:
+            return 0
+        return size
+    
+    @contextmanager
+    def _lock(self):
+        if fcntl is None:
+            yield
+            return
+        
+        with open(os.path.join(self.directory, 'lock'), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    
+    def evict(self):
+        objects_path = os.path.join(self.directory, 'objects')
+        
+        with self._lock():
+            entries, total = [], 0
+            for file_name in os.listdir(objects_path):
+                path = os.path.join(objects_path, file_name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+            
+            # Least recently used first; files still mapped by a reader stay
+            # readable after they are unlinked.
+            for mtime, size, path in sorted(entries):
+                if total <= self.max_size:
+                    break
+                self._remove(path)
+                total -= size
+            
+            self._write_size(total)
\ No newline at end of file
@@ -39,6 +39,7 @@ from django.conf import settings
 from django.utils.dateformat import format
 from datetime import datetime
 from django.utils import timezone
+import calendar
 
 
 def tz_aware_datetime(datetime_obj,time_zone=None):
@@ -66,3 +67,13 @@ def get_infinity():
 
 def datetime_to_epoch(datetime_obj):
     return format(datetime_obj, u'U')
+
+
+def iso8601_to_epoch(value):
+    # Timestamps of S3 listings, such as 2016-07-01T12:00:00.000Z (always UTC).
+    if not value:
+        return None
+    try:
+        return calendar.timegm(datetime.strptime(value[:19], '%Y-%m-%dT%H:%M:%S').timetuple())
+    except ValueError:
+        return None
\ No newline at end of file
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import
+
+from contextlib import contextmanager
+from functools import wraps
+from .signals import storage_operation
+import threading
+import time
+
+try:
+    from contextvars import ContextVar
+except ImportError:
+    ContextVar = None
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+
+class _ThreadStack(object):
+    
+    # Fallback for interpreters without contextvars; tasks sharing a thread
+    # (asyncio) would see each other's operations here.
+    
+    def __init__(self, name):
+        self._local = threading.local()
+    
+    def get(self):
+        return getattr(self._local, 'value', ())
+    
+    def replace(self, value):
+        token = self.get()
+        self._local.value = tuple(value)
+        return token
+    
+    def restore(self, token):
+        self._local.value = token
+
+
+class _ContextStack(object):
+    
+    def __init__(self, name):
+        self._var = ContextVar(name, default=())
+    
+    def get(self):
+        return self._var.get()
+    
+    def replace(self, value):
+        return self._var.set(tuple(value))
+    
+    def restore(self, token):
+        self._var.reset(token)
+
+
+_Stack = _ThreadStack if ContextVar is None else _ContextStack
+
+_operations = _Stack('stoba_operations')
+_trackers = _Stack('stoba_trackers')
+
+
+def current_operation():
+    stack = _operations.get()
+    return stack[-1] if stack else None
+
+
+class Operation(object):
+    
+    COUNTERS = ('requests', 'bytes_sent', 'bytes_received', 'retries', 'cache_hits', 'cache_misses')
+    
+    def __init__(self, backend, name, key=None):
+        self.backend = backend
+        self.name = name
+        self.key = key
+        self.status = None
+        self.error = None
+        self.duration = None
+        self.started = time.time()
+        self._lock = threading.Lock()
+        for counter in self.COUNTERS:
+            setattr(self, counter, 0)
+    
+    @property
+    def cache(self):
+        if self.cache_misses:
+            return 'miss'
+        if self.cache_hits:
+            return 'hit'
+        return None
+    
+    def record_request(self, status, bytes_sent=0, bytes_received=0):
+        with self._lock:
+            self.status = status
+            self.requests += 1
+            self.bytes_sent += bytes_sent
+            self.bytes_received += bytes_received
+    
+    def record_retry(self):
+        with self._lock:
+            self.retries += 1
+    
+    def record_cache(self, hits=0, misses=0):
+        with self._lock:
+            self.cache_hits += hits
+            self.cache_misses += misses
+    
+    def merge(self, other):
+        # Nested operations roll their counters up into the enclosing one.
+        with self._lock:
+            for counter in self.COUNTERS:
+                setattr(self, counter, getattr(self, counter) + getattr(other, counter))
+            if other.status is not None:
+                self.status = other.status
+    
+    def as_dict(self):
+        result = dict((counter, getattr(self, counter)) for counter in self.COUNTERS)
+        result.update({
+            'backend': self.backend.__class__.__name__,
+            'operation': self.name,
+            'key': self.key,
+            'status': self.status,
+            'cache': self.cache,
+            'error': None if self.error is None else repr(self.error),
+            'duration': self.duration
+        })
+        return result
+
+
+@contextmanager
+def operation(backend, name, key=None):
+    parent = current_operation()
+    op = Operation(backend, name, key)
+    token = _operations.replace(_operations.get() + (op,))
+    
+    try:
+        yield op
+    except Exception as e:
+        op.error = e
+        raise
+    finally:
+        _operations.restore(token)
+        op.duration = time.time() - op.started
+        
+        if parent is not None:
+            parent.merge(op)
+        else:
+            for tracker in _trackers.get():
+                tracker.add(op)
+        
+        storage_operation.send(sender=backend.__class__, operation=op)
+
+
+def bind(func):
+    # Worker threads do not see the operations and trackers of the thread that
+    # queued the work; binding carries them over so nothing goes unaccounted.
+    operations, trackers = _operations.get(), _trackers.get()
+    
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        tokens = _operations.replace(operations), _trackers.replace(trackers)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _trackers.restore(tokens[1])
+            _operations.restore(tokens[0])
+    
+    return wrapper
+
+
+class StorageTotals(object):
+    
+    def __init__(self):
+        self.operations = 0
+        self.errors = 0
+        self.duration = 0.0
+        self._lock = threading.Lock()
+        for counter in Operation.COUNTERS:
+            setattr(self, counter, 0)
+    
+    def add(self, op):
+        with self._lock:
+            self.operations += 1
+            self.errors += 1 if op.error is not None else 0
+            self.duration += op.duration or 0
+            for counter in Operation.COUNTERS:
+                setattr(self, counter, getattr(self, counter) + getattr(op, counter))
+    
+    def as_dict(self):
+        with self._lock:
+            result = dict((counter, getattr(self, counter)) for counter in Operation.COUNTERS)
+            result.update({'operations': self.operations, 'errors': self.errors, 'duration': self.duration})
+            return result
+
+
+@contextmanager
+def track_storage():
+    # Collects the totals of all storage operations started by the current
+    # thread or task while the block runs, e.g. to log the storage time of a request.
+    totals = StorageTotals()
+    token = _trackers.replace(_trackers.get() + (totals,))
+    try:
+        yield totals
+    finally:
+        _trackers.restore(token)
+
+
+class OperationStats(object):
+    
+    # An optional in-process aggregator of the storage_operation signal,
+    # keeping totals per backend and operation name.
+    
+    def __init__(self):
+        self._totals = {}
+        self._lock = threading.Lock()
+    
+    def _receive(self, sender, operation, **kwargs):
+        key = (sender.__name__, operation.name)
+        with self._lock:
+            if key not in self._totals:
+                self._totals[key] = StorageTotals()
+            totals = self._totals[key]
+        totals.add(operation)
+    
+    def connect(self):
+        storage_operation.connect(self._receive, dispatch_uid=id(self))
+        return self
+    
+    def disconnect(self):
+        storage_operation.disconnect(dispatch_uid=id(self))
+    
+    def snapshot(self):
+        with self._lock:
+            items = list(self._totals.items())
+        return dict(('%s.%s' % key, totals.as_dict()) for key, totals in items)
+    
+    def reset(self):
+        with self._lock:
+            self._totals = {}
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import
+
+from contextlib import contextmanager
+import sqlite3
+import threading
+import time
+import os
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+
+SCHEMA = (
+    # The primary key is the table itself (no rowid), ordered by key within a
+    # bucket, so prefix queries are range scans. Deleted keys stay behind as
+    # tombstones until the next reconciliation.
+    '''CREATE TABLE IF NOT EXISTS keys (
+        bucket TEXT NOT NULL,
+        key TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime REAL,
+        etag TEXT,
+        deleted INTEGER NOT NULL DEFAULT 0,
+        updated REAL NOT NULL,
+        PRIMARY KEY (bucket, key)
+    ) WITHOUT ROWID''',
+    '''CREATE TABLE IF NOT EXISTS reconciliations (
+        bucket TEXT NOT NULL PRIMARY KEY,
+        started REAL,
+        finished REAL
+    ) WITHOUT ROWID'''
+)
+
+# Rows written by a listing only replace rows that are older than the listing,
+# so they never undo a save or delete that happened while it was running.
+UPSERT_LISTED = '''
+    INSERT INTO keys (bucket, key, size, mtime, etag, deleted, updated) VALUES (?, ?, ?, ?, ?, 0, ?)
+    ON CONFLICT (bucket, key) DO UPDATE SET
+        size = excluded.size, mtime = excluded.mtime, etag = excluded.etag, deleted = 0, updated = excluded.updated
+    WHERE keys.updated < excluded.updated
+'''
+
+BATCH_SIZE = 1000
+
+
+def get_prefix_end(prefix):
+    # The smallest string greater than every string starting with prefix.
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1) if prefix else None
+
+
+class KeyIndex(object):
+    
+    # A persistent index of the keys of a bucket with their size, mtime and
+    # ETag in a SQLite file, which any number of processes can share.
+    
+    def __init__(self, path, bucket, timeout=30):
+        self.path = path
+        self.bucket = bucket
+        self.timeout = timeout
+        self._connect()
+    
+    def _connect(self):
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._connection = sqlite3.connect(self.path, timeout=self.timeout, check_same_thread=False, isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        for statement in SCHEMA:
+            self._connection.execute(statement)
+    
+    @contextmanager
+    def _cursor(self, write=False):
+        # A forked child must not share the connection of its parent.
+        if self._pid != os.getpid():
+            self._connect()
+        
+        with self._lock:
+            cursor = self._connection.cursor()
+            if not write:
+                yield cursor
+                return
+            cursor.execute('BEGIN IMMEDIATE')
+            try:
+                yield cursor
+            except BaseException:
+                cursor.execute('ROLLBACK')
+                raise
+            cursor.execute('COMMIT')
+    
+    def get(self, key):
+        # Returns (size, mtime, etag), None for a key that does not exist.
+        with self._cursor() as cursor:
+            cursor.execute(
+                'SELECT size, mtime, etag FROM keys WHERE bucket = ? AND key = ? AND deleted = 0', (self.bucket, key)
+            )
+            return cursor.fetchone()
+    
+    def put(self, key, size, mtime, etag):
+        with self._cursor(write=True) as cursor:
+            cursor.execute(
+                'INSERT OR REPLACE INTO keys (bucket, key, size, mtime, etag, deleted, updated) VALUES (?, ?, ?, ?, ?, 0, ?)',
+                (self.bucket, key, size, mtime, etag, time.time())
+            )
+    
+    def delete_many(self, keys):
+        now = time.time()
+        with self._cursor(write=True) as cursor:
+            cursor.executemany(
+                'INSERT OR REPLACE INTO keys (bucket, key, size, mtime, etag, deleted, updated) VALUES (?, ?, 0, NULL, NULL, 1, ?)',
+                [(self.bucket, key, now) for key in keys]
+            )
+    
+    def delete(self, key):
+        self.delete_many([key])
+    
+    def put_listed(self, entries, listed):
+        # entries are (key, size, mtime, etag) as seen by a listing that
+        # started at listed.
+        with self._cursor(write=True) as cursor:
+            cursor.executemany(UPSERT_LISTED, [
+                (self.bucket, key, size, mtime, etag, listed) for key, size, mtime, etag in entries
+            ])
+    
+    def _iter_range(self, start, end):
+        # Keys in [start, end), read in batches so the lock is never held for long.
+        while True:
+            with self._cursor() as cursor:
+                if end is None:
+                    cursor.execute(
+                        'SELECT key FROM keys WHERE bucket = ? AND key >= ? AND deleted = 0 ORDER BY key LIMIT ?',
+                        (self.bucket, start, BATCH_SIZE)
+                    )
+                else:
+                    cursor.execute(
+                        'SELECT key FROM keys WHERE bucket = ? AND key >= ? AND key < ? AND deleted = 0 ORDER BY key LIMIT ?',
+                        (self.bucket, start, end, BATCH_SIZE)
+                    )
+                keys = [row[0] for row in cursor.fetchall()]
+            
+            for key in keys:
+                yield key
+            if len(keys) < BATCH_SIZE:
+                break
+            start = keys[-1] + '\0'
+    
+    def iter_keys(self, prefix=''):
+        return self._iter_range(prefix, get_prefix_end(prefix))
+    
+    def iter_dir(self, prefix=''):
+        # Like a listing with "/" as delimiter: the keys directly below prefix
+        # and, once each, the prefixes of the folders below it. Every folder
+        # is skipped with a single seek past its last possible key.
+        start, end = prefix, get_prefix_end(prefix)
+        while True:
+            folder = None
+            for key in self._iter_range(start, end):
+                separator = key.find('/', len(prefix))
+                if separator >= 0:
+                    folder = key[:separator + 1]
+                    break
+                yield key
+            if folder is None:
+                break
+            yield folder
+            start = get_prefix_end(folder)
+    
+    def get_reconciled_time(self):
+        with self._cursor() as cursor:
+            cursor.execute('SELECT finished FROM reconciliations WHERE bucket = ?', (self.bucket,))
+            row = cursor.fetchone()
+        return row[0] if row else None
+    
+    def claim_reconciliation(self, lease):
+        # Only one process reconciles at a time; a claim older than lease is
+        # taken to be abandoned.
+        now = time.time()
+        with self._cursor(write=True) as cursor:
+            cursor.execute('INSERT OR IGNORE INTO reconciliations (bucket) VALUES (?)', (self.bucket,))
+            cursor.execute(
+                'UPDATE reconciliations SET started = ? WHERE bucket = ? AND (started IS NULL OR started < ?)',
+                (now, self.bucket, now - lease)
+            )
+            return cursor.rowcount == 1
+    
+    def reconcile(self, entries, started):
+        # entries is a full listing of the bucket that started at started.
+        # Whatever was neither listed nor changed locally since then is gone
+        # from the bucket, as are the tombstones older than the listing.
+        for batch in _batched(entries, BATCH_SIZE):
+            self.put_listed(batch, started)
+        
+        with self._cursor(write=True) as cursor:
+            cursor.execute('DELETE FROM keys WHERE bucket = ? AND updated < ?', (self.bucket, started))
+            # Reconciling without a claim, as reconcile_index() does, finds no
+            # row yet on a new index.
+            cursor.execute('INSERT OR IGNORE INTO reconciliations (bucket) VALUES (?)', (self.bucket,))
+            cursor.execute(
+                'UPDATE reconciliations SET started = NULL, finished = ? WHERE bucket = ?', (started, self.bucket)
+            )
+    
+    def release_reconciliation(self):
+        with self._cursor(write=True) as cursor:
+            cursor.execute('UPDATE reconciliations SET started = NULL WHERE bucket = ?', (self.bucket,))
+    
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+def _batched(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
\ No newline at end of file
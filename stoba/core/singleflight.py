@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import
+
+import threading
+import time
+import os
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+
+class _Call(object):
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight(object):
+    
+    # Concurrent calls with the same key share the work of the first one
+    # (the leader); the others wait for its result or error. With a Cachable
+    # the leader also takes a short lease in the shared cache, and callers in
+    # other processes poll for the result the leader publishes instead of
+    # repeating the work.
+    
+    def __init__(self, cachable=None, lease=5, poll_interval=0.05):
+        self.cachable = cachable
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._reset()
+    
+    def _reset(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+    
+    def do(self, key, func, poll=None):
+        # A forked child inherits calls whose leaders only exist in the parent.
+        if self._pid != os.getpid():
+            self._reset()
+        
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        
+        try:
+            call.result = self._call(key, func, poll)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+    
+    def _call(self, key, func, poll):
+        if self.cachable is None or poll is None:
+            return func()
+        
+        lock_key = 'singleflight:%r' % (key,)
+        if self.cachable.add_content(lock_key, os.getpid(), timeout=self.lease):
+            try:
+                return func()
+            finally:
+                self.cachable.del_content(lock_key)
+        
+        deadline = time.time() + self.lease
+        while time.time() < deadline:
+            time.sleep(self.poll_interval)
+            result = poll()
+            if result is not None:
+                return result
+        
+        # The lease ran out without a result; the leader is gone or too slow.
+        return func()
\ No newline at end of file
@@ -0,0 +1,731 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import
+
+from django.utils.http import http_date
+from django.utils.six.moves import BaseHTTPServer, socketserver
+from django.utils.six.moves.urllib.parse import urlsplit, parse_qsl, unquote
+from xml.sax.saxutils import escape
+from .signatures import SignatureError, verify_request
+from hashlib import md5
+from datetime import datetime
+import xmltodict
+import base64
+import threading
+import tempfile
+import shutil
+import time
+import uuid
+import io
+import os
+import re
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+
+S3_XMLNS = 'http://s3.amazonaws.com/doc/2006-03-01/'
+CHUNK_SIZE = 64 * 1024
+UPLOADS_BUCKET = '.uploads'
+
+ACCESS_KEY_ID = 'stand-in'
+SECRET_ACCESS_KEY = 'stand-in'
+
+# Request headers that are stored with an object and returned on GET/HEAD.
+STORED_HEADERS = ('content-type', 'content-encoding', 'content-disposition', 'cache-control')
+
+
+class S3Object(object):
+    
+    def __init__(self, size, etag, headers, last_modified=None):
+        self.size = size
+        self.etag = etag
+        self.headers = headers
+        self.last_modified = last_modified or time.time()
+
+
+class MemoryStore(object):
+    
+    def __init__(self):
+        self._objects = {}
+        self._lock = threading.Lock()
+    
+    def put(self, bucket, key, stream, headers=None):
+        digest, chunks = md5(), []
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            chunks.append(chunk)
+        data = b''.join(chunks)
+        
+        obj = S3Object(len(data), '"%s"' % digest.hexdigest(), dict(headers or {}))
+        with self._lock:
+            self._objects[(bucket, key)] = (obj, data)
+        return obj
+    
+    def get(self, bucket, key):
+        with self._lock:
+            entry = self._objects.get((bucket, key))
+        return None if entry is None else entry[0]
+    
+    def open(self, bucket, key):
+        with self._lock:
+            return io.BytesIO(self._objects[(bucket, key)][1])
+    
+    def delete(self, bucket, key):
+        with self._lock:
+            return self._objects.pop((bucket, key), None) is not None
+    
+    def keys(self, bucket):
+        with self._lock:
+            return sorted(key for object_bucket, key in self._objects if object_bucket == bucket)
+
+
+class DiskStore(MemoryStore):
+    
+    # Object bodies live in files below `directory`; only their metadata is
+    # kept in memory, so large objects do not have to fit in RAM.
+    
+    def __init__(self, directory=None):
+        super(DiskStore, self).__init__()
+        self._cleanup = directory is None
+        self.directory = directory or tempfile.mkdtemp(prefix='stoba-s3-')
+    
+    def _get_file_path(self, bucket, key):
+        return os.path.join(self.directory, md5(('%s/%s' % (bucket, key)).encode('utf-8')).hexdigest())
+    
+    def put(self, bucket, key, stream, headers=None):
+        path = self._get_file_path(bucket, key)
+        temp_path = '%s.%s' % (path, uuid.uuid4().hex)
+        digest, size = md5(), 0
+        
+        with open(temp_path, 'wb') as f:
+            for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                f.write(chunk)
+                size += len(chunk)
+        
+        obj = S3Object(size, '"%s"' % digest.hexdigest(), dict(headers or {}))
+        with self._lock:
+            os.rename(temp_path, path)
+            self._objects[(bucket, key)] = (obj, path)
+        return obj
+    
+    def open(self, bucket, key):
+        with self._lock:
+            return open(self._objects[(bucket, key)][1], 'rb')
+    
+    def delete(self, bucket, key):
+        with self._lock:
+            entry = self._objects.pop((bucket, key), None)
+            if entry is not None:
+                os.remove(entry[1])
+        return entry is not None
+    
+    def close(self):
+        if self._cleanup:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class _ChunkedReader(object):
+    
+    def __init__(self, rfile):
+        self.rfile = rfile
+        self.remaining = 0
+        self.done = False
+    
+    def read(self, size=-1):
+        if self.done:
+            return b''
+        if self.remaining == 0:
+            self.remaining = int(self.rfile.readline().split(b';')[0].strip(), 16)
+            if self.remaining == 0:
+                while self.rfile.readline().strip():
+                    pass
+                self.done = True
+                return b''
+        data = self.rfile.read(self.remaining if size < 0 else min(size, self.remaining))
+        self.remaining -= len(data)
+        if self.remaining == 0:
+            self.rfile.readline()
+        return data
+
+
+class _LimitedReader(object):
+    
+    def __init__(self, rfile, length):
+        self.rfile = rfile
+        self.remaining = length
+    
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b''
+        data = self.rfile.read(self.remaining if size < 0 else min(size, self.remaining))
+        self.remaining -= len(data)
+        return data
+    
+    def readline(self):
+        if self.remaining <= 0:
+            return b''
+        data = self.rfile.readline(self.remaining)
+        self.remaining -= len(data)
+        return data
+
+
+class _ConcatenatedReader(object):
+    
+    def __init__(self, files):
+        self.files = list(files)
+    
+    def read(self, size=-1):
+        while self.files:
+            data = self.files[0].read(size)
+            if data:
+                return data
+            self.files.pop(0).close()
+        return b''
+
+
+class S3RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    
+    def log_message(self, *args):
+        pass
+    
+    def parse_request(self):
+        if not BaseHTTPServer.BaseHTTPRequestHandler.parse_request(self):
+            return False
+        
+        error = self.server.fault(self.command, self.path) or self._authenticate()
+        if error is None:
+            return True
+        
+        self._drain_body()
+        self._send_error(*error)
+        return False
+    
+    def _get_host_bucket(self):
+        host = (self.headers.get('Host') or '').split(':')[0]
+        if self.server.hostname and host.endswith('.%s' % self.server.hostname):
+            return host[:-len(self.server.hostname) - 1]
+        return None
+    
+    def _authenticate(self):
+        if self.server.credentials is None:
+            return None
+        try:
+            verify_request(self.command, self.path, self.headers, self.server.credentials, self._get_host_bucket())
+        except SignatureError as e:
+            return 403, e.code, e.message
+        return None
+    
+    def handle(self):
+        try:
+            BaseHTTPServer.BaseHTTPRequestHandler.handle(self)
+        except (IOError, OSError):
+            # Clients drop kept-alive connections whenever they like.
+            pass
+    
+    # Request parsing
+    
+    def _parse_request(self):
+        url = urlsplit(self.path)
+        self.query = dict(parse_qsl(url.query, keep_blank_values=True))
+        path = unquote(url.path)
+        
+        bucket = self._get_host_bucket()
+        if bucket is not None:
+            # Virtual-hosted-style request: bucket.hostname/key
+            self.bucket = bucket
+            self.key = path[1:]
+        else:
+            self.bucket, _, self.key = path[1:].partition('/')
+        
+        self.server.wait(self.command, self.path)
+    
+    def _is_aws_chunked(self):
+        return 'aws-chunked' in [value.strip() for value in self.headers.get('Content-Encoding', '').split(',')]
+    
+    def _get_body(self):
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            return _ChunkedReader(self.rfile)
+        body = _LimitedReader(self.rfile, int(self.headers.get('Content-Length') or 0))
+        if self._is_aws_chunked():
+            # SigV4 streaming uploads frame the content like chunked transfer
+            # encoding, with the chunk signatures (not verified here) as extensions.
+            return _ChunkedReader(body)
+        return body
+    
+    def _drain_body(self):
+        body = self._get_body()
+        while body.read(CHUNK_SIZE):
+            pass
+    
+    # Responses
+    
+    def _send(self, status, body=b'', headers=None, send_body=True):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        if 'Content-Length' not in (headers or {}):
+            self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if send_body and body:
+            self.wfile.write(body)
+    
+    def _send_xml(self, status, root, content):
+        body = xmltodict.unparse({root: dict(content, **{'@xmlns': S3_XMLNS})}).encode('utf-8')
+        self._send(status, body, {'Content-Type': 'application/xml'})
+    
+    def _send_error(self, status, code, message=''):
+        body = xmltodict.unparse({'Error': {'Code': code, 'Message': message}}).encode('utf-8')
+        self._send(status, body, {'Content-Type': 'application/xml'}, send_body=self.command != 'HEAD')
+    
+    def _get_stored_headers(self):
+        headers = dict(
+            (name.lower(), value) for name, value in self.headers.items()
+            if name.lower() in STORED_HEADERS or name.lower().startswith('x-amz-meta-')
+        )
+        headers.setdefault('content-type', 'binary/octet-stream')
+        if self._is_aws_chunked():
+            encodings = [value.strip() for value in headers['content-encoding'].split(',') if value.strip() != 'aws-chunked']
+            if encodings:
+                headers['content-encoding'] = ','.join(encodings)
+            else:
+                del headers['content-encoding']
+        return headers
+    
+    def _object_headers(self, obj):
+        headers = dict(obj.headers)
+        headers.update({
+            'ETag': obj.etag,
+            'Last-Modified': http_date(obj.last_modified),
+            'Accept-Ranges': 'bytes'
+        })
+        return headers
+    
+    def _is_not_modified(self, obj):
+        # If-None-Match holds a list of entity tags or *.
+        tags = [tag.strip() for tag in (self.headers.get('If-None-Match') or '').split(',') if tag.strip()]
+        return '*' in tags or obj.etag in tags
+    
+    def _send_not_modified(self, obj):
+        self._send(304, headers={'ETag': obj.etag, 'Last-Modified': http_date(obj.last_modified)})
+    
+    # Verbs
+    
+    def do_HEAD(self):
+        self._parse_request()
+        obj = self.server.store.get(self.bucket, self.key)
+        if obj is None:
+            return self._send_error(404, 'NoSuchKey')
+        if self._is_not_modified(obj):
+            return self._send_not_modified(obj)
+        
+        headers = self._object_headers(obj)
+        headers['Content-Length'] = str(obj.size)
+        self._send(200, headers=headers)
+    
+    def do_GET(self):
+        self._parse_request()
+        if not self.key:
+            return self._list_objects()
+        
+        obj = self.server.store.get(self.bucket, self.key)
+        if obj is None:
+            return self._send_error(404, 'NoSuchKey')
+        if self._is_not_modified(obj):
+            return self._send_not_modified(obj)
+        
+        start, end, status = 0, obj.size - 1, 200
+        headers = self._object_headers(obj)
+        
+        match = re.match(r'bytes=(\d*)-(\d*)$', self.headers.get('Range') or '')
+        if match:
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), obj.size - 1) if match.group(2) else obj.size - 1
+            else:
+                start = max(obj.size - int(match.group(2)), 0)
+            if start >= obj.size:
+                headers = {'Content-Range': 'bytes */%d' % obj.size}
+                return self._send(416, headers=headers)
+            status = 206
+            headers['Content-Range'] = 'bytes %d-%d/%d' % (start, end, obj.size)
+        
+        headers['Content-Length'] = str(end - start + 1)
+        self._send(status, headers=headers)
+        
+        with self.server.store.open(self.bucket, self.key) as f:
+            f.seek(start)
+            remaining = end - start + 1
+            try:
+                while remaining > 0:
+                    data = f.read(min(remaining, CHUNK_SIZE))
+                    if not data:
+                        break
+                    self.wfile.write(data)
+                    remaining -= len(data)
+            except (IOError, OSError):
+                # The client went away before reading the whole body.
+                self.close_connection = True
+    
+    def do_PUT(self):
+        self._parse_request()
+        
+        if 'X-Amz-Copy-Source' in self.headers:
+            self._drain_body()
+            if 'uploadId' in self.query:
+                return self._copy_part()
+            return self._copy_object()
+        if 'uploadId' in self.query:
+            return self._upload_part()
+        
+        obj = self.server.store.put(self.bucket, self.key, self._get_body(), self._get_stored_headers())
+        self._send(200, headers={'ETag': obj.etag})
+    
+    def do_DELETE(self):
+        self._parse_request()
+        self._drain_body()
+        
+        if 'uploadId' in self.query:
+            return self._abort_multipart_upload()
+        
+        self.server.store.delete(self.bucket, self.key)
+        self._send(204)
+    
+    def do_POST(self):
+        self._parse_request()
+        
+        if 'delete' in self.query:
+            return self._delete_objects()
+        if 'uploads' in self.query:
+            return self._initiate_multipart_upload()
+        if 'uploadId' in self.query:
+            return self._complete_multipart_upload()
+        
+        self._drain_body()
+        self._send_error(400, 'InvalidRequest')
+    
+    # Copying
+    
+    def _get_copy_source(self):
+        bucket, _, key = unquote(self.headers['X-Amz-Copy-Source']).lstrip('/').partition('/')
+        return bucket, key, self.server.store.get(bucket, key)
+    
+    def _copy_from(self, bucket, key, obj, put):
+        # Calls put with a reader over the source, limited to the requested range.
+        start, end = 0, obj.size - 1
+        match = re.match(r'bytes=(\d+)-(\d+)$', self.headers.get('X-Amz-Copy-Source-Range') or '')
+        if match:
+            start, end = int(match.group(1)), int(match.group(2))
+        
+        with self.server.store.open(bucket, key) as f:
+            f.seek(start)
+            return put(_LimitedReader(f, end - start + 1))
+    
+    def _copy_object(self):
+        bucket, key, source = self._get_copy_source()
+        if source is None:
+            return self._send_error(404, 'NoSuchKey')
+        
+        if (self.headers.get('X-Amz-Metadata-Directive') or 'COPY').upper() == 'REPLACE':
+            headers = self._get_stored_headers()
+        else:
+            headers = dict(source.headers)
+        
+        obj = self._copy_from(bucket, key, source, lambda reader: self.server.store.put(self.bucket, self.key, reader, headers))
+        self._send_xml(200, 'CopyObjectResult', {
+            'ETag': obj.etag,
+            'LastModified': datetime.utcfromtimestamp(obj.last_modified).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        })
+    
+    def _copy_part(self):
+        upload = self._get_upload()
+        if upload is None:
+            return self._send_error(404, 'NoSuchUpload')
+        bucket, key, source = self._get_copy_source()
+        if source is None:
+            return self._send_error(404, 'NoSuchKey')
+        
+        part_number = int(self.query['partNumber'])
+        part_key = '%s/%05d' % (self.query['uploadId'], part_number)
+        obj = self._copy_from(bucket, key, source, lambda reader: self.server.store.put(UPLOADS_BUCKET, part_key, reader))
+        
+        with self.server.lock:
+            upload['parts'][part_number] = (part_key, obj.etag)
+        self._send_xml(200, 'CopyPartResult', {
+            'ETag': obj.etag,
+            'LastModified': datetime.utcfromtimestamp(obj.last_modified).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        })
+    
+    # Listing
+    
+    def _list_objects(self):
+        prefix = self.query.get('prefix', '')
+        delimiter = self.query.get('delimiter', '')
+        marker = self.query.get('marker', '')
+        max_keys = int(self.query.get('max-keys', 1000))
+        
+        contents, prefixes, last = [], [], None
+        is_truncated = False
+        
+        for key in self.server.store.keys(self.bucket):
+            if not key.startswith(prefix) or key <= marker:
+                continue
+            
+            entry = key
+            if delimiter:
+                index = key.find(delimiter, len(prefix))
+                if index >= 0:
+                    entry = key[:index + len(delimiter)]
+                    if entry <= marker or (prefixes and prefixes[-1] == entry):
+                        continue
+            
+            if len(contents) + len(prefixes) >= max_keys:
+                is_truncated = True
+                break
+            
+            if entry == key:
+                obj = self.server.store.get(self.bucket, key)
+                contents.append((key, obj))
+            else:
+                prefixes.append(entry)
+            last = entry
+        
+        body = ['<?xml version="1.0" encoding="UTF-8"?>',
+                '<ListBucketResult xmlns="%s">' % S3_XMLNS,
+                '<Name>%s</Name><Prefix>%s</Prefix><Marker>%s</Marker>' % (escape(self.bucket), escape(prefix), escape(marker)),
+                '<MaxKeys>%d</MaxKeys><IsTruncated>%s</IsTruncated>' % (max_keys, 'true' if is_truncated else 'false')]
+        if delimiter:
+            body.append('<Delimiter>%s</Delimiter>' % escape(delimiter))
+            if is_truncated:
+                body.append('<NextMarker>%s</NextMarker>' % escape(last))
+        for key, obj in contents:
+            body.append(
+                '<Contents><Key>%s</Key><LastModified>%s</LastModified><ETag>%s</ETag>'
+                '<Size>%d</Size><StorageClass>STANDARD</StorageClass></Contents>' % (
+                    escape(key),
+                    datetime.utcfromtimestamp(obj.last_modified).strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                    escape(obj.etag),
+                    obj.size
+                )
+            )
+        for common_prefix in prefixes:
+            body.append('<CommonPrefixes><Prefix>%s</Prefix></CommonPrefixes>' % escape(common_prefix))
+        body.append('</ListBucketResult>')
+        
+        self._send(200, ''.join(body).encode('utf-8'), {'Content-Type': 'application/xml'})
+    
+    def _delete_objects(self):
+        data = xmltodict.parse(self._get_body().read(), force_list=('Object',))
+        request = data.get('Delete') or {}
+        quiet = (request.get('Quiet') or '').lower() == 'true'
+        
+        deleted = []
+        for entry in request.get('Object', []):
+            self.server.store.delete(self.bucket, entry['Key'])
+            deleted.append({'Key': entry['Key']})
+        
+        self._send_xml(200, 'DeleteResult', {} if quiet else {'Deleted': deleted})
+    
+    # Multipart uploads
+    
+    def _initiate_multipart_upload(self):
+        self._drain_body()
+        upload_id = uuid.uuid4().hex
+        with self.server.lock:
+            self.server.uploads[upload_id] = {
+                'bucket': self.bucket,
+                'key': self.key,
+                'headers': self._get_stored_headers(),
+                'parts': {}
+            }
+        self._send_xml(200, 'InitiateMultipartUploadResult', {
+            'Bucket': self.bucket, 'Key': self.key, 'UploadId': upload_id
+        })
+    
+    def _get_upload(self):
+        with self.server.lock:
+            return self.server.uploads.get(self.query['uploadId'])
+    
+    def _upload_part(self):
+        upload = self._get_upload()
+        if upload is None:
+            self._drain_body()
+            return self._send_error(404, 'NoSuchUpload')
+        
+        part_number = int(self.query['partNumber'])
+        part_key = '%s/%05d' % (self.query['uploadId'], part_number)
+        obj = self.server.store.put(UPLOADS_BUCKET, part_key, self._get_body())
+        if not self._check_content_md5(obj):
+            self.server.store.delete(UPLOADS_BUCKET, part_key)
+            return self._send_error(400, 'BadDigest')
+        
+        with self.server.lock:
+            upload['parts'][part_number] = (part_key, obj.etag)
+        self._send(200, headers={'ETag': obj.etag})
+    
+    def _check_content_md5(self, obj):
+        expected = self.headers.get('Content-MD5')
+        if not expected:
+            return True
+        return base64.b64decode(expected) == bytes(bytearray.fromhex(obj.etag.strip('"')))
+    
+    def _complete_multipart_upload(self):
+        upload = self._get_upload()
+        data = xmltodict.parse(self._get_body().read(), force_list=('Part',))
+        if upload is None:
+            return self._send_error(404, 'NoSuchUpload')
+        
+        requested = [(int(part['PartNumber']), part['ETag']) for part in data['CompleteMultipartUpload']['Part']]
+        parts = []
+        for part_number, etag in requested:
+            if upload['parts'].get(part_number, (None, None))[1] != etag:
+                return self._send_error(400, 'InvalidPart')
+            parts.append(upload['parts'][part_number][0])
+        
+        store = self.server.store
+        obj = store.put(upload['bucket'], upload['key'], _ConcatenatedReader(store.open(UPLOADS_BUCKET, part) for part in parts), upload['headers'])
+        
+        # Multipart ETags are the MD5 of the part MD5s followed by the part count.
+        digest = md5(b''.join(bytes(bytearray.fromhex(etag.strip('"'))) for _, etag in requested))
+        obj.etag = '"%s-%d"' % (digest.hexdigest(), len(requested))
+        
+        self._discard_upload()
+        self._send_xml(200, 'CompleteMultipartUploadResult', {
+            'Bucket': upload['bucket'], 'Key': upload['key'], 'ETag': obj.etag
+        })
+    
+    def _abort_multipart_upload(self):
+        if self._get_upload() is None:
+            return self._send_error(404, 'NoSuchUpload')
+        self._discard_upload()
+        self._send(204)
+    
+    def _discard_upload(self):
+        with self.server.lock:
+            upload = self.server.uploads.pop(self.query['uploadId'], None)
+        for part_key, _ in (upload or {}).get('parts', {}).values():
+            self.server.store.delete(UPLOADS_BUCKET, part_key)
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    
+    daemon_threads = True
+    allow_reuse_address = True
+    # Many clients connecting at once must not overflow the listen backlog,
+    # which would delay their connections by a second.
+    request_queue_size = 128
+
+
+class S3StandInServer(object):
+    
+    # An in-process, S3-compatible HTTP server for tests and benchmarks.
+    # Requests must be signed, with V2 or V4, by one of `credentials` (a dict
+    # of secrets by access key id); None accepts any request. `latency`
+    # (seconds, or a callable taking the HTTP method and path) is slept
+    # before every request is handled.
+    # `faults` may be a callable taking the same arguments and returning None
+    # or a (status, error code) pair to answer the request with instead.
+    
+    def __init__(self, store=None, latency=0, host='127.0.0.1', port=0, hostname=None, faults=None,
+                 credentials={ACCESS_KEY_ID: SECRET_ACCESS_KEY}):
+        self.store = store if store is not None else MemoryStore()
+        self.credentials = credentials
+        self.latency = latency
+        self.faults = faults
+        self.uploads = {}
+        self.lock = threading.Lock()
+        self.hostname = hostname
+        self._address = (host, port)
+        self._server = None
+        self._thread = None
+    
+    def wait(self, method, path):
+        latency = self.latency(method, path) if callable(self.latency) else self.latency
+        if latency:
+            time.sleep(latency)
+    
+    def fault(self, method, path):
+        return self.faults(method, path) if self.faults is not None else None
+    
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return 'http://%s:%d' % (self.hostname or host, port)
+    
+    def get_storage_options(self, bucket_name='stoba', **options):
+        result = {
+            'access_key_id': ACCESS_KEY_ID,
+            'secret_access_key': SECRET_ACCESS_KEY,
+            'bucket_name': bucket_name,
+            'service_url': self.url,
+            'addressing_style': 'virtual' if self.hostname else 'path'
+        }
+        result.update(options)
+        return result
+    
+    def start(self):
+        self._server = _ThreadingHTTPServer(self._address, S3RequestHandler)
+        self._server.store = self.store
+        self._server.uploads = self.uploads
+        self._server.lock = self.lock
+        self._server.hostname = self.hostname
+        self._server.wait = self.wait
+        self._server.fault = self.fault
+        self._server.credentials = self.credentials
+        
+        self._thread = threading.Thread(target=self._server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+    
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if hasattr(self.store, 'close'):
+            self.store.close()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, exc_type, exc_value, tb):
+        self.stop()
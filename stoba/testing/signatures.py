@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import
+
+from django.utils.six.moves.urllib.parse import urlsplit, parse_qsl, quote, unquote
+from hashlib import sha1, sha256
+import base64
+import calendar
+import hmac
+import re
+import time
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+# Signature checks of the stand-in server. They follow the AWS documentation
+# and deliberately share no code with stoba.cloud.auth, so that a mistake in
+# the client is not repeated here.
+
+SIGV4_ALGORITHM = 'AWS4-HMAC-SHA256'
+
+# Query parameters that take part in the canonicalized resource of V2.
+V2_SUB_RESOURCES = (
+    'acl', 'cors', 'delete', 'lifecycle', 'location', 'logging', 'notification',
+    'partNumber', 'policy', 'requestPayment', 'response-cache-control',
+    'response-content-disposition', 'response-content-encoding',
+    'response-content-language', 'response-content-type', 'response-expires',
+    'restore', 'tagging', 'torrent', 'uploadId', 'uploads', 'versionId',
+    'versioning', 'versions', 'website'
+)
+
+V4_AUTHORIZATION = re.compile(
+    r'^AWS4-HMAC-SHA256 Credential=([^/,\s]+)/(\d{8})/([^/]+)/([^/]+)/aws4_request,\s*'
+    r'SignedHeaders=([^,\s]+),\s*Signature=([0-9a-f]{64})$'
+)
+
+
+class SignatureError(Exception):
+    
+    def __init__(self, code, message):
+        super(SignatureError, self).__init__(message)
+        self.code = code
+        self.message = message
+
+
+def _get_all(headers, name):
+    # http.client.HTTPMessage on Python 3, mimetools.Message on Python 2.
+    values = headers.get_all(name) if hasattr(headers, 'get_all') else headers.getheaders(name)
+    return values or []
+
+
+def _get_header(headers, name):
+    values = _get_all(headers, name)
+    return values[0].strip() if values else ''
+
+
+def _get_secret(credentials, access_key_id):
+    if access_key_id not in credentials:
+        raise SignatureError('InvalidAccessKeyId', 'The AWS access key Id you provided does not exist in our records.')
+    return credentials[access_key_id]
+
+
+def _check_signature(expected, given, string_to_sign):
+    if not hmac.compare_digest(expected.encode('utf-8'), given.encode('utf-8')):
+        raise SignatureError(
+            'SignatureDoesNotMatch',
+            'The request signature we calculated does not match the signature you provided. StringToSign: %r' % string_to_sign
+        )
+
+
+def _check_expiry(expires):
+    if expires < time.time():
+        raise SignatureError('AccessDenied', 'Request has expired')
+
+
+# Signature Version 2
+
+def get_v2_string_to_sign(method, path, headers, bucket=None, expires=None):
+    url = urlsplit(path)
+    
+    amz_headers = {}
+    for name in set(name.lower() for name in headers.keys()):
+        if name.startswith('x-amz-'):
+            amz_headers[name] = ','.join(value.strip() for value in _get_all(headers, name))
+    
+    # x-amz-date takes the place of Date; a presigned URL has Expires instead.
+    if expires is not None:
+        date = expires
+    elif 'x-amz-date' in amz_headers:
+        date = ''
+    else:
+        date = _get_header(headers, 'Date')
+    
+    resource = '/%s%s' % (bucket, url.path) if bucket else url.path
+    sub_resources = sorted(
+        (key, value) for key, value in parse_qsl(url.query, keep_blank_values=True) if key in V2_SUB_RESOURCES
+    )
+    if sub_resources:
+        resource += '?' + '&'.join('%s=%s' % (key, value) if value else key for key, value in sub_resources)
+    
+    return ''.join([
+        '%s\n' % method,
+        '%s\n' % _get_header(headers, 'Content-MD5'),
+        '%s\n' % _get_header(headers, 'Content-Type'),
+        '%s\n' % date,
+        ''.join('%s:%s\n' % (name, amz_headers[name]) for name in sorted(amz_headers)),
+        resource
+    ])
+
+
+def _get_v2_signature(secret, string_to_sign):
+    digest = hmac.new(secret.encode('utf-8'), string_to_sign.encode('utf-8'), sha1).digest()
+    return base64.b64encode(digest).decode('ascii')
+
+
+def _verify_v2_header(method, path, headers, credentials, bucket, authorization):
+    access_key_id, _, signature = authorization[len('AWS '):].rpartition(':')
+    string_to_sign = get_v2_string_to_sign(method, path, headers, bucket)
+    _check_signature(_get_v2_signature(_get_secret(credentials, access_key_id), string_to_sign), signature, string_to_sign)
+
+
+def _verify_v2_query(method, path, headers, credentials, bucket, params):
+    secret = _get_secret(credentials, params.get('AWSAccessKeyId'))
+    string_to_sign = get_v2_string_to_sign(method, path, headers, bucket, expires=params.get('Expires', ''))
+    _check_signature(_get_v2_signature(secret, string_to_sign), params['Signature'], string_to_sign)
+    _check_expiry(int(params.get('Expires') or 0))
+
+
+# Signature Version 4
+
+def _v4_quote(value, safe=''):
+    return quote(value.encode('utf-8'), safe=str('-_.~' + safe))
+
+
+def get_v4_canonical_request(method, path, headers, signed_headers, payload_hash):
+    url = urlsplit(path)
+    query = sorted(
+        (_v4_quote(key), _v4_quote(value)) for key, value in parse_qsl(url.query, keep_blank_values=True)
+        if key != 'X-Amz-Signature'
+    )
+    canonical_headers = ''.join(
+        '%s:%s\n' % (name, ','.join(' '.join(value.split()) for value in _get_all(headers, name)))
+        for name in signed_headers
+    )
+    return '\n'.join((
+        method,
+        _v4_quote(unquote(url.path), safe='/') or '/',
+        '&'.join('%s=%s' % pair for pair in query),
+        canonical_headers,
+        ';'.join(signed_headers),
+        payload_hash
+    ))
+
+
+def _get_v4_signature(secret, date_stamp, region, service, string_to_sign):
+    key = ('AWS4%s' % secret).encode('utf-8')
+    for part in (date_stamp, region, service, 'aws4_request'):
+        key = hmac.new(key, part.encode('utf-8'), sha256).digest()
+    return hmac.new(key, string_to_sign.encode('utf-8'), sha256).hexdigest()
+
+
+def _verify_v4(method, path, headers, credentials, credential, signed_headers, signature, amz_date, payload_hash):
+    access_key_id, date_stamp, region, service = credential
+    secret = _get_secret(credentials, access_key_id)
+    if 'host' not in signed_headers:
+        raise SignatureError('AccessDenied', 'The host header must be signed')
+    if amz_date[:8] != date_stamp:
+        raise SignatureError('AuthorizationHeaderMalformed', 'The credential date does not match the request date')
+    
+    canonical_request = get_v4_canonical_request(method, path, headers, signed_headers, payload_hash)
+    string_to_sign = '\n'.join((
+        SIGV4_ALGORITHM, amz_date, '%s/%s/%s/aws4_request' % (date_stamp, region, service),
+        sha256(canonical_request.encode('utf-8')).hexdigest()
+    ))
+    _check_signature(_get_v4_signature(secret, date_stamp, region, service, string_to_sign), signature, string_to_sign)
+
+
+def _verify_v4_header(method, path, headers, credentials, authorization):
+    match = V4_AUTHORIZATION.match(authorization)
+    if match is None:
+        raise SignatureError('AuthorizationHeaderMalformed', 'The authorization header is malformed')
+    
+    payload_hash = _get_header(headers, 'X-Amz-Content-Sha256')
+    if not payload_hash:
+        raise SignatureError('InvalidRequest', 'Missing required header for this request: x-amz-content-sha256')
+    
+    _verify_v4(
+        method, path, headers, credentials, match.group(1, 2, 3, 4), match.group(5).split(';'),
+        match.group(6), _get_header(headers, 'X-Amz-Date'), payload_hash
+    )
+
+
+def _verify_v4_query(method, path, headers, credentials, params):
+    credential = params.get('X-Amz-Credential', '').split('/')
+    if params.get('X-Amz-Algorithm') != SIGV4_ALGORITHM or len(credential) != 5 or credential[4] != 'aws4_request':
+        raise SignatureError('AuthorizationQueryParametersError', 'The presigned URL is malformed')
+    
+    amz_date = params.get('X-Amz-Date', '')
+    _verify_v4(
+        method, path, headers, credentials, credential[:4], params.get('X-Amz-SignedHeaders', '').split(';'),
+        params['X-Amz-Signature'], amz_date, 'UNSIGNED-PAYLOAD'
+    )
+    signed_at = calendar.timegm(time.strptime(amz_date, '%Y%m%dT%H%M%SZ'))
+    _check_expiry(signed_at + int(params.get('X-Amz-Expires') or 0))
+
+
+def verify_request(method, path, headers, credentials, bucket=None):
+    # Raises SignatureError unless the request is signed, in its headers or
+    # its query, with one of credentials (a dict of secrets by access key).
+    # bucket is given for virtual-hosted-style requests, whose path lacks it.
+    params = dict(parse_qsl(urlsplit(path).query, keep_blank_values=True))
+    authorization = _get_header(headers, 'Authorization')
+    
+    if authorization.startswith('%s ' % SIGV4_ALGORITHM):
+        _verify_v4_header(method, path, headers, credentials, authorization)
+    elif authorization.startswith('AWS '):
+        _verify_v2_header(method, path, headers, credentials, bucket, authorization)
+    elif 'X-Amz-Signature' in params:
+        _verify_v4_query(method, path, headers, credentials, params)
+    elif 'Signature' in params:
+        _verify_v2_query(method, path, headers, credentials, bucket, params)
+    else:
+        raise SignatureError('AccessDenied', 'Access Denied')
\ No newline at end of file
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import
+
+from django.core.files.base import ContentFile
+from stoba.cloud.backend.s3_async import AsyncS3
+from stoba.cloud.backend.exceptions import S3ResponseError
+from .base import StandInTestCase
+import asyncio
+import errno
+import io
+import os
+import threading
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+RETRIES = 2
+
+
+class AsyncS3Test(StandInTestCase):
+    
+    # Requests fail as `self.faults` says: a dict of (status, error code)
+    # answers by method, each given `self.fault_count` times (None: always).
+    
+    def setUp(self):
+        self.requests = []
+        self.faults = {}
+        self.fault_count = None
+        self.server_options = {'faults': self.get_fault}
+        super(AsyncS3Test, self).setUp()
+        self.storage = self.get_storage()
+    
+    def get_fault(self, method, path):
+        self.requests.append(method)
+        if method not in self.faults:
+            return None
+        if self.fault_count is not None:
+            if self.requests.count(method) > self.fault_count:
+                return None
+        return self.faults[method]
+    
+    def get_storage(self, **options):
+        options.setdefault('request_retries', RETRIES)
+        options.setdefault('request_backoff', 0.01)
+        return AsyncS3(self.server.get_storage_options(**options))
+    
+    def run_async(self, func, *args):
+        async def main():
+            try:
+                return await func(*args)
+            finally:
+                await self.storage.aclose()
+        return asyncio.run(main())
+    
+    def test_save_and_open(self):
+        async def save_and_read():
+            name = await self.storage.asave('a/a.txt', ContentFile(b'content'))
+            async with await self.storage.aopen(name) as f:
+                return await f.read()
+        self.assertEqual(self.run_async(save_and_read), b'content')
+    
+    def test_available_name(self):
+        async def save_twice(name, max_length=None):
+            await self.storage.asave(name, ContentFile(b'a'))
+            return await self.storage.asave(name, ContentFile(b'b'), max_length)
+        
+        name = self.run_async(save_twice, 'a/a.txt')
+        self.assertTrue(name.startswith('a/a_') and name.endswith('.txt'))
+        name = self.run_async(save_twice, 'a/abcdefgh.txt', 16)
+        self.assertEqual(len(name), 16)
+        self.assertTrue(name.startswith('a/ab_') and name.endswith('.txt'))
+    
+    def test_multipart_upload_of_partly_read_file(self):
+        self.storage = self.get_storage(multipart_threshold=5 * 1024 * 1024, multipart_chunk_size=5 * 1024 * 1024)
+        data = os.urandom(6 * 1024 * 1024)
+        content = ContentFile(data)
+        content.read(100)
+        self.run_async(self.storage._asave, 'a/big.bin', content)
+        with self.server.store.open('stoba', 'a/big.bin') as f:
+            self.assertEqual(f.read(), data)
+    
+    def test_save_retries_throttled_put(self):
+        self.faults, self.fault_count = {'PUT': (503, 'SlowDown')}, 1
+        self.run_async(self.storage._asave, 'a/a.txt', ContentFile(b'content'))
+        self.assertEqual(self.requests.count('PUT'), 2)
+        with self.server.store.open('stoba', 'a/a.txt') as f:
+            self.assertEqual(f.read(), b'content')
+    
+    def test_save_gives_up(self):
+        self.faults = {'PUT': (503, 'SlowDown')}
+        with self.assertRaises(S3ResponseError):
+            self.run_async(self.storage._asave, 'a/a.txt', ContentFile(b'content'))
+        self.assertEqual(self.requests.count('PUT'), RETRIES + 1)
+    
+    def test_multipart_upload_gives_up(self):
+        self.storage = self.get_storage(multipart_threshold=5 * 1024 * 1024, multipart_concurrency=1)
+        self.faults = {'PUT': (503, 'SlowDown')}
+        with self.assertRaises(S3ResponseError):
+            self.run_async(self.storage._asave, 'a/big.bin', ContentFile(b'x' * (6 * 1024 * 1024)))
+        self.assertEqual(self.requests.count('PUT'), RETRIES + 1)
+    
+    def test_exists_raises_on_server_error(self):
+        # A 503 must not be taken for "exists".
+        self.faults = {'HEAD': (503, 'ServiceUnavailable')}
+        with self.assertRaises(S3ResponseError):
+            self.run_async(self.storage.aexists, 'a/a.txt')
+        self.assertEqual(self.requests.count('HEAD'), RETRIES + 1)
+    
+    def test_exists(self):
+        self.faults, self.fault_count = {'HEAD': (500, 'InternalError')}, 1
+        self.assertFalse(self.run_async(self.storage.aexists, 'a/a.txt'))
+    
+    def test_size_of_missing_file(self):
+        with self.assertRaises(IOError) as context:
+            self.run_async(self.storage.asize, 'a/missing.txt')
+        self.assertEqual(context.exception.errno, errno.ENOENT)
+    
+    def test_delete_raises_on_failure(self):
+        self.faults = {'DELETE': (403, 'AccessDenied')}
+        with self.assertRaises(S3ResponseError):
+            self.run_async(self.storage.adelete, 'a/a.txt')
+        self.assertEqual(self.requests.count('DELETE'), 1)
+    
+    def test_write_behind(self):
+        # The uploads fail, so that the file stays in the spool.
+        self.faults = {'PUT': (503, 'SlowDown')}
+        self.storage = self.get_storage(write_behind_dir=self.mkdtemp(), write_behind_retries=0)
+        self.addCleanup(self.storage.flush)
+        
+        async def check():
+            await self.storage.asave('w/a.txt', ContentFile(b'spooled'))
+            self.assertTrue(await self.storage.aexists('w/a.txt'))
+            self.assertEqual(await self.storage.asize('w/a.txt'), 7)
+            async with await self.storage.aopen('w/a.txt') as f:
+                self.assertEqual(await f.read(), b'spooled')
+                f.seek(1)
+                self.assertEqual(await f.read(3), b'poo')
+            await self.storage.adelete('w/a.txt')
+            return await self.storage.aexists('w/a.txt')
+        
+        self.assertFalse(self.run_async(check))
+        self.assertTrue(self.storage.flush().ok)
+        self.assertIsNone(self.server.store.get('stoba', 'w/a.txt'))
+    
+    def test_reads_off_the_event_loop(self):
+        storage = self.storage = self.get_storage(multipart_threshold=5 * 1024 * 1024)
+        readers = set()
+        
+        class RecordingFile(io.BytesIO):
+            def read(self, *args):
+                readers.add(threading.get_ident())
+                return super(RecordingFile, self).read(*args)
+        
+        async def save():
+            for name, size in (('a/small.bin', 1024), ('a/big.bin', 6 * 1024 * 1024)):
+                await storage._asave(name, RecordingFile(b'x' * size))
+            return threading.get_ident()
+        
+        loop_thread = self.run_async(save)
+        self.assertTrue(readers)
+        self.assertNotIn(loop_thread, readers)
+        self.assertEqual(self.requests.count('POST'), 2)
+    
+    def test_listing_fills_metadata_cache(self):
+        names = ['a/%d.txt' % i for i in range(3)]
+        for name in names:
+            self.server.store.put('stoba', name, ContentFile(b'x' * 3))
+        
+        async def list_and_size():
+            folders, files = await self.storage.alistdir('a')
+            return files, [await self.storage.asize(name) for name in files]
+        
+        self.assertEqual(self.run_async(list_and_size), (names, [3, 3, 3]))
+        self.assertNotIn('HEAD', self.requests)
\ No newline at end of file
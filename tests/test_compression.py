@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.exceptions import ImproperlyConfigured
+from stoba.cloud.backend.s3_async import AsyncS3
+from .base import StandInTestCase
+import asyncio
+import binascii
+import gzip
+import io
+import os
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+CSS = b'body { color: red; margin: 0 auto; }\n' * 2000
+
+
+def gunzip(data):
+    return gzip.GzipFile(fileobj=io.BytesIO(data)).read()
+
+
+class CompressionTest(StandInTestCase):
+    
+    storage_options = {}
+    
+    def get_storage(self, **options):
+        options = dict(self.storage_options, **options)
+        options.setdefault('compression', 'gzip')
+        return super(CompressionTest, self).get_storage(**options)
+    
+    def get_stored(self, name):
+        obj = self.server.store.get('stoba', name)
+        with self.server.store.open('stoba', name) as f:
+            return obj, f.read()
+    
+    def test_compresses_listed_types(self):
+        storage = self.get_storage()
+        storage.save('site.css', ContentFile(CSS))
+        
+        obj, data = self.get_stored('site.css')
+        self.assertEqual(gunzip(data), CSS)
+        self.assertEqual(obj.headers['content-type'], 'text/css')
+        self.assertEqual(obj.headers['content-encoding'], 'gzip')
+        self.assertEqual(obj.headers['x-amz-meta-uncompressed-size'], str(len(CSS)))
+        
+        with self.get_storage().open('site.css') as f:
+            self.assertEqual(f.read(), CSS)
+    
+    def test_skips_other_content(self):
+        storage = self.get_storage()
+        storage.save('image.png', ContentFile(CSS))
+        storage.save('random.txt', ContentFile(os.urandom(len(CSS))))
+        storage.save('tiny.js', ContentFile(b'var a = 1;'))
+        
+        for name in ('image.png', 'random.txt', 'tiny.js'):
+            obj, data = self.get_stored(name)
+            self.assertNotIn('content-encoding', obj.headers)
+        self.assertEqual(self.get_stored('image.png')[0].headers['content-type'], 'image/png')
+    
+    def test_open_sends_no_request(self):
+        storage = self.get_storage()
+        storage.save('site.css', ContentFile(CSS))
+        storage.metadata_cache.delete('site.css')
+        requests = []
+        self.server.faults = lambda method, path: requests.append(method)
+        
+        f = storage.open('site.css')
+        self.assertEqual(requests, [])
+        with f:
+            self.assertEqual(f.read(10), CSS[:10])
+            self.assertEqual(f.size, len(CSS))
+            self.assertEqual(f.read(), CSS[10:])
+    
+    def test_aopen(self):
+        self.get_storage().save('site.css', ContentFile(CSS))
+        storage = AsyncS3(self.server.get_storage_options(**dict(self.storage_options, compression='gzip')))
+        
+        async def read():
+            try:
+                async with await storage.aopen('site.css') as f:
+                    head = await f.read(10)
+                    f.seek(len(CSS) - 10)
+                    tail = await f.read()
+                    f.seek(5)
+                    middle = await f.read(10)
+                    chunks = [chunk async for chunk in f]
+                    return f.size, head, tail, middle, b''.join(chunks)
+            finally:
+                await storage.aclose()
+        
+        self.assertEqual(asyncio.run(read()), (len(CSS), CSS[:10], CSS[-10:], CSS[5:15], CSS))
+    
+    def test_size(self):
+        self.get_storage().save('site.css', ContentFile(CSS))
+        stored = len(self.get_stored('site.css')[1])
+        self.assertEqual(self.get_storage().size('site.css'), stored)
+        self.assertEqual(self.get_storage(report_size_as='original').size('site.css'), len(CSS))
+        
+        # Statuses from a listing lack the original size.
+        storage = self.get_storage(report_size_as='original')
+        storage.listdir('')
+        self.assertEqual(storage.size('site.css'), len(CSS))
+    
+    def test_content_type(self):
+        storage = self.get_storage(set_content_type_as={'.dat': 'text/csv'})
+        storage.save('report.dat', ContentFile(CSS))
+        storage.save('upload', SimpleUploadedFile('upload', CSS, content_type='application/json'))
+        self.assertEqual(self.get_stored('report.dat')[0].headers['content-type'], 'text/csv')
+        self.assertEqual(self.get_stored('upload')[0].headers['content-type'], 'application/json')
+        
+        storage = self.get_storage(set_content_type_as=lambda name: 'text/plain')
+        storage.save('other.dat', ContentFile(CSS))
+        self.assertEqual(self.get_stored('other.dat')[0].headers['content-encoding'], 'gzip')
+    
+    def test_multipart_upload(self):
+        # Hex digits compress to about half their size, still above the threshold.
+        data = binascii.hexlify(os.urandom(6 * 1024 * 1024))
+        storage = self.get_storage(multipart_threshold=5 * 1024 * 1024, multipart_chunk_size=5 * 1024 * 1024)
+        storage.save('big.json', ContentFile(data))
+        obj, stored = self.get_stored('big.json')
+        self.assertTrue(obj.etag.endswith('-2"'))
+        self.assertEqual(gunzip(stored), data)
+    
+    def test_copy(self):
+        storage = self.get_storage()
+        storage.save('site.css', ContentFile(CSS))
+        storage.copy('site.css', 'copy.css')
+        with self.get_storage().open('copy.css') as f:
+            self.assertEqual(f.read(), CSS)
+    
+    def test_multipart_copy(self):
+        storage = self.get_storage(multipart_copy_threshold=1)
+        storage.save('site.css', ContentFile(CSS))
+        storage.copy('site.css', 'copy.css')
+        self.assertEqual(self.get_stored('copy.css')[0].headers['content-encoding'], 'gzip')
+        with self.get_storage().open('copy.css') as f:
+            self.assertEqual(f.read(), CSS)
+    
+    def test_incremental_sync(self):
+        local_path = self.mkdtemp()
+        manifest_path = os.path.join(self.mkdtemp(), 'manifest.json')
+        with open(os.path.join(local_path, 'site.css'), 'wb') as f:
+            f.write(CSS)
+        
+        result = self.get_storage().sync_directory(local_path, 'static', incremental=True, manifest_path=manifest_path)
+        self.assertEqual(result.succeeded, ['static/site.css'])
+        self.assertEqual(self.get_stored('static/site.css')[0].headers['content-encoding'], 'gzip')
+        
+        # The manifest holds the ETag of the compressed object.
+        result = self.get_storage().sync_directory(local_path, 'static', incremental=True, manifest_path=manifest_path)
+        self.assertEqual(result.skipped, ['static/site.css'])
+        self.assertEqual(result.succeeded, [])
+    
+    def test_invalid_settings(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.get_storage(compression='zip')
+        with self.assertRaises(ImproperlyConfigured):
+            self.get_storage(report_size_as='both')
+
+
+class CompressionV4Test(CompressionTest):
+    
+    storage_options = {'signature_version': 's3v4'}
\ No newline at end of file
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import
+
+from stoba.core.diskcache import DiskCache
+from unittest import mock
+import io
+import os
+import tempfile
+import shutil
+import unittest
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+
+class DiskCacheTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='stoba-test-')
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.cache = DiskCache(self.directory, max_size=300)
+    
+    def put(self, key, etag, size):
+        return self.cache.put(key, etag, io.BytesIO(b'x' * size))
+    
+    def get_stored_size(self):
+        objects_path = os.path.join(self.directory, 'objects')
+        return sum(os.path.getsize(os.path.join(objects_path, name)) for name in os.listdir(objects_path))
+    
+    def test_total(self):
+        self.put('a', '1', 100)
+        self.put('b', '1', 50)
+        self.put('a', '2', 30)
+        self.put('b', '1', 50)
+        self.assertEqual(self.cache._read_size(), 80)
+        self.cache.delete('a')
+        self.assertEqual(self.cache._read_size(), 50)
+        self.assertEqual(self.get_stored_size(), 50)
+    
+    def test_scans_only_when_full(self):
+        self.put('a', '1', 100)
+        with mock.patch('stoba.core.diskcache.os.listdir', wraps=os.listdir) as listdir:
+            self.put('b', '1', 100)
+            self.put('c', '1', 100)
+            self.assertEqual(listdir.call_count, 0)
+            self.put('d', '1', 100)
+            self.assertEqual(listdir.call_count, 1)
+        
+        self.assertEqual(self.cache._read_size(), 300)
+        self.assertEqual(self.get_stored_size(), 300)
+    
+    def test_evicts_least_recently_used(self):
+        for mtime, key in enumerate(('a', 'b', 'c')):
+            self.put(key, '1', 100)
+            os.utime(self.cache.get(key)[1], (mtime, mtime))
+        self.cache.get('a')
+        self.put('d', '1', 100)
+        
+        self.assertIsNotNone(self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertIsNotNone(self.cache.get('d'))
+    
+    def test_rebuilds_missing_total(self):
+        self.put('a', '1', 100)
+        os.remove(os.path.join(self.directory, 'size'))
+        # Another process, or a cache written before the total was kept.
+        cache = DiskCache(self.directory, max_size=300)
+        cache.put('b', '1', io.BytesIO(b'x' * 100))
+        self.assertEqual(cache._read_size(), 200)
\ No newline at end of file
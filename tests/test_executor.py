@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import
+
+from django.core.files.base import ContentFile
+from stoba.cloud.backend.exceptions import S3ResponseError
+from .base import StandInTestCase
+import threading
+import time
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+RETRIES = 2
+LATENCY = 0.05
+
+
+class RetryTest(StandInTestCase):
+    
+    # Every PUT is throttled. The executor is the only layer that retries, so
+    # no operation may send more than RETRIES + 1 of the same PUT.
+    
+    def setUp(self):
+        self.puts = []
+        self.failing = True
+        self.server_options = {'faults': self.get_fault}
+        super(RetryTest, self).setUp()
+    
+    def get_fault(self, method, path):
+        if method != 'PUT' or not self.failing:
+            return None
+        self.puts.append(path)
+        return 503, 'SlowDown'
+    
+    def wait_for(self, condition, timeout=5):
+        deadline = time.time() + timeout
+        while not condition():
+            self.assertLess(time.time(), deadline)
+            time.sleep(0.01)
+    
+    def get_storage(self, **options):
+        options.setdefault('request_retries', RETRIES)
+        options.setdefault('request_backoff', 0.01)
+        return super(RetryTest, self).get_storage(**options)
+    
+    def test_save(self):
+        with self.assertRaises(S3ResponseError):
+            self.get_storage()._save('r/a.txt', ContentFile(b'a'))
+        self.assertEqual(len(self.puts), RETRIES + 1)
+    
+    def test_save_many(self):
+        result = self.get_storage().save_many([('r/a.txt', ContentFile(b'a'))])
+        self.assertEqual(list(result.failed), ['r/a.txt'])
+        self.assertEqual(len(self.puts), RETRIES + 1)
+    
+    def test_multipart_upload(self):
+        storage = self.get_storage(multipart_threshold=5 * 1024 * 1024, multipart_concurrency=1)
+        with self.assertRaises(S3ResponseError):
+            storage._save('r/big.bin', ContentFile(b'x' * (6 * 1024 * 1024)))
+        self.assertEqual(len(self.puts), RETRIES + 1)
+    
+    def test_write_behind(self):
+        storage = self.get_storage(write_behind_dir=self.mkdtemp(), write_behind_retries=2, write_behind_backoff=0.01)
+        self.addCleanup(storage.spool.close)
+        storage._save('r/a.txt', ContentFile(b'a'))
+        # Failed uploads are tried again in the background until the retries
+        # are used up, and then once more by the next flush.
+        self.wait_for(lambda: storage.spool._failed)
+        self.assertEqual(len(self.puts), 3 * (RETRIES + 1))
+        self.assertFalse(storage.flush().ok)
+        self.assertEqual(len(self.puts), 4 * (RETRIES + 1))
+    
+    def test_write_behind_outage(self):
+        storage = self.get_storage(write_behind_dir=self.mkdtemp(), write_behind_backoff=0.05)
+        self.addCleanup(storage.spool.close)
+        storage._save('r/a.txt', ContentFile(b'a'))
+        self.wait_for(lambda: len(self.puts) >= RETRIES + 1)
+        self.failing = False
+        # Uploaded without a flush once S3 is back.
+        self.wait_for(lambda: self.server.store.get('stoba', 'r/a.txt') is not None)
+        self.assertTrue(storage.flush().ok)
+
+
+class HedgeTest(StandInTestCase):
+    
+    server_options = {'latency': LATENCY}
+    
+    def get_duration(self, storage, threads=40, requests=2):
+        storage._save('h/a.txt', ContentFile(b'a'))
+        # Enough samples for the latency percentile the hedge waits for.
+        for _ in range(20):
+            storage._get_object_range('h/a.txt', 0, 0)
+        
+        def read():
+            for _ in range(requests):
+                storage._get_object_range('h/a.txt', 0, 0)
+        
+        workers = [threading.Thread(target=read) for _ in range(threads)]
+        started = time.time()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return time.time() - started
+    
+    def test_requests_do_not_queue_for_hedging(self):
+        # More callers than pool threads: the requests that cannot be hedged
+        # must be sent right away rather than wait for a thread.
+        plain = self.get_duration(self.get_storage(single_flight=False, pool_size=10))
+        hedged = self.get_duration(self.get_storage(single_flight=False, pool_size=10, hedge_requests=True))
+        self.assertLess(hedged, plain + 4 * LATENCY)
\ No newline at end of file
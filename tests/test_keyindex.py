@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import
+
+from django.core.files.base import ContentFile
+from stoba.core.keyindex import KeyIndex
+from .base import StandInTestCase
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+
+class KeyIndexTest(unittest.TestCase):
+    
+    def setUp(self):
+        directory = tempfile.mkdtemp(prefix='stoba-test-')
+        self.addCleanup(shutil.rmtree, directory, True)
+        self.index = KeyIndex(os.path.join(directory, 'index'), 'bucket')
+        self.addCleanup(self.index.close)
+    
+    def test_iter_dir(self):
+        for key in ('a', 'd/b', 'd/c', 'e/f/g', 'e0'):
+            self.index.put(key, 1, None, None)
+        self.assertEqual(list(self.index.iter_dir('')), ['a', 'd/', 'e/', 'e0'])
+        self.assertEqual(list(self.index.iter_dir('d/')), ['d/b', 'd/c'])
+        self.assertEqual(list(self.index.iter_dir('e/')), ['e/f/'])
+        self.assertEqual(list(self.index.iter_keys('e')), ['e/f/g', 'e0'])
+    
+    def test_tombstone(self):
+        listed = time.time()
+        self.index.put('a', 1, None, '"1"')
+        self.index.delete('a')
+        self.assertIsNone(self.index.get('a'))
+        self.assertEqual(list(self.index.iter_keys()), [])
+        # A listing that started before the delete does not bring it back.
+        self.index.put_listed([('a', 1, None, '"1"')], listed)
+        self.assertIsNone(self.index.get('a'))
+        self.index.put_listed([('a', 2, None, '"2"')], time.time())
+        self.assertEqual(self.index.get('a'), (2, None, '"2"'))
+    
+    def test_reconcile(self):
+        self.index.put('gone', 1, None, None)
+        self.index.put('deleted', 1, None, None)
+        self.index.delete('deleted')
+        started = time.time()
+        time.sleep(0.01)
+        self.index.put('saved', 1, None, None)
+        
+        self.assertIsNone(self.index.get_reconciled_time())
+        self.index.reconcile([('listed', 1, None, None)], started)
+        self.assertEqual(self.index.get_reconciled_time(), started)
+        self.assertEqual(list(self.index.iter_keys()), ['listed', 'saved'])
+    
+    def test_claim(self):
+        self.assertTrue(self.index.claim_reconciliation(60))
+        self.assertFalse(self.index.claim_reconciliation(60))
+        self.index.reconcile([], time.time())
+        self.assertTrue(self.index.claim_reconciliation(60))
+
+
+class IndexedStorageTest(StandInTestCase):
+    
+    def setUp(self):
+        self.requests = []
+        self.server_options = {'faults': self.record}
+        super(IndexedStorageTest, self).setUp()
+        self.storage = self.get_storage(key_index_path=os.path.join(self.mkdtemp(), 'index'))
+    
+    def record(self, method, path):
+        self.requests.append(method)
+    
+    def test_answers_after_reconcile(self):
+        other = self.get_storage()
+        for name in ('d/a.txt', 'd/b.txt', 'd/e/c.txt'):
+            other.save(name, ContentFile(b'x'))
+        self.storage.reconcile_index()
+        
+        del self.requests[:]
+        self.assertEqual(self.storage.listdir('d'), (['d/e/'], ['d/a.txt', 'd/b.txt']))
+        self.assertFalse(self.storage.exists('d/missing.txt'))
+        self.assertEqual(self.storage.size('d/e/c.txt'), 1)
+        self.assertEqual(self.requests, [])
+    
+    def test_changes_are_indexed(self):
+        self.storage.reconcile_index()
+        self.storage.save('d/a.txt', ContentFile(b'a'))
+        self.storage.save('d/b.txt', ContentFile(b'b'))
+        self.storage.delete('d/a.txt')
+        
+        del self.requests[:]
+        self.assertEqual(self.storage.listdir('d'), ([], ['d/b.txt']))
+        self.assertFalse(self.storage.exists('d/a.txt'))
+        self.assertEqual(self.requests, [])
\ No newline at end of file
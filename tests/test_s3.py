@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import
+
+from django.core.files.base import ContentFile
+from django.core.exceptions import ImproperlyConfigured
+from stoba.cloud import S3
+from stoba.core.instrumentation import track_storage
+from .base import StandInTestCase
+import errno
+import os
+import unittest
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+MB = 1024 * 1024
+
+
+class S3Test(StandInTestCase):
+    
+    # Run with Signature Version 2; the subclass repeats every test with V4.
+    
+    storage_options = {}
+    
+    def setUp(self):
+        super(S3Test, self).setUp()
+        self.storage = self.get_storage(**self.storage_options)
+    
+    def test_save_and_open(self):
+        name = self.storage.save('dir/a b+c.txt', ContentFile(b'content'))
+        self.assertEqual(name, 'dir/a b+c.txt')
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(), b'content')
+        self.assertEqual(self.storage.size(name), 7)
+        self.assertTrue(self.storage.exists(name))
+        self.assertFalse(self.storage.exists('dir/missing.txt'))
+    
+    def test_save_empty_file(self):
+        self.storage.save('empty.txt', ContentFile(b''))
+        self.assertEqual(self.storage.size('empty.txt'), 0)
+    
+    def test_size_of_missing_file(self):
+        self.storage.save('d/a.txt', ContentFile(b'a'))
+        index_path = os.path.join(self.mkdtemp(), 'index')
+        indexed = self.get_storage(key_index_path=index_path, **self.storage_options)
+        indexed.reconcile_index()
+        listed = self.get_storage(**self.storage_options)
+        listed.stat_many(['d/a.txt', 'd/missing.txt'])
+        
+        # Answered by a listing, the key index and a HEAD. Storages of one
+        # server share the metadata cache, so the HEAD comes last.
+        for storage in (listed, indexed, self.get_storage(**self.storage_options)):
+            with self.assertRaises(IOError) as context:
+                storage.size('d/missing.txt')
+            self.assertEqual(context.exception.errno, errno.ENOENT)
+    
+    def test_available_name(self):
+        self.storage.save('a.txt', ContentFile(b'a'))
+        name = self.storage.save('a.txt', ContentFile(b'b'))
+        self.assertNotEqual(name, 'a.txt')
+        self.assertTrue(name.startswith('a_') and name.endswith('.txt'))
+    
+    def test_available_name_max_length(self):
+        self.storage.save('d/abcdefgh.txt', ContentFile(b'a'))
+        name = self.storage.get_available_name('d/abcdefgh.txt', max_length=16)
+        self.assertEqual(len(name), 16)
+        self.assertTrue(name.startswith('d/ab_') and name.endswith('.txt'))
+    
+    def test_multipart_upload(self):
+        storage = self.get_storage(multipart_threshold=5 * MB, multipart_chunk_size=5 * MB, **self.storage_options)
+        data = os.urandom(11 * MB)
+        storage.save('big.bin', ContentFile(data))
+        self.assertTrue(storage.metadata_cache.get('big.bin')['etag'].endswith('-3"'))
+        with storage.open('big.bin') as f:
+            self.assertEqual(f.read(), data)
+    
+    def test_multipart_upload_of_partly_read_file(self):
+        storage = self.get_storage(multipart_threshold=5 * MB, multipart_chunk_size=5 * MB, **self.storage_options)
+        data = os.urandom(6 * MB)
+        content = ContentFile(data)
+        content.read(100)
+        storage.save('big.bin', content)
+        self.assertEqual(storage.size('big.bin'), len(data))
+        with storage.open('big.bin') as f:
+            self.assertEqual(f.read(), data)
+    
+    def test_listdir(self):
+        for name in ('d/a.txt', 'd/b.txt', 'd/sub/c.txt', 'other.txt'):
+            self.storage.save(name, ContentFile(b'x'))
+        self.assertEqual(self.storage.listdir('d'), (['d/sub/'], ['d/a.txt', 'd/b.txt']))
+    
+    def test_listing_past_one_page(self):
+        # More than the 1000 keys of a page, with folders across the page
+        # boundary: a listing with a delimiter goes on from the NextMarker, a
+        # recursive one from the last key. The first page ends with a file,
+        # which comes before the folders in the response.
+        keys = ['p/-'] + ['p/%04d%s' % (i, suffix) for i in range(700) for suffix in ('', '/x')]
+        for key in keys:
+            self.server.store.put('stoba', key, ContentFile(b'x'))
+        
+        folders, files = self.storage.listdir('p')
+        self.assertEqual(files, ['p/-'] + ['p/%04d' % i for i in range(700)])
+        self.assertEqual(folders, ['p/%04d/' % i for i in range(700)])
+        self.assertEqual(sorted(self.storage._get_remote_etags('p')), keys)
+        self.assertEqual(len(self.storage.delete_prefix('p').succeeded), len(keys))
+        self.assertEqual(self.server.store.keys('stoba'), [])
+    
+    def test_delete(self):
+        self.storage.save('a.txt', ContentFile(b'a'))
+        self.storage.delete('a.txt')
+        self.assertFalse(self.storage.exists('a.txt'))
+    
+    def test_delete_many(self):
+        names = ['d/%d.txt' % i for i in range(5)]
+        for name in names:
+            self.storage.save(name, ContentFile(b'x'))
+        result = self.storage.delete_many(names + ['d/missing.txt'])
+        self.assertFalse(result.failed)
+        self.assertEqual(self.storage.listdir('d'), ([], []))
+    
+    def test_save_many(self):
+        self.storage.save('m/a.txt', ContentFile(b'existing'))
+        # Files of the batch with the same name must not overwrite each other
+        # or an existing file.
+        payloads = [(name, ('%s %d' % (name, i)).encode('utf-8')) for name in ('m/a.txt', 'm/b.txt') for i in range(4)]
+        result = self.storage.save_many([(name, ContentFile(data)) for name, data in payloads], concurrency=8)
+        self.assertFalse(result.failed)
+        names = result.succeeded
+        self.assertEqual(len(set(names)), 8)
+        self.assertNotIn('m/a.txt', names)
+        self.assertIn('m/b.txt', names)
+        contents = set()
+        for name in names:
+            with self.storage.open(name) as f:
+                contents.add(f.read())
+        self.assertEqual(contents, set(data for name, data in payloads))
+        with self.storage.open('m/a.txt') as f:
+            self.assertEqual(f.read(), b'existing')
+    
+    def test_save_many_overwrite(self):
+        self.storage.save('m/a.txt', ContentFile(b'old'))
+        result = self.storage.save_many([('m/a.txt', ContentFile(b'new'))], overwrite=True)
+        self.assertEqual(result.succeeded, ['m/a.txt'])
+        with self.storage.open('m/a.txt') as f:
+            self.assertEqual(f.read(), b'new')
+    
+    def test_delete_prefix_removes_folder_marker(self):
+        self.storage.save('d/a.txt', ContentFile(b'x'))
+        self.storage._request('PUT', '%s/d/' % self.storage.service_url, data=b'')
+        result = self.storage.delete_prefix('d')
+        self.assertFalse(result.failed)
+        self.assertIn('d/', result.succeeded)
+        self.assertIsNone(self.server.store.get('stoba', 'd/'))
+        self.assertIsNone(self.server.store.get('stoba', 'd/a.txt'))
+    
+    def test_copy_and_move(self):
+        self.storage.save('src.txt', ContentFile(b'content'))
+        self.storage.copy('src.txt', 'copy.txt')
+        self.storage.move('src.txt', 'moved.txt')
+        self.assertFalse(self.storage.exists('src.txt'))
+        for name in ('copy.txt', 'moved.txt'):
+            with self.storage.open(name) as f:
+                self.assertEqual(f.read(), b'content')
+    
+    def test_multipart_copy(self):
+        storage = self.get_storage(multipart_copy_threshold=5 * MB, multipart_copy_part_size=5 * MB, **self.storage_options)
+        data = os.urandom(6 * MB)
+        # User metadata and the content type have to be set on the copy by
+        # the client, and signed.
+        storage._request('PUT', storage._get_object_url('src.bin'), data=data, headers={
+            'Content-Type': 'application/x-test',
+            'x-amz-meta-owner': 'someone'
+        })
+        storage.copy('src.bin', 'dst.bin')
+        with storage.open('dst.bin') as f:
+            self.assertEqual(f.read(), data)
+        headers = self.server.store.get('stoba', 'dst.bin').headers
+        self.assertEqual(headers['content-type'], 'application/x-test')
+        self.assertEqual(headers['x-amz-meta-owner'], 'someone')
+    
+    def test_metadata_cache(self):
+        self.storage.save('a.txt', ContentFile(b'a'))
+        with track_storage() as stats:
+            self.storage.exists('a.txt')
+            self.storage.size('a.txt')
+        self.assertEqual(stats.requests, 0)
+
+
+class S3V4Test(S3Test):
+    
+    storage_options = {'signature_version': 's3v4'}
+
+
+class S3V4UnsignedPayloadTest(S3Test):
+    
+    storage_options = {'signature_version': 's3v4', 'sign_streaming_payloads': False}
+
+
+class RegionTest(unittest.TestCase):
+    
+    def get_storage(self, **options):
+        options.update(access_key_id='key', secret_access_key='secret', bucket_name='stoba')
+        return S3(options)
+    
+    def test_endpoints(self):
+        self.assertEqual(self.get_storage().service_url, 'https://stoba.s3.amazonaws.com')
+        self.assertEqual(self.get_storage(region='eu-west-1').service_url, 'https://stoba.s3-eu-west-1.amazonaws.com')
+        storage = self.get_storage(region='eu-west-3', signature_version='s3v4')
+        self.assertEqual(storage.service_url, 'https://stoba.s3.eu-west-3.amazonaws.com')
+        storage = self.get_storage(region='us-east-2', signature_version='s3v4', addressing_style='path')
+        self.assertEqual(storage.service_url, 'https://s3.us-east-2.amazonaws.com/stoba')
+    
+    def test_unmapped_region(self):
+        # Regions newer than REGION_ENDPOINT_MAP only accept Signature Version 4.
+        storage = self.get_storage(region='xx-east-9', signature_version='s3v4')
+        self.assertEqual(storage.service_url, 'https://stoba.s3.xx-east-9.amazonaws.com')
+        with self.assertRaises(ImproperlyConfigured):
+            self.get_storage(region='xx-east-9')
+    
+    def test_sigv4_only_region(self):
+        with self.assertRaises(ImproperlyConfigured):
+            self.get_storage(region='eu-central-1')
+        # Unless the endpoint is given explicitly.
+        self.get_storage(region='eu-central-1', service_url='http://127.0.0.1:9000')
\ No newline at end of file
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import
+
+from stoba.core.base import Cachable
+from stoba.core.singleflight import SingleFlight
+from .base import StandInTestCase
+import threading
+import time
+import unittest
+import uuid
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+CALLERS = 8
+
+
+class SingleFlightTest(unittest.TestCase):
+    
+    def setUp(self):
+        self.calls = []
+        self.release = threading.Event()
+    
+    def work(self, value):
+        self.calls.append(value)
+        # Long enough for the other callers to join.
+        self.release.wait(1)
+        if isinstance(value, Exception):
+            raise value
+        return value
+    
+    def call_concurrently(self, single_flight, key, value):
+        results = []
+        
+        def call():
+            try:
+                results.append(single_flight.do(key, lambda: self.work(value)))
+            except Exception as e:
+                results.append(e)
+        
+        threads = [threading.Thread(target=call) for i in range(CALLERS)]
+        for thread in threads:
+            thread.start()
+        time.sleep(0.2)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return results
+    
+    def test_shares_result(self):
+        results = self.call_concurrently(SingleFlight(), 'key', 'result')
+        self.assertEqual(results, ['result'] * CALLERS)
+        self.assertEqual(len(self.calls), 1)
+    
+    def test_shares_error(self):
+        error = IOError('failed')
+        results = self.call_concurrently(SingleFlight(), 'key', error)
+        self.assertEqual(results, [error] * CALLERS)
+        self.assertEqual(len(self.calls), 1)
+    
+    def test_results_are_not_kept(self):
+        single_flight = SingleFlight()
+        self.release.set()
+        self.assertEqual(single_flight.do('key', lambda: self.work(1)), 1)
+        self.assertEqual(single_flight.do('key', lambda: self.work(2)), 2)
+        self.assertEqual(self.calls, [1, 2])
+    
+    def test_keys_are_separate(self):
+        single_flight = SingleFlight()
+        self.release.set()
+        single_flight.do('a', lambda: self.work('a'))
+        single_flight.do('b', lambda: self.work('b'))
+        self.assertEqual(self.calls, ['a', 'b'])
+
+
+class CrossProcessSingleFlightTest(unittest.TestCase):
+    
+    # A lease taken in the shared cache stands for a leader in another process.
+    
+    def setUp(self):
+        self.cachable = Cachable(namespace=uuid.uuid4().hex)
+        self.single_flight = SingleFlight(self.cachable, lease=0.5, poll_interval=0.01)
+        self.cachable.add_content('singleflight:%r' % ('key',), 0, timeout=0.5)
+        self.calls = []
+    
+    def work(self):
+        self.calls.append(None)
+        return 'own result'
+    
+    def test_polls_for_result_of_other_process(self):
+        polls = []
+        
+        def poll():
+            polls.append(None)
+            return 'published' if len(polls) > 2 else None
+        
+        self.assertEqual(self.single_flight.do('key', self.work, poll), 'published')
+        self.assertEqual(self.calls, [])
+    
+    def test_lease_runs_out(self):
+        self.assertEqual(self.single_flight.do('key', self.work, lambda: None), 'own result')
+        self.assertEqual(len(self.calls), 1)
+    
+    def test_without_poll(self):
+        self.assertEqual(self.single_flight.do('key', self.work), 'own result')
+
+
+class CoalescedRequestsTest(StandInTestCase):
+    
+    def setUp(self):
+        self.heads = []
+        self.server_options = {'latency': self.get_latency}
+        super(CoalescedRequestsTest, self).setUp()
+    
+    def get_latency(self, method, path):
+        if method != 'HEAD':
+            return 0
+        self.heads.append(path)
+        return 0.2
+    
+    def exists_concurrently(self, storage):
+        threads = [threading.Thread(target=storage.exists, args=('a.txt',)) for i in range(CALLERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    
+    def test_one_head_request(self):
+        self.exists_concurrently(self.get_storage())
+        self.assertEqual(len(self.heads), 1)
+    
+    def test_disabled(self):
+        self.exists_concurrently(self.get_storage(single_flight=False, metadata_cache_negative_timeout=0))
+        self.assertEqual(len(self.heads), CALLERS)
\ No newline at end of file
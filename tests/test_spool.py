@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+#
+#
+# This file is a part of 'django-stoba' project.
+#
+# Copyright (c) 2016, Vassim Shahir
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice,
+#    this list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright
+#    notice, this list of conditions and the following disclaimer in the
+#    documentation and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its contributors
+#    may be used to endorse or promote products derived from this software without
+#    specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE
+# LIABLE FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR
+# CONSEQUENTIAL DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF
+# SUBSTITUTE GOODS OR SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS
+# INTERRUPTION) HOWEVER CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN
+# CONTRACT, STRICT LIABILITY, OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE)
+# ARISING IN ANY WAY OUT OF THE USE OF THIS SOFTWARE, EVEN IF ADVISED OF THE
+# POSSIBILITY OF SUCH DAMAGE.
+#
+
+from __future__ import unicode_literals, absolute_import
+
+from django.core.files.base import ContentFile
+from .base import StandInTestCase
+import threading
+import time
+
+__author__ = 'Vassim Shahir'
+__license__ = 'BSD 3-Clause License'
+__copyright__ = 'Copyright 2016 Vassim Shahir'
+
+PUT_LATENCY = 0.3
+
+
+class WriteBehindSpoolTest(StandInTestCase):
+    
+    # PUTs are slow, so that files stay spooled for a while and uploads are
+    # in flight when the tests act on them. Two storages on one directory
+    # stand for two processes: their spools share nothing but the files.
+    
+    def setUp(self):
+        self.puts = []
+        self.server_options = {'latency': self.get_latency}
+        super(WriteBehindSpoolTest, self).setUp()
+        self.directory = self.mkdtemp()
+        self.storage = self.get_spooling_storage()
+    
+    def get_latency(self, method, path):
+        if method != 'PUT':
+            return 0
+        self.puts.append(path)
+        return PUT_LATENCY
+    
+    def get_spooling_storage(self):
+        storage = self.get_storage(write_behind_dir=self.directory)
+        self.addCleanup(storage.flush)
+        return storage
+    
+    def get_stored(self, name):
+        if self.server.store.get('stoba', name) is None:
+            return None
+        with self.server.store.open('stoba', name) as f:
+            return f.read()
+    
+    def wait_for_upload(self):
+        # Until the first upload is in flight.
+        while not self.puts:
+            time.sleep(0.01)
+    
+    def test_save_is_visible_before_upload(self):
+        self.storage.save('w/a.txt', ContentFile(b'a'))
+        self.assertTrue(self.storage.exists('w/a.txt'))
+        self.assertEqual(self.storage.size('w/a.txt'), 1)
+        with self.storage.open('w/a.txt') as f:
+            self.assertEqual(f.read(), b'a')
+        
+        self.assertFalse(self.storage.flush().failed)
+        self.assertEqual(self.get_stored('w/a.txt'), b'a')
+    
+    def test_delete(self):
+        self.storage.save('w/a.txt', ContentFile(b'a'))
+        self.wait_for_upload()
+        self.storage.delete('w/a.txt')
+        self.storage.flush()
+        self.assertFalse(self.storage.exists('w/a.txt'))
+        self.assertIsNone(self.get_stored('w/a.txt'))
+    
+    def test_delete_many(self):
+        self.storage.save('w/a.txt', ContentFile(b'a'))
+        self.wait_for_upload()
+        self.assertEqual(self.storage.delete_many(['w/a.txt']).succeeded, ['w/a.txt'])
+        self.assertFalse(self.storage.exists('w/a.txt'))
+        self.storage.flush()
+        self.assertIsNone(self.get_stored('w/a.txt'))
+    
+    def test_delete_prefix(self):
+        for name in ('w/a.txt', 'w/sub/b.txt', 'x/c.txt'):
+            self.storage.save(name, ContentFile(b'x'))
+        result = self.storage.delete_prefix('w')
+        self.assertEqual(sorted(result.succeeded), ['w/a.txt', 'w/sub/b.txt'])
+        self.storage.flush()
+        self.assertIsNone(self.get_stored('w/a.txt'))
+        self.assertIsNone(self.get_stored('w/sub/b.txt'))
+        self.assertEqual(self.get_stored('x/c.txt'), b'x')
+    
+    def test_move_prefix(self):
+        self.server.store.put('stoba', 'w/a.txt', ContentFile(b'old'))
+        self.storage._save('w/a.txt', ContentFile(b'new'))
+        self.storage._save('w/b.txt', ContentFile(b'spooled only'))
+        result = self.storage.move_prefix('w', 'moved')
+        self.assertEqual(sorted(result.succeeded), ['moved/a.txt', 'moved/b.txt'])
+        self.storage.flush()
+        self.assertIsNone(self.get_stored('w/a.txt'))
+        self.assertIsNone(self.get_stored('w/b.txt'))
+        self.assertEqual(self.get_stored('moved/a.txt'), b'new')
+        self.assertEqual(self.get_stored('moved/b.txt'), b'spooled only')
+    
+    def test_copy_to_spooled_name(self):
+        self.storage.save('w/a.txt', ContentFile(b'old'))
+        self.server.store.put('stoba', 'src.txt', ContentFile(b'new'))
+        self.wait_for_upload()
+        self.storage.copy('src.txt', 'w/a.txt')
+        self.storage.flush()
+        self.assertEqual(self.get_stored('w/a.txt'), b'new')
+    
+    def test_visible_to_other_processes(self):
+        self.storage.save('w/a.txt', ContentFile(b'a'))
+        other = self.get_spooling_storage()
+        self.assertTrue(other.exists('w/a.txt'))
+        with other.open('w/a.txt') as f:
+            self.assertEqual(f.read(), b'a')
+        self.assertNotEqual(other.get_available_name('w/a.txt'), 'w/a.txt')
+    
+    def test_uploaded_once(self):
+        self.storage.save('w/a.txt', ContentFile(b'a'))
+        self.wait_for_upload()
+        # Starts while the upload is in flight and recovers the entry.
+        other = self.get_spooling_storage()
+        self.storage.flush()
+        other.flush()
+        self.assertEqual(len(self.puts), 1)
+        self.assertEqual(self.get_stored('w/a.txt'), b'a')
+    
+    def test_newer_version_wins(self):
+        self.storage.save('w/a.txt', ContentFile(b'old'))
+        self.wait_for_upload()
+        other = self.get_spooling_storage()
+        # _save() overwrites, as a storage with file_overwrite would.
+        other._save('w/a.txt', ContentFile(b'new'))
+        self.storage.flush()
+        other.flush()
+        self.assertEqual(self.get_stored('w/a.txt'), b'new')
+        self.assertIsNone(self.storage.spool.get('w/a.txt'))
+    
+    def test_delete_by_other_process(self):
+        self.storage.save('w/a.txt', ContentFile(b'a'))
+        self.wait_for_upload()
+        other = self.get_spooling_storage()
+        other.delete('w/a.txt')
+        self.storage.flush()
+        self.assertIsNone(self.get_stored('w/a.txt'))
\ No newline at end of file